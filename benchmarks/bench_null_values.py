@@ -0,0 +1,79 @@
+"""
+Processing.fix_null_values against the original per-cell `Series.apply` version, on the tables in extracted_data/.
+Checks that both mark the same cells as null. Run from the repository root:
+
+    python benchmarks/bench_null_values.py [--repeat 10]
+"""
+import argparse
+import glob
+import os
+import sys
+from time import perf_counter
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.data_processing import Processing  # noqa: E402
+
+NULL_VALUES = ['Not Rated', 'unknown']
+TABLES = {
+    'Stations': ('extracted_data/AlternativeFuel/Stations_*.csv', '|'),
+    'Complaints': ('extracted_data/NHTSafetyAdministration/Complaints_*.csv', ','),
+    'SafetyRatings': ('extracted_data/NHTSafetyAdministration/SafetyRatings_*.csv', ','),
+    'Recalls': ('extracted_data/NHTSafetyAdministration/Recalls_*.csv', ','),
+}
+
+
+def fix_null_values_apply(df: pd.DataFrame, null_values: list = NULL_VALUES) -> pd.DataFrame:
+    """
+    Reference: the original implementation, one Python call per cell.
+    """
+    null_values_set = set(v.lower() for v in null_values)
+
+    def clean_value(x):
+        if x is None or pd.isna(x):
+            return pd.NA
+        if isinstance(x, str):
+            x_strip = x.strip()
+            if x_strip == '' or x_strip.lower() in null_values_set:
+                return pd.NA
+        return x
+
+    for c in df.columns:
+        df[c] = df[c].apply(clean_value)
+    return df
+
+
+def best_of(fn, df: pd.DataFrame, repeat: int) -> tuple:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        data = df.copy()
+        time_before = perf_counter()
+        result = fn(data)
+        best = min(best, perf_counter() - time_before)
+    return best, result
+
+
+def main(repeat: int, scale: int):
+    processing = Processing(storage_format="csv")
+    for name, (pattern, sep) in TABLES.items():
+        files = sorted(glob.glob(pattern))
+        if not files:
+            print(f"{name}: no file matching {pattern}")
+            continue
+        df = pd.read_csv(files[-1], sep=sep, low_memory=False)
+        for factor in sorted({1, scale}):
+            data = pd.concat([df] * factor, ignore_index=True) if factor > 1 else df
+            t_apply, expected = best_of(fix_null_values_apply, data, repeat)
+            t_vector, result = best_of(processing.fix_null_values, data, repeat)
+            same = bool((expected.isna().to_numpy() == result.isna().to_numpy()).all())
+            label = f"{name} x{factor}" if factor > 1 else name
+            print(f"{label:16s} {data.shape[0]:>7d}x{data.shape[1]:<3d} apply {t_apply * 1000:8.1f} ms | "
+                  f"vectorized {t_vector * 1000:7.1f} ms | x{t_apply / t_vector:5.1f} | same nulls: {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best one kept)")
+    parser.add_argument("--scale", type=int, default=10, help="also measure each table repeated this many times")
+    args = parser.parse_args()
+    main(args.repeat, args.scale)
@@ -3,11 +3,12 @@
 from utils.fuel_economy_async import FuelEconomyETL
 from utils.highway_safety_admin_async import SafetyAdministrationETL
 from utils.alternative_fuel_async import AlternativeFuelETL
-from utils.schema_producer import produce_schemas
-from utils.data_processing import Processing
-from utils.data_loading import Loading
+from utils.response_cache import ResponseCache
+from utils.state_store import StateStore
+from utils.run_catalog import RunCatalog
+from utils.stage_storage import resolve_storage_format
+from utils.orchestrator import PipelineOrchestrator
 
-from time import perf_counter
 import asyncio
 import json
 
@@ -17,76 +18,65 @@ def print_output_info(output_dict: dict, dataset : str):
         df = output_dict[k]
         print(f"Output df named '{k}' has shape ({df.shape[0]}, {df.shape[1]})") if df is not None else print(f"Output df named '{k}' is None.")
 
-def main():
+def main(incremental: bool = False, write_extracted: bool = False, storage_format: str = "parquet", keep_runs: int = 5,
+         load_mode: str = "upsert", processing_workers: int = 4, processing_chunksize: int = None):
     
-    dataset = 'FuelEconomy'
-    time_before = perf_counter()
-    etl = FuelEconomyETL(num_years=1, concurrency=10)
-    asyncio.run(etl.run_all())
-    duration_in_secs = perf_counter() - time_before
-    print(f"Total time ({dataset}): {duration_in_secs:.3f} s -> {duration_in_secs/60:.1f} min")
+    # persistent HTTP response cache shared by the three sources (re-runs only revalidate what is stale)
+    cache = ResponseCache(path="http_cache/responses.sqlite")
     
-    output_fuel_econ = etl.get_output()
-    print_output_info(output_dict=output_fuel_econ, dataset = dataset)
-
-    dataset = 'NHTSafetyAdmin'
-    time_before = perf_counter()
-    etl_nhtsa = SafetyAdministrationETL(num_years=1, concurrency=5)
-    asyncio.run(etl_nhtsa.run_all())
-    duration_in_secs = perf_counter() - time_before
-    print(f"Total time ({dataset}): {duration_in_secs:.3f} s -> {duration_in_secs/60:.1f} min")
-    
-    output_safety = etl_nhtsa.get_output()
-    print_output_info(output_dict=output_safety, dataset = dataset)
-    
-    dataset = 'AlternativeFuel'
-    time_before = perf_counter()
-    etl_afdc = AlternativeFuelETL(concurrency=5)
-    asyncio.run(etl_afdc.run_all())
-    duration_in_secs = perf_counter() - time_before
-    print(f"Total time ({dataset}): {duration_in_secs:.3f} s -> {duration_in_secs/60:.1f} min")
-    
-    output_alternative_fuel = etl_afdc.get_output()
-    print_output_info(output_dict=output_alternative_fuel, dataset = dataset)
-    
-    # need to produce schemas every run? cause there may exist new dataframes for the AlternativeFul Data that were not obtained in previous runs
-    # although the parameters are fixed for now........
-    # latest_files = produce_schemas(write_json_flag=False)
-    
-    sep_dict = {'FuelEconomy' : ',', 'NHTSafetyAdministration' : ',', 'AlternativeFuel' : '|'}
-    latest_extracted_files = produce_schemas(write_json_flag=False, stage_folder='extracted_data', sep_dict=sep_dict)
-    
-    # print("\n", latest_files)
+    # incremental mode: extract only entities that are new/changed since the previous run (watermarks + seen ids)
+    state = StateStore(path="state/extraction_state.json") if incremental else None
     
-    processing = Processing(file_dict=latest_extracted_files)
-    processing.run_all(write_flag=True)
+    # extracted DataFrames are handed to Processing in memory; the extracted_data/ files are only an optional copy
+    # (needed to regenerate the extracted_data_schemas with produce_schemas(write_json_flag=True))
+    # stage files (extracted_data/, processed_data/) are Parquet by default, 'csv' keeps the old format
+    # (resolved once: without pyarrow, Parquet falls back to CSV with a warning)
+    storage_format = resolve_storage_format(storage_format)
+    print(f"Stage files written as {storage_format}")
     
-    dataset = 'ALL SOURCES'
-    output_processing = processing.get_output()
-    print_output_info(output_dict=output_processing, dataset = dataset)
-    
-    sep_dict = {'FuelEconomy' : ',', 'NHTSafetyAdministration' : ',', 'AlternativeFuel' : ','}
-    latest_processed_files = produce_schemas(write_json_flag=False, stage_folder='processed_data', sep_dict=sep_dict)
+    # run catalog: every stage file of this run is registered, so later stages read one consistent run (no mtime globbing)
+    catalog = RunCatalog(path="catalog/runs.json")
+    run_id = catalog.start_run()
+    print(f"Run id: {run_id}")
     
     # Load config
     with open("connection_config.json", "r") as f:
         config = json.load(f)
 
-    server = config["server"]
-    database = config["database"]
-    username = config["username"]
-    password = config["password"]
-
-    # Initialize loader
-    loader = Loading(
-            server=server,
-            database=database,
-            username=username,
-            password=password, 
-            file_dict=latest_processed_files #latest_files
-    )
+    loading_kwargs = {
+        "server": config["server"],
+        "database": config["database"],
+        "username": config["username"],
+        "password": config["password"],
+        "load_mode": load_mode,  # 'upsert': merge on the natural keys of processed_data_schemas/table_keys.json
+    }
+    
+    # the three sources hit different hosts: they run concurrently in one event loop, on one shared client
+    # (each ETL's `concurrency` is the budget of its hosts), and each source is processed and loaded as soon
+    # as its extraction is done -> total time ~ the slowest source instead of the sum
+    # `concurrency` is only each host's starting window: the client adapts it to what the upstream allows (AIMD)
+    etls = {
+        'FuelEconomy': FuelEconomyETL(num_years=1, concurrency=10, cache=cache, state=state, write_files=write_extracted, storage_format=storage_format, catalog=catalog),
+        'NHTSafetyAdministration': SafetyAdministrationETL(num_years=1, concurrency=5, cache=cache, state=state, write_files=write_extracted, storage_format=storage_format, catalog=catalog),
+        'AlternativeFuel': AlternativeFuelETL(concurrency=5, cache=cache, state=state, write_files=write_extracted, storage_format=storage_format, catalog=catalog),
+    }
+    orchestrator = PipelineOrchestrator(etls, cache=cache, catalog=catalog, storage_format=storage_format,
+                                        processing_workers=processing_workers,  # tables processed in parallel processes
+                                        processing_chunksize=processing_chunksize,  # rows per chunk for tables too big for memory
+                                        loading_kwargs=loading_kwargs)
+    asyncio.run(orchestrator.run())
+    
+    cache.close()
+    
+    for dataset, etl in etls.items():
+        print_output_info(output_dict=etl.get_output(), dataset = dataset)
+    for dataset, processing in orchestrator.processing.items():
+        print_output_info(output_dict=processing.get_output(), dataset = f"{dataset} (processed)")
+    
+    catalog.save()
     
-    loader.run_all()
+    # retention: drop the stage files of runs older than the last `keep_runs`
+    catalog.prune(keep=keep_runs)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import asyncio
+from aiohttp import web
+from utils.http_client import AdaptiveLimiter, AsyncHttpClient
+
+
+class ThrottlingServer:
+    """
+    Local stand-in for a throttling upstream: answers 429 above `cap` requests in flight, else JSON after `latency`.
+    """
+
+    def __init__(self, cap: int = None, latency: float = 0.02):
+        self.cap = cap
+        self.latency = latency
+        self.in_flight = 0
+        self.throttled = 0
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        if self.cap is not None and self.in_flight >= self.cap:
+            self.throttled += 1
+            return web.Response(status=429)
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency)
+            return web.json_response({"path": request.path})
+        finally:
+            self.in_flight -= 1
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def client(**kwargs) -> AsyncHttpClient:
+    return AsyncHttpClient(retries=8, backoff_base=0.02, backoff_max=0.2, **kwargs)
+
+
+def test_limiter_decreases_on_error_and_grows_when_full():
+    limiter = AdaptiveLimiter(8, max_limit=16, latency_window=5)
+
+    async def run():
+        for _ in range(8):
+            await limiter.acquire()
+        limiter.release(0.01, error=True)
+        assert limiter.window == 4 and limiter.decreases == 1
+        limiter.release(0.01, error=True)  # same burst: within the cooldown, no second halving
+        assert limiter.window == 4 and limiter.decreases == 1
+
+        limiter.cooldown_until = 0.0
+        for _ in range(6):
+            limiter.release(0.01)  # slots still held above the window: the window is full
+        assert limiter.limit > 4
+
+    asyncio.run(run())
+
+
+def test_window_backs_off_to_throttling_upstream():
+    async def run():
+        async with ThrottlingServer(cap=6) as server, client(concurrency=16, max_concurrency=64) as http:
+            results = await asyncio.gather(*(http.get_json(f"{server.url}/item/{i}") for i in range(400)))
+            limiter = http.host_limiters["127.0.0.1"]
+            return results, limiter, server
+
+    results, limiter, server = asyncio.run(run())
+    assert all(r is not None for r in results)
+    assert server.throttled > 0 and limiter.decreases > 0
+    assert limiter.window < 16
+
+
+def test_window_grows_when_upstream_is_healthy():
+    async def run():
+        async with ThrottlingServer() as server, client(concurrency=4, max_concurrency=32) as http:
+            results = await asyncio.gather(*(http.get_json(f"{server.url}/item/{i}") for i in range(400)))
+            return results, http.host_limiters["127.0.0.1"]
+
+    results, limiter = asyncio.run(run())
+    assert all(r is not None for r in results)
+    assert limiter.decreases == 0 and limiter.window > 4
+
+
+def test_cancelled_requests_do_not_shrink_the_window():
+    async def run():
+        async with ThrottlingServer(latency=1.0) as server, client(concurrency=8) as http:
+            tasks = [asyncio.ensure_future(http.get_json(f"{server.url}/slow/{i}")) for i in range(12)]
+            await asyncio.sleep(0.2)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return http.host_limiters["127.0.0.1"]
+
+    limiter = asyncio.run(run())
+    assert limiter.decreases == 0 and limiter.window == 8
+    assert limiter.in_flight == 0
+
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+from utils.bulk_loader import BulkLoader
+
+
+@pytest.fixture
+def loader(tmp_path):
+    loader = BulkLoader(f"sqlite:///{tmp_path / 'bulk.db'}", method="bcp")
+    with loader.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE "Complaints" ("odiNumber" INT, "summary" TEXT, "crash" BIT, '
+                          '"InsertedAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)'))
+    return loader
+
+
+def read_bcp_file(path) -> list:
+    content = path.read_text(encoding="utf-8")
+    rows = content.split(BulkLoader.BCP_ROW_TERMINATOR)
+    assert rows[-1] == ""
+    return [row.split(BulkLoader.BCP_FIELD_TERMINATOR) for row in rows[:-1]]
+
+
+def test_bcp_file_follows_the_table_columns(loader, tmp_path):
+    # columns in another order than the table, free text with tabs, newlines and quotes
+    df = pd.DataFrame({"crash": [True, False], "summary": ['stalled\tat "speed"\nthen stopped', None], "odiNumber": [1, 2]})
+    path = tmp_path / "complaints.bcp"
+    loader.write_bcp_file(df, loader.table_columns("Complaints"), str(path))
+
+    assert read_bcp_file(path) == [
+        ["1", 'stalled\tat "speed"\nthen stopped', "1", ""],
+        ["2", "", "0", ""],
+    ]
+
+
+def test_bcp_file_rejects_a_terminator_in_the_data(loader, tmp_path):
+    df = pd.DataFrame({"odiNumber": [1], "summary": ["a\x1fb"], "crash": [True]})
+    with pytest.raises(ValueError, match="summary"):
+        loader.write_bcp_file(df, loader.table_columns("Complaints"), str(tmp_path / "complaints.bcp"))
+
+
+def test_bcp_command_uses_hex_terminators(loader):
+    cmd = loader.bcp_command("stg.Complaints", "/tmp/complaints.bcp")
+    assert cmd[cmd.index("-t") + 1] == "0x1f" and cmd[cmd.index("-r") + 1] == "0x1e"
+    assert "-k" not in cmd  # empty InsertedAt takes its default
+
+
+def test_bcp_falls_back_to_executemany(loader):
+    stats = loader.load(pd.DataFrame({"odiNumber": [1], "summary": ["a"], "crash": [True]}), "Complaints")
+    assert stats["method"] == "executemany"
+    with loader.engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM "Complaints" WHERE "InsertedAt" IS NOT NULL')).scalar() == 1
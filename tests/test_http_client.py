@@ -0,0 +1,109 @@
+import asyncio
+from aiohttp import web
+from utils.http_client import AsyncHttpClient
+
+
+class CountingServer:
+    """
+    Local upstream counting the requests it receives: JSON echo of the path and query after `latency`,
+    404 for paths ending in /missing.
+    """
+
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self.received = 0
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        self.received += 1
+        await asyncio.sleep(self.latency)
+        if request.path.endswith("/missing"):
+            return web.Response(status=404)
+        return web.json_response({"path": request.path, "query": dict(request.query)})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def test_identical_concurrent_calls_share_one_request():
+    async def run():
+        async with CountingServer() as server, AsyncHttpClient() as http:
+            calls = [http.get_json(f"{server.url}/menu", params={"year": 2025, "make": "A"}) for _ in range(5)]
+            calls += [http.get_json(f"{server.url}/menu", params={"make": "A", "year": "2025"}) for _ in range(5)]
+            calls += [http.get_json(f"{server.url}/menu", params={"year": 2024, "make": "A"})]
+            results = await asyncio.gather(*calls)
+            return results, server.received, http.stats
+
+    results, received, stats = asyncio.run(run())
+    assert received == 2
+    assert stats == {"sent": 2, "coalesced": 9, "memo_hits": 0}
+    assert all(r == {"path": "/menu", "query": {"year": "2025", "make": "A"}} for r in results[:10])
+
+    # each caller gets its own copy
+    results[0]["query"].pop("year")
+    assert results[1]["query"] == {"year": "2025", "make": "A"}
+
+
+def test_memoized_prefixes_are_requested_once_per_run():
+    async def run():
+        async with CountingServer(latency=0.0) as server, AsyncHttpClient() as http:
+            http.set_memo_prefixes([f"{server.url}/menu"])
+            menus = [await http.get_json(f"{server.url}/menu/year") for _ in range(3)]
+            vehicles = [await http.get_json(f"{server.url}/vehicle/1") for _ in range(2)]
+            missing = [await http.get_json(f"{server.url}/menu/missing") for _ in range(2)]
+            menus[0]["path"] = "changed"
+            again = await http.get_json(f"{server.url}/menu/year")
+            return menus, vehicles, missing, again, server.received, http.stats
+
+    menus, vehicles, missing, again, received, stats = asyncio.run(run())
+    assert menus[1:] == [{"path": "/menu/year", "query": {}}] * 2 and again == menus[1]
+    assert vehicles == [{"path": "/vehicle/1", "query": {}}] * 2
+    assert missing == [None, None]
+    # menu once, vehicle twice (not memoized), failed menu twice (failures are not kept)
+    assert received == 5
+    assert stats == {"sent": 5, "coalesced": 0, "memo_hits": 3}
+
+
+def test_cancelled_caller_keeps_the_shared_request_of_the_others():
+    async def run():
+        async with CountingServer(latency=0.2) as server, AsyncHttpClient(concurrency=4) as http:
+            first = asyncio.ensure_future(http.get_json(f"{server.url}/shared"))
+            second = asyncio.ensure_future(http.get_json(f"{server.url}/shared"))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            return await second, http.stats, http.host_limiters["127.0.0.1"]
+
+    data, stats, limiter = asyncio.run(run())
+    assert data == {"path": "/shared", "query": {}}
+    assert stats["sent"] == 1 and stats["coalesced"] == 1
+    assert limiter.decreases == 0 and limiter.in_flight == 0
+
+
+def test_request_is_cancelled_with_its_last_caller():
+    async def run():
+        async with CountingServer(latency=0.2) as server, AsyncHttpClient() as http:
+            callers = [asyncio.ensure_future(http.get_json(f"{server.url}/shared")) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            inflight = dict(http._inflight)
+            data = await http.get_json(f"{server.url}/shared")  # a new caller sends a new request
+            return inflight, data, http.stats
+
+    inflight, data, stats = asyncio.run(run())
+    assert inflight == {}
+    assert data == {"path": "/shared", "query": {}}
+    assert stats["sent"] == 2 and stats["coalesced"] == 1
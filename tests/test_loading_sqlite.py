@@ -0,0 +1,128 @@
+import json
+import pandas as pd
+import pytest
+from sqlalchemy import text
+from utils.data_loading import Loading
+
+SCHEMA = {"Cars": {"vehicleId": {"dtype": "int"}, "make": {"dtype": "string"}, "model": {"dtype": "string"},
+                   "modelYear": {"dtype": "int"}, "mpg": {"dtype": "float"}}}
+
+
+@pytest.fixture
+def stage(tmp_path, monkeypatch):
+    """
+    Minimal processed stage in a temp folder: one table, its schema and its natural key.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "processed_data" / "Src").mkdir(parents=True)
+    (tmp_path / "processed_data_schemas" / "Src").mkdir(parents=True)
+    (tmp_path / "processed_data_schemas" / "Src" / "Cars.json").write_text(json.dumps(SCHEMA))
+    (tmp_path / "processed_data_schemas" / "table_keys.json").write_text(json.dumps({"Src": {"Cars": ["vehicleId"]}}))
+    return tmp_path
+
+
+def write_cars(stage, df: pd.DataFrame) -> dict:
+    path = stage / "processed_data" / "Src" / "Cars_20250101_000000.csv"
+    df.to_csv(path, index=False)
+    return {"Src": {"Cars": str(path)}}
+
+
+def cars(mpg: float = 30.0) -> pd.DataFrame:
+    return pd.DataFrame({"vehicleId": [1, 2, 3], "make": ["Ford", "Ford", "Kia"], "model": ["F150", "Focus", "Rio"],
+                         "modelYear": [2024, 2024, 2025], "mpg": [20.0, mpg, 35.5]})
+
+
+def load(stage, file_dict: dict, load_mode: str) -> Loading:
+    loader = Loading(connection_url=f"sqlite:///{stage / 'local.db'}", file_dict=file_dict, load_mode=load_mode, workers=2)
+    loader.run_all()
+    return loader
+
+
+def read_cars(loader: Loading) -> pd.DataFrame:
+    with loader.engine.connect() as conn:
+        return pd.read_sql(text('SELECT "vehicleId", "make", "mpg" FROM "Cars" ORDER BY "vehicleId"'), conn)
+
+
+def test_append_round_trip(stage):
+    file_dict = write_cars(stage, cars())
+    loader = load(stage, file_dict, "append")
+
+    assert read_cars(loader)["vehicleId"].tolist() == [1, 2, 3]
+    assert (stage / "sql_scripts" / "sqlite" / "Src" / "CREATE_TABLE_CARS.sql").is_file()
+
+    loader = load(stage, file_dict, "append")
+    assert len(read_cars(loader)) == 6
+
+
+def test_upsert_is_idempotent(stage):
+    load(stage, write_cars(stage, cars()), "upsert")
+    loader = load(stage, write_cars(stage, cars(mpg=31.5)), "upsert")
+
+    df = read_cars(loader)
+    assert df["vehicleId"].tolist() == [1, 2, 3]
+    assert df.loc[df["vehicleId"] == 2, "mpg"].item() == 31.5
+
+
+def test_failed_table_is_reported(stage):
+    df = cars()
+    df.loc[2, "vehicleId"] = 2  # two different rows with the same key
+    with pytest.raises(RuntimeError, match="1 tables failed"):
+        load(stage, write_cars(stage, df), "upsert")
+
+
+def column_types(sql: str) -> dict:
+    return {line.split()[0].strip('"'): line.split()[1] for line in sql.splitlines() if line.startswith("    ") and "CONSTRAINT" not in line}
+
+
+def test_string_widths_never_below_the_floor(stage):
+    loader = Loading(connection_url="sqlite://", file_dict={})
+    stats = {"make": {"max_length": 4}, "model": {"max_length": 900}}
+    sql = loader.generate_create_table_sql("processed_data_schemas/Src/Cars.json", "Cars", None, stats=stats)
+
+    types = column_types(sql)
+    assert types["make"] == f"NVARCHAR({Loading.MIN_STRING_CHARS})"
+    assert types["model"] == "NVARCHAR(2048)"
+
+
+def test_composite_key_fits_the_key_limit(stage):
+    loader = Loading(connection_url="sqlite://", file_dict={})
+    stats = {"make": {"max_length": 300}, "model": {"max_length": 40}}
+    sql = loader.generate_create_table_sql("processed_data_schemas/Src/Cars.json", "Cars", None, stats=stats,
+                                           keys=["vehicleId", "make", "model"], primary_key=True)
+
+    types = column_types(sql)
+    key_bytes = sum(loader.sql_type_bytes(types[k]) for k in ["vehicleId", "make", "model"])
+    assert key_bytes <= Loading.MAX_KEY_BYTES
+    assert types["make"] == types["model"] == "NVARCHAR(224)"  # (900 - 4 bytes of vehicleId) / 2 keys / 2 bytes
+
+
+def test_columns_loaded_in_schema_order(stage, monkeypatch):
+    # bcp maps fields by position: the file's column order must not leak into the loaded DataFrame
+    df = cars()[["mpg", "model", "vehicleId", "modelYear", "make"]]
+    loaded = []
+    monkeypatch.setattr(Loading, "insert_dataframe", lambda self, df, **kwargs: loaded.append(df))
+    load(stage, write_cars(stage, df), "append")
+
+    assert list(loaded[0].columns) == list(SCHEMA["Cars"])
+
+
+def test_replace_groups_of_keyless_table(stage):
+    # MPG_Detail-like table: no natural key, the rows of a vehicle always come together
+    schema = {"Details": {"vehicleId": {"dtype": "int"}, "state": {"dtype": "string"}, "mpg": {"dtype": "float"}}}
+    (stage / "processed_data_schemas" / "Src" / "Details.json").write_text(json.dumps(schema))
+    (stage / "processed_data_schemas" / "table_replace_keys.json").write_text(json.dumps({"Src": {"Details": ["vehicleId"]}}))
+
+    def write_details(df: pd.DataFrame) -> dict:
+        path = stage / "processed_data" / "Src" / "Details_20250101_000000.csv"
+        df.to_csv(path, index=False)
+        return {"Src": {"Details": str(path)}}
+
+    first = pd.DataFrame({"vehicleId": [1, 1, 2], "state": ["AZ", None, "NY"], "mpg": [30.0, 31.0, 25.0]})
+    load(stage, write_details(first), "upsert")
+    load(stage, write_details(first), "upsert")
+    # vehicle 1 now has a single driver record, vehicle 2 is not in this batch
+    loader = load(stage, write_details(pd.DataFrame({"vehicleId": [1], "state": ["AZ"], "mpg": [32.0]})), "upsert")
+
+    with loader.engine.connect() as conn:
+        df = pd.read_sql(text('SELECT "vehicleId", "mpg" FROM "Details" ORDER BY "vehicleId", "mpg"'), conn)
+    assert df.values.tolist() == [[1, 32.0], [2, 25.0]]
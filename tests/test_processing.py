@@ -0,0 +1,152 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from utils.data_processing import Processing
+
+SOURCE = "NHTSafetyAdministration"
+SCHEMA = {"Recalls": {"NHTSACampaignNumber": {"dtype": "string"}, "Make": {"dtype": "string"},
+                      "ModelYear": {"dtype": "int"}, "parkIt": {"dtype": "boolean"}}}
+
+
+def write_schema(root):
+    folder = root / "extracted_data_schemas" / SOURCE
+    folder.mkdir(parents=True)
+    (folder / "Recalls.json").write_text(json.dumps(SCHEMA))
+
+
+@pytest.fixture
+def stage(tmp_path, monkeypatch):
+    """
+    Temp working folder with the extracted schema of one table (Processing reads and writes relative paths).
+    """
+    monkeypatch.chdir(tmp_path)
+    write_schema(tmp_path)
+    return tmp_path
+
+
+def recalls() -> pd.DataFrame:
+    # duplicates inside a chunk and across chunks (chunks of 2 rows)
+    return pd.DataFrame({
+        "NHTSACampaignNumber": ["25V1", "25V2", "25V1", "25V3", "25V2", "25V4", "25V4"],
+        "Make": ["FORD", "KIA", "FORD", "KIA", "KIA", "BMW", "BMW"],
+        "ModelYear": [2025, 2025, 2025, 2024, 2025, 2023, 2023],
+        "parkIt": ["N", "Y", "N", "N", "Y", "Y", "Y"],
+    })
+
+
+def process(root, monkeypatch, chunksize: int = None) -> pd.DataFrame:
+    folder = root / (f"chunks_{chunksize}" if chunksize else "whole")
+    folder.mkdir()
+    write_schema(folder)
+    monkeypatch.chdir(folder)
+    Processing(dataframe_dict={SOURCE: {"Recalls": recalls()}}, storage_format="csv", chunksize=chunksize).run_all(write_flag=True)
+    (path,) = (folder / "processed_data" / SOURCE).glob("Recalls_*.csv")
+    return pd.read_csv(path)
+
+
+def test_drop_seen_duplicates_across_chunks(stage):
+    processing = Processing(storage_format="csv")
+    df = recalls()
+    seen = np.empty(0, dtype=np.uint64)
+    kept = []
+    for start in range(0, len(df), 2):
+        chunk, seen = processing.drop_seen_duplicates(df.iloc[start:start + 2], seen)
+        kept.append(chunk)
+
+    pd.testing.assert_frame_equal(pd.concat(kept), df.drop_duplicates())
+    assert seen.dtype == np.uint64 and len(seen) == 4 and np.array_equal(seen, np.sort(seen))
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 100])
+def test_chunked_processing_matches_whole_table(tmp_path, monkeypatch, chunksize):
+    whole = process(tmp_path, monkeypatch)
+    chunked = process(tmp_path, monkeypatch, chunksize=chunksize)
+
+    assert len(whole) == 4
+    pd.testing.assert_frame_equal(chunked, whole)
+
+
+def test_boolean_vocabulary(stage):
+    processing = Processing(storage_format="csv")
+    df = pd.DataFrame({"flag": ["Y", " yes", "TRUE", "n", "No", "false", "", "U", None]})
+    result = processing.convert_to_boolean(df, "flag")
+
+    assert str(result.dtype) == "boolean" and result.name == "flag_bool"
+    assert result.tolist() == [True, True, True, False, False, False, pd.NA, pd.NA, pd.NA]
+    assert processing.unmapped_boolean_values == {}
+
+
+def test_unknown_boolean_tokens_are_null_and_counted(stage):
+    processing = Processing(storage_format="csv")
+    df = pd.DataFrame({"flag": ["Y", "1", "0", "1", "maybe", "N"]})
+    result = processing.convert_to_boolean(df, "flag", source=SOURCE, table="Recalls")
+
+    # 1/0 are not in the default vocabulary
+    assert result.tolist() == [True, pd.NA, pd.NA, pd.NA, pd.NA, False]
+    assert processing.unmapped_boolean_values == {SOURCE: {"Recalls": {"flag": {"1": 2, "0": 1, "maybe": 1}}}}
+
+    # a later chunk of the same table adds to the counts
+    processing.convert_to_boolean(df.head(2), "flag", source=SOURCE, table="Recalls")
+    assert processing.unmapped_boolean_values[SOURCE]["Recalls"]["flag"] == {"1": 3, "0": 1, "maybe": 1}
+
+
+def test_boolean_vocabulary_override_from_schema(stage):
+    schema = {"Recalls": {"parkIt": {"dtype": "boolean", "true_values": ["1"], "false_values": ["0"]}}}
+    (stage / "extracted_data_schemas" / SOURCE / "Recalls.json").write_text(json.dumps(schema))
+    processing = Processing(storage_format="csv")
+    df = processing.convert_columns_based_on_schema(pd.DataFrame({"parkIt": ["1", "0", "Y"]}),
+                                                    f"extracted_data_schemas/{SOURCE}/Recalls.json", "Recalls", source=SOURCE)
+
+    # the override replaces the default tokens of that column
+    assert df["parkIt_bool"].tolist() == [True, False, pd.NA]
+    assert processing.unmapped_boolean_values == {SOURCE: {"Recalls": {"parkIt": {"Y": 1}}}}
+
+
+def test_unmapped_boolean_report_keyed_by_table(stage):
+    # two tables with the same flag column, processed in parallel processes
+    schema = {"Complaints": {"odiNumber": {"dtype": "int"}, "parkIt": {"dtype": "boolean"}}}
+    (stage / "extracted_data_schemas" / SOURCE / "Complaints.json").write_text(json.dumps(schema))
+    complaints = pd.DataFrame({"odiNumber": [1, 2], "parkIt": ["Y", "?"]})
+    processing = Processing(dataframe_dict={SOURCE: {"Recalls": recalls().assign(parkIt="X"), "Complaints": complaints}},
+                            storage_format="csv", workers=2)
+    processing.run_all()
+
+    assert processing.unmapped_boolean_values == {SOURCE: {"Recalls": {"parkIt": {"X": 7}}, "Complaints": {"parkIt": {"?": 1}}}}
+
+
+def clean_value(x, null_values=("not rated", "unknown")):
+    # the previous per-cell normalization of to_pandas_null, used as the reference
+    if x is None or pd.isna(x):
+        return pd.NA
+    if isinstance(x, str) and (x.strip() == '' or x.strip().lower() in null_values):
+        return pd.NA
+    return x
+
+
+def test_null_mask_matches_the_per_cell_check():
+    processing = Processing(storage_format="csv")
+    col = pd.Series(["5 stars", " Not Rated ", "", "  ", None, np.nan, "UNKNOWN", "unknownish", 3, "5 stars"], dtype=object)
+
+    mask = processing.null_mask(col, null_values=["Not Rated", "unknown"])
+    assert mask.tolist() == [clean_value(x) is pd.NA for x in col]
+
+    without_missing = processing.null_mask(col, null_values=["Not Rated", "unknown"], include_missing=False)
+    assert without_missing.tolist() == mask.tolist()[:4] + [False, False] + mask.tolist()[6:]
+
+
+def test_fix_null_values_only_touches_text_columns():
+    processing = Processing(storage_format="csv")
+    df = pd.DataFrame({
+        "rating": pd.Series(["5", "Not Rated", " ", None], dtype=object),
+        "model": pd.Series(["A", "unknown", "B", "C"], dtype="string"),
+        "year": [2020, 2021, 2022, 2023],
+    })
+    year = df["year"].copy()
+
+    out = processing.fix_null_values(df)
+    assert out is df
+    assert df["rating"].isna().tolist() == [False, True, True, True]
+    assert df["model"].isna().tolist() == [False, True, False, False]
+    pd.testing.assert_series_equal(df["year"], year)
+    assert processing.to_pandas_null(["x", "", None]).isna().tolist() == [False, True, True]
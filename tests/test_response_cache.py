@@ -0,0 +1,117 @@
+import asyncio
+import time
+from aiohttp import web
+from utils.http_client import AsyncHttpClient
+from utils.response_cache import ResponseCache
+
+
+class VersionedServer:
+    """
+    Local upstream with ETags: answers 304 to a matching If-None-Match, else the current version as JSON.
+    """
+
+    def __init__(self):
+        self.version = 1
+        self.requests = []  # (path, If-None-Match) of each request received
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        etag = f'"v{self.version}"'
+        self.requests.append((request.path, request.headers.get("If-None-Match")))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response({"version": self.version}, headers={"ETag": etag})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def test_key_ignores_param_order_and_types():
+    assert ResponseCache.make_key("u", {"a": 1, "b": "x"}) == ResponseCache.make_key("u", {"b": "x", "a": "1"})
+    assert ResponseCache.make_key("u", {"a": 1}) != ResponseCache.make_key("u", {"a": 2})
+
+
+def test_longest_prefix_ttl_wins(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"), default_ttl=5)
+    cache.set_ttls({"https://api/menu": 100, "https://api/menu/year": 10})
+    assert cache.ttl_for("https://api/menu/year?x=1") == 10
+    assert cache.ttl_for("https://api/menu/make") == 100
+    assert cache.ttl_for("https://api/vehicle/1") == 5
+    cache.close()
+
+
+def test_entries_without_ttl_or_validator_are_not_stored(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    cache.put("k1", "https://api/x", b"{}")
+    cache.put("k2", "https://api/x", b"{}", etag='"v1"')
+    assert cache.get("k1") is None
+    assert cache.get("k2") == {"body": b"{}", "etag": '"v1"', "last_modified": None, "fresh": False}
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"), max_bytes=300, default_ttl=60)
+    for key in ["a", "b", "c"]:
+        cache.put(key, "https://api/x", b"x" * 100)
+        time.sleep(0.01)
+    cache.get("a")  # order of use: b, c, a
+    cache.put("d", "https://api/x", b"x" * 100)
+
+    # over the cap: the least recently used go until the cache is back under 90% of it
+    assert cache.get("b") is None and cache.get("c") is None
+    assert cache.get("a") is not None and cache.get("d") is not None
+    assert cache.total_bytes == 200
+    cache.close()
+
+    reopened = ResponseCache(path=str(tmp_path / "responses.sqlite"), max_bytes=300)
+    assert reopened.total_bytes == 200
+    reopened.close()
+
+
+def test_stale_entry_is_revalidated(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))  # default_ttl 0: always stale, kept for its ETag
+
+    async def fetch(server):
+        async with AsyncHttpClient(cache=cache) as http:
+            return await http.get_json(f"{server.url}/menu")
+
+    async def run():
+        async with VersionedServer() as server:
+            first = await fetch(server)
+            second = await fetch(server)  # 304: served from the cache
+            server.version = 2
+            third = await fetch(server)  # changed upstream: new body
+            return [first, second, third], server.requests
+
+    results, requests = asyncio.run(run())
+    assert results == [{"version": 1}, {"version": 1}, {"version": 2}]
+    assert requests == [("/menu", None), ("/menu", '"v1"'), ("/menu", '"v1"')]
+    cache.close()
+
+
+def test_fresh_entry_skips_the_network(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+
+    async def run():
+        async with VersionedServer() as server:
+            cache.set_ttls({server.url: 60})
+            for _ in range(3):
+                async with AsyncHttpClient(cache=cache) as http:
+                    data = await http.get_json(f"{server.url}/menu")
+            return data, server.requests
+
+    data, requests = asyncio.run(run())
+    assert data == {"version": 1} and len(requests) == 1
+    cache.close()
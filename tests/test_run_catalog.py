@@ -0,0 +1,71 @@
+import pandas as pd
+from utils.run_catalog import RunCatalog
+
+
+def add_file(catalog: RunCatalog, folder, table: str = "Stations") -> str:
+    path = folder / f"{table}_{catalog.run_id}.csv"
+    path.write_text("id\n1\n")
+    catalog.add(stage="processed_data", dataset="AlternativeFuel", table=table, path=str(path), df=pd.DataFrame({"id": [1]}))
+    return str(path)
+
+
+def test_latest_run_follows_the_start_order_not_the_id(tmp_path):
+    catalog = RunCatalog(path=str(tmp_path / "runs.json"))
+    for run_id in ["zeta", "alpha", "20250101_000000"]:
+        catalog.start_run(run_id)
+        add_file(catalog, tmp_path)
+
+    assert catalog.ordered_runs() == ["zeta", "alpha", "20250101_000000"]
+    assert catalog.latest_run("processed_data") == "20250101_000000"
+    assert catalog.latest_run("extracted_data") is None
+
+
+def test_runs_started_in_the_same_second_get_distinct_ids(tmp_path):
+    catalog = RunCatalog(path=str(tmp_path / "runs.json"))
+    first, second = catalog.start_run(), catalog.start_run()
+    assert first != second and catalog.ordered_runs()[-1] == second
+
+
+def test_get_files_and_entry_of_one_run(tmp_path):
+    catalog = RunCatalog(path=str(tmp_path / "runs.json"))
+    catalog.start_run("a")
+    old = add_file(catalog, tmp_path)
+    catalog.start_run("b")
+    new = add_file(catalog, tmp_path)
+
+    assert catalog.get_files("processed_data") == {"AlternativeFuel": {"Stations": new}}
+    assert catalog.get_files("processed_data", run_id="a") == {"AlternativeFuel": {"Stations": old}}
+    entry = catalog.get_entry("processed_data", "AlternativeFuel", "Stations")
+    assert entry["rows"] == 1 and entry["cols"] == 1
+    entry["rows"] = 99  # a copy: the catalog is not modified
+    assert catalog.get_entry("processed_data", "AlternativeFuel", "Stations")["rows"] == 1
+
+
+def test_prune_keeps_the_latest_runs(tmp_path):
+    catalog = RunCatalog(path=str(tmp_path / "runs.json"))
+    paths = {}
+    for run_id in ["r3", "r1", "r2"]:
+        catalog.start_run(run_id)
+        paths[run_id] = add_file(catalog, tmp_path)
+
+    catalog.prune(keep=2)
+
+    assert catalog.ordered_runs() == ["r1", "r2"]
+    assert not (tmp_path / "Stations_r3.csv").exists()
+    assert all((tmp_path / f"Stations_{run_id}.csv").exists() for run_id in ["r1", "r2"])
+    assert RunCatalog(path=str(tmp_path / "runs.json")).ordered_runs() == ["r1", "r2"]
+
+
+def test_prune_never_drops_the_current_run(tmp_path):
+    catalog = RunCatalog(path=str(tmp_path / "runs.json"))
+    catalog.start_run("r1")
+    add_file(catalog, tmp_path)
+    catalog.prune(keep=0)
+    assert catalog.ordered_runs() == ["r1"]
+
+
+def test_runs_without_sequence_number_are_older(tmp_path):
+    catalog = RunCatalog(path=str(tmp_path / "runs.json"))
+    catalog.catalog["runs"]["legacy"] = {"created_at": "2025-01-01T00:00:00", "stages": {}}
+    catalog.start_run("new")
+    assert catalog.ordered_runs() == ["legacy", "new"]
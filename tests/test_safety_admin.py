@@ -0,0 +1,65 @@
+import asyncio
+from utils.highway_safety_admin_async import SafetyAdministrationAPI, SafetyAdministrationETL
+from utils.state_store import StateStore
+
+BASE = SafetyAdministrationAPI.BASE_URL
+RECALL = {"NHTSACampaignNumber": "25V1", "ModelYear": "2025", "Make": "FORD", "Model": "F150", "Component": "BRAKES"}
+COMPLAINT = {"odiNumber": 11, "crash": False, "summary": "stalled",
+             "products": [{"type": "Vehicle", "productYear": "2025", "productMake": "FORD", "productModel": "F150"}]}
+
+
+class StubClient:
+    """
+    Canned NHTSA payloads, in place of AsyncHttpClient. The ratings year menu fails (None, as after the retries);
+    the RANGER recalls/complaints and most inspection states fail too.
+    """
+
+    def set_rate_limit(self, host, rate, burst=None):
+        pass
+
+    def set_host_limit(self, host, limit):
+        pass
+
+    def set_cache_ttls(self, ttls):
+        pass
+
+    def set_memo_prefixes(self, prefixes):
+        pass
+
+    async def get_json(self, url, params=None, headers=None):
+        await asyncio.sleep(0)
+        params = params or {}
+        path = url[len(BASE):]
+        if path == "/SafetyRatings":
+            return None
+        if path == "/products/vehicle/modelYears":
+            return {"results": [{"modelYear": "2025"}]}
+        if path == "/products/vehicle/makes":
+            return {"results": [{"make": "FORD"}]}
+        if path == "/products/vehicle/models":
+            return {"results": [{"model": "F150"}, {"model": "RANGER"}]}
+        if path == "/recalls/recallsByVehicle":
+            return {"Count": 1, "results": [dict(RECALL)]} if params["model"] == "F150" else None
+        if path == "/complaints/complaintsByVehicle":
+            return {"count": 1, "results": [dict(COMPLAINT)]} if params["model"] == "F150" else None
+        if path.startswith("/CSSIStation/state/"):
+            state = path.rsplit("/", 1)[1]
+            return {"Count": 1, "Results": [{"State": state, "City": "c", "Zip": "1", "Organization": "o"}]} if state in ("AL", "AK") else None
+        raise AssertionError(f"unexpected request {url} {params}")
+
+
+def test_failed_dataset_does_not_stop_the_others(tmp_path):
+    state = StateStore(path=str(tmp_path / "state.json"))
+    etl = SafetyAdministrationETL(state=state, write_files=False, storage_format="csv")
+    asyncio.run(etl.run_all(StubClient()))
+
+    assert list(etl.failed_datasets) == ["ratings"]
+    tables = etl.get_tables()
+    assert set(tables) == {"Recalls", "Complaints", "InspectionsLocation"}
+    assert tables["Recalls"]["NHTSACampaignNumber"].tolist() == ["25V1"]
+    assert tables["Complaints"]["odiNumber"].tolist() == [11]
+    assert tables["InspectionsLocation"]["State"].tolist() == ["AL", "AK"]
+
+    # the seen ids of this run are not persisted while a dataset failed
+    etl.save_state()
+    assert not (tmp_path / "state.json").exists()
@@ -0,0 +1,82 @@
+import json
+import pandas as pd
+from utils.schema_producer import (VOTE_THRESHOLD, df_schema_to_json, infer_schema, infer_text_dtype, produce_schemas,
+                                   schema_cache_key)
+
+
+def test_regenerated_schema_keeps_hand_written_settings(tmp_path):
+    outfile = tmp_path / "Recalls.json"
+    outfile.write_text(json.dumps({"Recalls": {
+        "parkIt": {"dtype": "boolean", "example": "1", "true_values": ["1"], "false_values": ["0"]},
+        "dropped": {"dtype": "string", "example": "x", "null_values": ["-"]},
+    }}))
+    df = pd.DataFrame({"parkIt": ["1", "0"], "make": ["FORD", "KIA"]})
+
+    schema = df_schema_to_json(df, name="Recalls", outfile=str(outfile))["Recalls"]
+
+    assert schema["parkIt"]["true_values"] == ["1"] and schema["parkIt"]["false_values"] == ["0"]
+    assert schema["parkIt"]["dtype"] == "int"  # the inferred keys are refreshed
+    assert "dropped" not in schema and set(schema["make"]) == {"dtype", "example"}
+    assert json.loads(outfile.read_text())["Recalls"] == schema
+
+
+def test_text_columns_are_typed_by_vote():
+    assert infer_text_dtype(pd.Series(["1", "-2", "+30"])) == "int"
+    assert infer_text_dtype(pd.Series(["1.5", "2", "3e2"])) == "float"
+    assert infer_text_dtype(pd.Series(["True", "false", "TRUE"])) == "boolean"
+    assert infer_text_dtype(pd.Series(["2025-01-01", "2025/02/03 10:00", "2024-12-31T23:59:00Z"])) == "datetime"
+    assert infer_text_dtype(pd.Series(["01234", "94043", "02110"])) == "string"  # zip codes keep their zeros
+    assert infer_text_dtype(pd.Series(["1234", "5", "7", "A"])) == "string"  # 75% of ints is not enough
+
+
+def test_a_few_outliers_do_not_change_the_vote():
+    values = pd.Series([str(i) for i in range(99)] + ["n/a"])
+    assert infer_text_dtype(values) == "int"  # 99% >= VOTE_THRESHOLD
+    assert VOTE_THRESHOLD == 0.95
+
+
+def test_infer_schema():
+    df = pd.DataFrame({
+        "year": [2024, 2025],
+        "zip": ["01234", "94043"],
+        "score": ["1.5", "2"],
+        "empty": [None, None],
+        "cylDeact": ["Y", "N"],  # listed in BOOLEAN_COLUMNS
+    })
+    schema = infer_schema(df)
+    assert {c: entry["dtype"] for c, entry in schema.items()} == {
+        "year": "int", "zip": "string", "score": "float", "empty": "object", "cylDeact": "boolean"}
+    assert schema["zip"]["example"] == "01234" and schema["empty"]["example"] is None
+
+
+def test_schema_cache_key_follows_the_sample():
+    df = pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+    assert schema_cache_key(df) == schema_cache_key(df.copy())
+    assert schema_cache_key(df) != schema_cache_key(df.assign(name=["a", "c"]))
+    assert schema_cache_key(df) != schema_cache_key(df.astype({"id": "float64"}))
+    assert schema_cache_key(df) != schema_cache_key(df.rename(columns={"name": "make"}))
+
+
+def test_produce_schemas_reuses_cached_schemas(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "Recalls_20250101_000000.csv"
+    pd.DataFrame({"id": range(10), "make": ["FORD"] * 10}).to_csv(path, index=False)
+    file_dict = {"NHTSafetyAdministration": {"Recalls": str(path)}}
+
+    def produce():
+        produce_schemas({"NHTSafetyAdministration": ","}, write_json_flag=True, file_dict=file_dict, sample_rows=5)
+        return capsys.readouterr().out
+
+    assert "(cached)" not in produce()
+    assert "(cached)" in produce()
+
+    # rows outside the sample don't change the key, rows inside it do
+    pd.DataFrame({"id": range(10), "make": ["FORD"] * 5 + ["KIA"] * 5}).to_csv(path, index=False)
+    assert "(cached)" in produce()
+    pd.DataFrame({"id": range(10), "make": ["KIA"] * 10}).to_csv(path, index=False)
+    assert "(cached)" not in produce()
+
+    cache = json.loads((tmp_path / "extracted_schemas" / "schema_cache.json").read_text())
+    assert len(cache) == 1  # only the entry of the current file is kept
+    schema = json.loads((tmp_path / "extracted_schemas" / "NHTSafetyAdministration" / "Recalls.json").read_text())
+    assert schema["Recalls"]["make"] == {"dtype": "string", "example": "KIA"}
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+from utils import stage_storage
+from utils.stage_storage import (CsvStorage, dataframe_from_buffer, dataframe_to_buffer, get_storage, iter_stage_file,
+                                 read_stage_file, resolve_storage_format)
+
+
+def write_chunks(storage, folder, chunks: list) -> str:
+    writer = storage.open_writer(folder_name=str(folder), filename="Stations")
+    for chunk in chunks:
+        writer.write(chunk)
+    return writer.close()
+
+
+def test_parquet_chunks_promote_the_schema(tmp_path):
+    pytest.importorskip("pyarrow")
+    from utils.stage_storage import ParquetStorage
+
+    # sparse NREL-like columns: all null (null type) or float in the first chunk, text later, then a new column
+    chunks = [
+        pd.DataFrame({"id": [1, 2], "ev_network": [None, None], "hy_status": [1.5, None]}),
+        pd.DataFrame({"id": [3], "ev_network": ["Tesla"], "hy_status": ["Available"]}),
+        pd.DataFrame({"id": [4], "ev_network": [None], "hy_status": [None], "ng_psi": [3600]}),
+    ]
+    df = read_stage_file(write_chunks(ParquetStorage(), tmp_path, chunks))
+
+    assert df["id"].tolist() == [1, 2, 3, 4]
+    assert df["ev_network"].tolist()[2] == "Tesla" and df["ev_network"].isna().sum() == 3
+    assert df["hy_status"].tolist()[::2] == ["1.5", "Available"]
+    assert df["ng_psi"].isna().tolist() == [True, True, True, False]
+
+
+def test_parquet_empty_first_chunk(tmp_path):
+    pytest.importorskip("pyarrow")
+    from utils.stage_storage import ParquetStorage
+
+    chunks = [pd.DataFrame({"id": pd.Series([], dtype="int64"), "name": pd.Series([], dtype=object)}),
+              pd.DataFrame({"id": [1], "name": ["a"]})]
+    df = read_stage_file(write_chunks(ParquetStorage(), tmp_path, chunks))
+    assert df.to_dict("list") == {"id": [1], "name": ["a"]}
+
+
+def frame() -> pd.DataFrame:
+    return pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b|c", None], "score": [1.5, None, 3.0]})
+
+
+def test_csv_round_trip(tmp_path):
+    storage = CsvStorage(sep='|', quoting=1)
+    path = storage.write(frame(), folder_name=str(tmp_path), filename="Stations")
+    assert path.endswith(".csv")
+
+    pd.testing.assert_frame_equal(read_stage_file(path, sep='|'), frame())
+    assert read_stage_file(path, sep='|', columns=["name", "missing"]).columns.tolist() == ["name"]
+    assert read_stage_file(path, sep='|', nrows=2)["id"].tolist() == [1, 2]
+
+
+def test_chunks_round_trip(tmp_path):
+    df = frame()
+    path = write_chunks(CsvStorage(), tmp_path, [df.iloc[:2], df.iloc[2:]])
+    chunks = list(iter_stage_file(path, chunksize=2, dtype={"name": "string"}))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks, ignore_index=True)["id"].tolist() == [1, 2, 3]
+
+
+def test_parquet_round_trip_keeps_types(tmp_path):
+    pytest.importorskip("pyarrow")
+    from utils.stage_storage import ParquetStorage
+
+    df = frame().assign(flag=pd.array([True, None, False], dtype="boolean"),
+                        updated_at=pd.to_datetime(["2025-01-01", "2025-01-02", None]))
+    path = ParquetStorage().write(df, folder_name=str(tmp_path), filename="Stations")
+
+    pd.testing.assert_frame_equal(read_stage_file(path), df)
+    assert read_stage_file(path, columns=["flag", "missing"]).columns.tolist() == ["flag"]
+    assert read_stage_file(path, nrows=1)["id"].tolist() == [1]
+    assert dataframe_from_buffer(dataframe_to_buffer(df))["flag"].dtype == "boolean"
+
+
+def test_parquet_falls_back_to_csv_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(stage_storage, "PARQUET_AVAILABLE", False)
+
+    with pytest.warns(RuntimeWarning, match="pyarrow"):
+        assert resolve_storage_format("parquet") == "csv"
+    with pytest.warns(RuntimeWarning):
+        storage = get_storage("parquet", sep='|')
+    assert isinstance(storage, CsvStorage) and storage.sep == '|'
+    with pytest.raises(ImportError):
+        stage_storage.ParquetStorage()
+
+    df = frame()
+    assert dataframe_to_buffer(df)[0] == "pickle"
+    pd.testing.assert_frame_equal(dataframe_from_buffer(dataframe_to_buffer(df)), df)
+
+
+def test_unknown_storage_format():
+    with pytest.raises(ValueError, match="Unknown storage format"):
+        resolve_storage_format("xlsx")
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from utils.state_store import StateStore
+from utils.orchestrator import PipelineOrchestrator
+
+
+def test_watermark_only_moves_forward(tmp_path):
+    state = StateStore(path=str(tmp_path / "state.json"))
+    state.set_watermark("AlternativeFuel", "updated_at", "2025-01-02")
+    state.set_watermark("AlternativeFuel", "updated_at", "2025-01-01")
+    state.set_watermark("AlternativeFuel", "updated_at", None)
+    assert state.get_watermark("AlternativeFuel", "updated_at") == "2025-01-02"
+
+
+def test_seen_ids_round_trip(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = StateStore(path=path)
+    state.add_seen_ids("FuelEconomy", 2025, [3, 1, 2])
+    state.save()
+
+    reloaded = StateStore(path=path)
+    assert reloaded.seen_ids("FuelEconomy", 2025) == {"1", "2", "3"}
+    assert reloaded.seen_ids("FuelEconomy", 2024) == set()
+
+
+def test_save_persists_only_the_given_source(tmp_path):
+    path = tmp_path / "state.json"
+    state = StateStore(path=str(path))
+    state.add_seen_ids("FuelEconomy", 2025, [1])
+    state.set_watermark("AlternativeFuel", "updated_at", "2025-01-02")
+    state.save(source="FuelEconomy")
+
+    saved = json.loads(path.read_text())
+    assert saved == {"FuelEconomy": {"seen": {"2025": ["1"]}}}
+
+    state.save(source="AlternativeFuel")
+    saved = json.loads(path.read_text())
+    assert saved["AlternativeFuel"] == {"watermarks": {"updated_at": "2025-01-02"}}
+
+
+def test_unreadable_state_starts_empty(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("{not json")
+    assert StateStore(path=str(path)).state == {}
+
+
+class StubETL:
+    """
+    Stands in for an ETL: marks one id as seen during extraction, like FuelEconomyETL does.
+    """
+    concurrency = 1
+
+    def __init__(self, state: StateStore, source: str):
+        self.state = state
+        self.source = source
+
+    async def run_all(self, client):
+        self.state.add_seen_ids(self.source, 2025, [42])
+
+    def save_state(self):
+        self.state.save(source=self.source)
+
+
+def test_state_not_saved_when_a_source_fails_after_extraction(tmp_path, monkeypatch):
+    path = tmp_path / "state.json"
+    state = StateStore(path=str(path))
+    etls = {"Good": StubETL(state, "Good"), "Bad": StubETL(state, "Bad")}
+    orchestrator = PipelineOrchestrator(etls, processing_workers=1)
+
+    def process_source(source):
+        if source == "Bad":
+            raise RuntimeError("processing failed")
+        return {}
+    monkeypatch.setattr(orchestrator, "process_source", process_source)
+
+    asyncio.run(orchestrator.run())
+
+    saved = json.loads(path.read_text())
+    assert saved == {"Good": {"seen": {"2025": ["42"]}}}
+    assert StateStore(path=str(path)).seen_ids("Bad", 2025) == set()
@@ -0,0 +1,72 @@
+import json
+import os
+import pandas as pd
+from utils.alternative_fuel_async import StationFlattener
+from utils.table_builder import TableBuilder
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "alternative_fuel_schema.json")) as f:
+    SCHEMA = json.load(f)
+
+STATIONS = [
+    {"id": 1, "station_name": "A", "state": "CA", "ev_connector_types": ["J1772", "CHADEMO"], "hy_pressures": None,
+     "federal_agency": {"id": 9, "name": "GSA"},  # a single object, not a list: no child rows
+     "ev_charging_units": [{"network": "X", "count": 2}, {"network": "Y", "count": 1}], "related_stations": []},
+    {"id": 2, "station_name": "B", "state": "NY", "ev_connector_types": [], "hy_pressures": ["H70"],
+     "ev_network_ids": [{"station": ["s1"], "posts": ["p1", "p2"]}], "unknown_field": "kept"},
+    {"id": 3, "station_name": "C", "state": "TX", "funding_sources": ["NEVI"],
+     "ev_charging_units": [{"network": "Z", "count": 4, "power_kw": 150}]},
+]
+
+
+def per_table_passes(stations: list) -> dict:
+    """
+    The previous normalization: one pass for the Stations table, one for all the arrays, one per record field.
+    """
+    simple_types = ["Int64", "string", "float64", "boolean"]
+    complex_fields = [c for c, dtype in SCHEMA.items() if dtype not in simple_types]
+    array_fields = [c for c, dtype in SCHEMA.items() if dtype == 'array']
+    record_fields = [c for c, dtype in SCHEMA.items() if dtype == 'record']
+    tables = {name: TableBuilder(name) for name in ['stations'] + array_fields + record_fields}
+
+    for el in stations:
+        tables['stations'].append({k: v for k, v in el.items() if k not in complex_fields})
+    for el in stations:
+        for key in array_fields:
+            for v in el.get(key) or []:
+                tables[key].append({'id': el['id'], key: v})
+    for field in record_fields:
+        for el in stations:
+            v = el.get(field)
+            if isinstance(v, list) and v and isinstance(v[0], dict):
+                for nested in v:
+                    tables[field].append({'id': el['id'], **{f"{field}_{nk}": nv for nk, nv in nested.items()}})
+    return tables
+
+
+def test_single_pass_matches_the_per_table_passes():
+    flattener = StationFlattener(SCHEMA)
+    flattener.add(STATIONS[:2])  # page by page, as the ETL does
+    flattener.add(STATIONS[2:])
+    expected = per_table_passes(STATIONS)
+
+    assert flattener.tables.keys() == expected.keys()
+    for name, table in expected.items():
+        df = flattener.tables[name].to_dataframe()
+        if table.to_dataframe() is None:
+            assert df is None, name
+        else:
+            pd.testing.assert_frame_equal(df, table.to_dataframe(), obj=name)
+
+
+def test_child_tables_rows():
+    flattener = StationFlattener(SCHEMA)
+    flattener.add(STATIONS)
+    tables = {name: table.to_dataframe() for name, table in flattener.tables.items()}
+
+    assert tables['stations']['id'].tolist() == [1, 2, 3]
+    assert "ev_connector_types" not in tables['stations'].columns and "unknown_field" in tables['stations'].columns
+    assert tables['ev_connector_types'].values.tolist() == [[1, "J1772"], [1, "CHADEMO"]]
+    assert tables['ev_charging_units'].columns.tolist() == [
+        "id", "ev_charging_units_network", "ev_charging_units_count", "ev_charging_units_power_kw"]
+    assert tables['ev_charging_units']['id'].tolist() == [1, 1, 3]
+    assert tables['federal_agency'] is None and tables['related_stations'] is None
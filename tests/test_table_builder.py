@@ -0,0 +1,39 @@
+import pandas as pd
+from utils.table_builder import TableBuilder
+
+ROWS = [
+    {"id": 1, "make": "A", "mpg": 30.5},
+    {"id": 2, "make": "B"},
+    {"id": 3, "make": "C", "mpg": 21.0, "trim": "LX"},
+]
+
+
+def test_same_frame_as_one_dataframe_per_row():
+    table = TableBuilder("fuel")
+    for row in ROWS:
+        table.append(row)
+
+    expected = pd.concat([pd.DataFrame([row]) for row in ROWS], ignore_index=True)
+    pd.testing.assert_frame_equal(table.to_dataframe(), expected)
+
+
+def test_extend_accepts_lists_single_objects_and_none():
+    table = TableBuilder()
+    table.extend(ROWS[:2])
+    table.extend(ROWS[2])  # an API answering one object instead of a list of one
+    table.extend(None)
+    table.extend([{}, None])
+    table.append({})
+    assert len(table) == 3
+    assert table.to_dataframe()["id"].tolist() == [1, 2, 3]
+
+
+def test_first_columns_are_moved_to_the_front():
+    table = TableBuilder()
+    table.extend(ROWS)
+    df = table.to_dataframe(first_columns=["trim", "year", "make"])
+    assert list(df.columns) == ["trim", "make", "id", "mpg"]
+
+
+def test_empty_table_is_none():
+    assert TableBuilder().to_dataframe() is None
@@ -1,8 +1,16 @@
 import asyncio
-import aiohttp  # async replacement for requests
 import pandas as pd
+from collections import deque
+from itertools import islice
 import os
 import json
+from urllib.parse import urlparse
+from utils.http_client import AsyncHttpClient
+from utils.response_cache import ResponseCache
+from utils.state_store import StateStore
+from utils.stage_storage import get_storage
+from utils.run_catalog import RunCatalog
+from utils.table_builder import TableBuilder
 
 def inspect_df(df: pd.DataFrame, name: str = "DataFrame", n: int = 5):
     
@@ -22,82 +30,34 @@ class AlternativeFuelAPI:
     # BASE_MPG_DETAIL_URL = "https://www.fueleconomy.gov/ws/rest/ympg/shared/ympgDriverVehicle"
     HEADERS = {"Accept": "application/json", "User-Agent": "MyApp/1.0"}
     ENDPOINTS = {
-        "get_stations": "/api/alt-fuel-stations/v1.json"
+        "get_stations": "/api/alt-fuel-stations/v1.json",
+        "get_last_updated": "/api/alt-fuel-stations/v1/last-updated.json"
     }
+    API_KEY = "61PcQy8NHlSjJKWx3CD8LXzWYAuA4E9bBQZzp8jQ"
 
-    def __init__(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore):
-        self.session = session
-        self.semaphore = semaphore
+    # requests per second to BASE_URL's host, replaces the fixed 0.5s sleep before every call
+    RATE_LIMIT = 10.0
 
-    async def _fetch(self, url: str, params: dict = None):
-        """
-        Core async request method.
-        - Uses aiohttp for non-blocking HTTP calls.
-        - Semaphore ensures we only run N requests at a time (avoiding overload).
-        """
-        async with self.semaphore:
-            async with self.session.get(url, headers=self.HEADERS, params=params) as r:
-                
-                # print(r.status)
-                
-                if r.status == 204:
-                    print(f"Response from {url} sent status {r.status}")
-                    return None
-                
-                elif r.status == 403:
-                    print(f"Response from {url} sent status {r.status}")
-                    return None
-                
-                try:
-                    return await r.json()
-                except Exception:
-                    print(f"Response from {url} not in JSON format")
-                    return None
-
-    async def _fetch_new_version(self, url: str, params: dict = None, retries: int = 3, delay: float = 0.5) -> dict | None:
-        """
-        Core async request method with retry/backoff.
-        """
-        async with self.semaphore:
-            for attempt in range(retries):
-                if attempt > 0:
-                    # Backoff between retries
-                    wait = 2 ** attempt
-                    print(f"Retrying {url} after {wait}s...")
-                    await asyncio.sleep(wait)
-                else:
-                    # Optional small delay even before first call
-                    await asyncio.sleep(delay)
-
-                async with self.session.get(url, headers=self.HEADERS, params=params) as r:
-                    status = r.status
-
-                    if status == 200:
-                        try:
-                            # print(f"Status {status} -> Response from {url} and params {params} in JSON format")
-                            return await r.json()
-                        except Exception:
-                            print(f"Response from {url} not in JSON format")
-                            return None
-
-                    elif status == 204:
-                        print(f"No content (204) from {url} and params {params}")
-                        return None
-
-                    elif status == 403:
-                        print(f"403 from {url} and params {params}, attempt {attempt+1}/{retries}")
-                        continue  # retry after backoff
+    # response cache TTLs (seconds) per URL prefix: station pages change daily
+    CACHE_TTLS = {
+        f"{BASE_URL}{ENDPOINTS['get_stations']}": 6 * 3600,
+    }
 
-                    else:
-                        # print(f"Unexpected {status} from {url} and params {params}")
-                        return None
+    def __init__(self, client: AsyncHttpClient, concurrency: int = None):
+        self.client = client
+        self.client.set_rate_limit(urlparse(self.BASE_URL).hostname, self.RATE_LIMIT)
+        self.client.set_host_limit(urlparse(self.BASE_URL).hostname, concurrency) if concurrency else None
+        self.client.set_cache_ttls(self.CACHE_TTLS)
 
-            print(f"Giving up on {url} after {retries} retries")
-            return None
+    async def _fetch(self, url: str, params: dict = None) -> dict | None:
+        """
+        Core async request method, delegated to the shared AsyncHttpClient
+        (connection pool, concurrency limit, per-host rate limit and retries).
+        """
+        return await self.client.get_json(url, params=params, headers=self.HEADERS)
 
     async def _fetch_menu_items(self, endpoint: str, params: dict = None) -> list:
-        # data = await self._fetch(endpoint, params=params)
-        data = await self._fetch_new_version(url=endpoint, params=params)
+        data = await self._fetch(endpoint, params=params)
         
         # print(f"DATA IS {data}")
         
@@ -107,7 +67,7 @@ class AlternativeFuelAPI:
     
         endpoint = f"{self.BASE_URL}{self.ENDPOINTS['get_stations']}"
         params = {
-            "api_key": "61PcQy8NHlSjJKWx3CD8LXzWYAuA4E9bBQZzp8jQ",  # Required
+            "api_key": self.API_KEY,  # Required
             "fuel_type": "ELEC, HY, LNG",        # Optional, e.g., 'ELEC', 'CNG', etc.
             # "state": "CA",              # Optional, 2-letter state code
             # "zip": "94043",             # Optional, ZIP code
@@ -138,15 +98,70 @@ class AlternativeFuelAPI:
         else:
             return None
 
+    async def get_last_updated(self) -> str | None:
+        """
+        Timestamp of the most recent change anywhere in the station dataset.
+        """
+        endpoint = f"{self.BASE_URL}{self.ENDPOINTS['get_last_updated']}"
+        data = await self._fetch_menu_items(endpoint, params={"api_key": self.API_KEY})
+        return data.get("last_updated") if data else None
+
+class StationFlattener:
+    """
+    Single-pass normalizer for NREL station dicts, driven by utils/alternative_fuel_schema.json.
+    - Simple typed fields -> one row per station in the 'stations' table.
+    - 'array' fields -> one row per (station id, element) in a table named after the field.
+    - 'record' fields (lists of objects) -> one row per object, columns prefixed with the field name.
+    Each station dict is visited once and written to all tables at the same time.
+    """
+    SIMPLE_TYPES = ["Int64", "string", "float64", "boolean"]
+
+    def __init__(self, schema: dict):
+        self.complex_fields = {c for c, dtype in schema.items() if dtype not in self.SIMPLE_TYPES}
+        self.field_kinds = {c: dtype for c, dtype in schema.items() if dtype in ('array', 'record')}
+        self.tables = {'stations': TableBuilder('stations')}
+        self.tables.update({field: TableBuilder(field) for field in self.field_kinds})
+
+    def add(self, stations: list):
+        stations_rows = self.tables['stations'].rows
+        field_kinds, complex_fields, tables = self.field_kinds, self.complex_fields, self.tables
+
+        for el in stations:
+            station_id = el['id']
+            row = {}
+            for k, v in el.items():
+                if k not in complex_fields:
+                    row[k] = v
+                elif not v:
+                    continue
+                elif field_kinds.get(k) == 'array':
+                    # include id along with this key only
+                    tables[k].rows.extend({'id': station_id, k: elem} for elem in v)
+                elif field_kinds.get(k) == 'record' and isinstance(v, list) and isinstance(v[0], dict):
+                    # Nested objects: one row per element
+                    tables[k].rows.extend(
+                        {'id': station_id, **{f"{k}_{nk}": nv for nk, nv in nested.items()}} for nested in v
+                    )
+            stations_rows.append(row)
+
+
 class AlternativeFuelETL:
-    def __init__(self, concurrency=10):
+    def __init__(self, concurrency=10, cache: ResponseCache = None, state: StateStore = None, page_size=200, window=None,
+                 write_files=True, storage_format="parquet", catalog: RunCatalog = None):
         self.concurrency = concurrency  # limit concurrent requests
+        self.write_files = write_files  # persist the extracted tables to extracted_data/ (not needed for the in-memory handoff)
+        self.storage = get_storage(storage_format, sep='|', quoting=1)  # 'parquet' (typed, compressed) or 'csv'
+        self.catalog = catalog  # optional run catalog, records the files written by this run
+        self.cache = cache  # optional persistent HTTP response cache
+        self.state = state  # incremental mode: only stations updated after the stored 'updated_at' watermark
+        self.page_size = page_size  # stations per request
+        self.window = window or concurrency  # max station pages in flight
+        self.station_count = 0
+        self.failed_pages = []  # offsets of the pages that failed all their retries
 
-    async def _safe_concat(self, df_list):
-        if any(curr_df is not None for curr_df in df_list):
-            return pd.concat(df_list)
-        else:
-            return None
+    async def _safe_concat(self, table: TableBuilder, first_columns: list = None):
+        # one DataFrame per output table, built from the accumulated rows (None if there are none)
+        return table.to_dataframe(first_columns=first_columns)
         
     async def _reorder_dataframe(self, df : pd.DataFrame, first_columns : list):
         # new_order = ['manufacturer', 'type', 'productYear', 'productMake', 'productModel', 'odiNumber']
@@ -157,203 +172,105 @@ class AlternativeFuelETL:
     def _check_if_attribute_exists(self, attribute_name : str):
         return hasattr(self, attribute_name) and getattr(self, attribute_name) is not None
         
-    async def extract_stations(self, api: AlternativeFuelAPI):
-        
-         # First, get the total count
-        limit = 50
-        first_batch = await api.get_stations(offset=0, limit=limit)
-        
-        print(f"first_batch KEYS: {[k for k,v in first_batch.items()]}")
+    async def dataset_changed_since(self, api: AlternativeFuelAPI, watermark: str) -> bool:
+        """
+        Ask the last-updated endpoint whether anything changed after `watermark` (assume yes if unsure).
+        """
+        last_updated = await api.get_last_updated()
+        if not last_updated:
+            return True
+        try:
+            return pd.Timestamp(last_updated).tz_localize(None) > pd.Timestamp(watermark).tz_localize(None)
+        except (ValueError, TypeError):
+            return True
+
+    async def _get_station_page(self, api: AlternativeFuelAPI, offset: int, retries: int = 3) -> dict | None:
+        """
+        Fetch one page, retrying the page as a whole if the client gave up on it (None),
+        so one bad page doesn't abort the whole extract.
+        """
+        for attempt in range(retries):
+            page = await api.get_stations(offset=offset, limit=self.page_size)
+            if page is not None:
+                return page
+            if attempt < retries - 1:
+                print(f"Page at offset {offset} failed, retrying ({attempt+1}/{retries})")
+                await asyncio.sleep(2 ** attempt)
+        print(f"Giving up on page at offset {offset} after {retries} attempts")
+        return None
+
+    async def stream_station_pages(self, api: AlternativeFuelAPI):
+        """
+        Async generator over station pages, in offset order.
+        - The first page gives the total count; then at most `self.window` pages are in flight.
+        - Each page is yielded (and can be released) as soon as it arrives, so memory doesn't grow with the station count.
+        """
+        first_batch = await self._get_station_page(api, offset=0)
+        if not first_batch:
+            self.failed_pages.append(0)
+            return
 
         total_count = first_batch['total_results']  # total number of stations reported by API
-        all_stations = first_batch['fuel_stations']
-        
-        # print("first_batch - ", type(first_batch))
-        # print("total count - ", type(total_count), total_count)
-        # print("stations - ",  type(all_stations), len(all_stations)) #, stations[0])
-        
-        # Generate offsets for the remaining batches
-        offsets = range(limit, total_count, limit)
-        # offsets = range(limit, 151, limit)
-        
-        # print(offsets)
-        
-        results = await asyncio.gather(*(api.get_stations(offset=offset, limit=limit) for offset in offsets))
-        print("LEN OF results - ", len(results))
-        
-        for batch in results:
-            all_stations.extend(batch['fuel_stations'])
-            
-        print("LEN OF ALL STATIONS - ", len(all_stations))
-        
-        self.stations_list = all_stations
-        
-        # results = await asyncio.gather(*(api.get_inspection_locations(state) for state in states))
-        
-        # # Flatten results, ignoring None and exceptions
-        # locs_array = []
-        # for res in results:
-        #     if isinstance(res, Exception):
-        #         print(f"Error: {res}")  # or log properly
-        #     elif res:
-        #         locs_array.extend(res)
-                
-        # df_stations = pd.DataFrame(all_stations)
-        # df_inspections = await self._reorder_dataframe(df_inspections, ['State','City', 'Zip','Organization']) 
-        # inspect_df(df_stations)
-        
-        # self.df_inspections = df_inspections
-        
-    def get_stations_list(self):
-        return self.stations_list
-    
-    async def process_arrays(self):
-        
-        data = self.get_stations_list()
-        
-        array_types = self.array_fields.copy()
-        array_types.extend(['id']) 
-        
-        new_data = []
-        for el in data:
-            curr_dict = {k: v for k, v in el.items() if k in array_types and v is not None}
-            new_data.append(curr_dict) if len(curr_dict) > 1 or (len(curr_dict) == 1 and 'id' not in curr_dict) else None
-            
-        # print(new_data)
-        
-                # Step 1: collect data per field
-        field_dicts = {}
-
-        for item in new_data:
-            for key, value in item.items():
-                if key != 'id':
-                    if key not in field_dicts.keys():
-                        field_dicts[key] = []
-                    
-                    for v in value:
-                    # include id along with this key only
-                        field_dicts[key].append({'id': item['id'], key: v})
-                    
-                    
-        print(f"There are {len(field_dicts)} dataframes, one per each array field - {field_dicts.keys()}")
+        print(f"\t-{total_count} stations reported, fetching pages of {self.page_size} ({self.window} in flight)")
+        yield first_batch['fuel_stations']
 
-        # Step 2: optionally convert each list to pandas DataFrame
+        offsets = iter(range(self.page_size, total_count, self.page_size))
+        pending = deque((offset, asyncio.create_task(self._get_station_page(api, offset))) for offset in islice(offsets, self.window))
+        try:
+            while pending:
+                offset, task = pending.popleft()
+                batch = await task
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append((next_offset, asyncio.create_task(self._get_station_page(api, next_offset))))
+                if batch:
+                    yield batch['fuel_stations']
+                else:
+                    self.failed_pages.append(offset)
+        finally:
+            for _, task in pending:
+                task.cancel()
 
-        dfs = {field: pd.DataFrame(lst) for field, lst in field_dicts.items()}
-        
-        for field_name, curr_df in dfs.items(): 
-            # inspect_df(dfs[field_name], n=10, name=field_name)
-            setattr(self, f"df_{field_name}", curr_df)
-            
-        
-    async def process_records(self, record_type_field : str): 
-        
-        print(f"PROCESSING 'record' typed objects -> '{record_type_field}'")   
-            
-        data = self.get_stations_list()
+    async def extract_stations(self, api: AlternativeFuelAPI):
+        """
+        Stream the station pages straight into the processing steps; no page is kept after it is processed.
+        """
+        watermark = self.state.get_watermark("AlternativeFuel", "updated_at") if self.state is not None else None
+        if watermark and not await self.dataset_changed_since(api, watermark):
+            print(f"\t-Incremental mode: no station updated since {watermark}, skipping extraction")
+            return
 
-        # Combine array fields and 'id'
-        # record_types = self.record_fields.copy()
-        # record_types.extend(['id'])
-        
-        # print(f"RECORD FIELDS: {record_types}")
+        latest_update = None
+        async for stations in self.stream_station_pages(api):
+            if self.state is not None:
+                # the stations endpoint has no 'updated since' filter: keep only stations changed after the watermark
+                stations = [st for st in stations if not watermark or (st.get('updated_at') or '') > watermark]
+                latest_update = max([latest_update or ''] + [st.get('updated_at') or '' for st in stations]) or None
 
-        # Step 1: filter data
-        
-        record_types = ['id', record_type_field]
-        
-        # count=0
-        
-        new_data = []
-        for el in data:
-            
-            # print(f"elem -> {el}")
-            
-            # curr_dict = {k: v for k, v in el.items() if k in record_types and v is not None and (isinstance(v, list) and len(v) > 0)}
-            curr_dict = {k: v for k, v in el.items() if k in record_types and v is not None}
-            
-            # print(f"current dict", curr_dict)
-            
-            if len(curr_dict) > 1 or (len(curr_dict) == 1 and 'id' not in curr_dict):
-                new_data.append(curr_dict)
-                
-            # count+=1
-            
-            # if count >= 15:
-            #     break
-            
-        # print("new_data", new_data, "\n")
-        
-        if not new_data:
-            return None
-        
-        # Keep only non-empty list fields along with 'id'
-        filtered_data = []
-        for item in new_data:
-            new_item = {'id': item['id']}
-            for k, v in item.items():
-                if k != 'id' and isinstance(v, list) and v:
-                    new_item[k] = v
-            if len(new_item) > 1:  # Only keep if there is at least one non-empty list field
-                filtered_data.append(new_item)
-
-        # print("filtered data", filtered_data, "\n")
-        
-        # filtered_data = [
-        #     {'id': 6505, 'related_stations': [
-        #         {'id': 121595, 'access_code': 'private', 'fuel_type_code': 'ELEC'},
-                
-        #         {'id': 1111111, 'access_code': 'TESSST', 'fuel_type_code': 'OLAAAA'}
-        #         ]
-        #      },
-        #     {'id': 23480, 'related_stations': [{'id': 7041, 'access_code': 'public', 'fuel_type_code': 'CNG'}]},
-        #     {'id': 32051, 'related_stations': [{'id': 28523, 'access_code': 'public', 'fuel_type_code': 'CNG'}]},
-        #     {'id': 34319, 'related_stations': [{'id': 39196, 'access_code': 'public', 'fuel_type_code': 'CNG'}]},
-        #     {'id': 35074, 'related_stations': [{'id': 35073, 'access_code': 'public', 'fuel_type_code': 'CNG'}]},
-        #     {'id': 38488, 'related_stations': [{'id': 38487, 'access_code': 'public', 'fuel_type_code': 'CNG'}]}]
-         
-        
-        flattened = []
+            # one pass over the page fills the Stations table and every array/record child table
+            self.flattener.add(stations)
+            self.station_count += len(stations)
 
-        for item in filtered_data:
-            new_item = {'id': item['id']}
-            
-            for k, v in item.items():
-                if k != 'id' and isinstance(v, list) and v:
-                    # take the first element in the list (or you could loop if multiple)
-                    if isinstance(v[0], dict):
-                        # Nested objects: one row per element
-                        for nested in v:
-                            new_item = {'id': item['id']}
-                            for nk, nv in nested.items():
-                                new_item[f"{k}_{nk}"] = nv
-                            flattened.append(new_item)
-                    
-                    # print('nested', nested)
-                    # for nk, nv in nested.items():
-                    #     new_item[f"{k}_{nk}"] = nv
-            
-            # flattened.append(new_item)
-    
-        # print("flattened data", flattened)
-        
-        df = pd.DataFrame(flattened)
-        
-        # inspect_df(df, n=10, name=record_type_field)
-        
-        setattr(self, f"df_{record_type_field}", df)
+        print(f"\t-Extracted {self.station_count} stations" + (f" updated since {watermark}" if watermark else ""))
+        if self.failed_pages:
+            # the stations of a failed page would fall below the new watermark and never be fetched again
+            print(f"\t-{len(self.failed_pages)} station pages failed (offsets {self.failed_pages}): watermark kept at {watermark}")
+        elif self.state is not None:
+            self.state.set_watermark("AlternativeFuel", "updated_at", latest_update)
+
+    async def build_dataframes(self):
+        """
+        Materialize one DataFrame per table once all the pages were processed.
+        """
+        first_cols = ['id', 'station_name', 'fuel_type_code', 'owner_type_code', 'country', 'state', 'city', 'street_address', 'zip', 'open_date', 'updated_at']
+        self.df_stations = await self._safe_concat(self.flattener.tables['stations'], first_cols)
+        inspect_df(self.df_stations)
+
+        for field in self.array_fields + self.record_fields:
+            setattr(self, f"df_{field}", await self._safe_concat(self.flattener.tables[field]))
+
+        print(f"There are {len(self.get_output())} dataframes -> {list(self.get_output().keys())}")
 
-        # new_data=[]
-        
-        # for json_dict in new_data:
-        #     for k, v in json_dict.items():
-        #         json_dict.pop(k) if isinstance(v, list) and len(v)==0 else None
-                
-        #         # if isinstance(v, list):
-        #         #     print(f"Field {k} is of type list {v} and has length {len(v)}")
-        
-        # print("new_data", new_data)
-        
     def get_fields_types(self):
          
         # load schema
@@ -375,22 +292,8 @@ class AlternativeFuelETL:
         
         print(f"Fields of type 'record' -> {self.record_fields}")
         
-    async def process_stations(self):
-      
-        data = self.get_stations_list()
-            
-        df = pd.DataFrame(data)
-        df_cols = df.columns
-        df.drop(axis=1, columns=[c for c in self.complex_fields if c in df_cols], inplace=True)
+        self.flattener = StationFlattener(schema)
         
-        first_cols = ['id', 'station_name', 'fuel_type_code', 'owner_type_code', 'country', 'state', 'city', 'street_address', 'zip', 'open_date', 'updated_at']
-        df = await self._reorder_dataframe(df, first_cols) 
-        
-        inspect_df(df)
-        
-        self.df_stations = df
-        
-
     def write_to_csv(self, df: pd.DataFrame, filename: str, df_name: str = "DataFrame", sep : str = '|'):
         if df is not None:
             current_time = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
@@ -415,32 +318,49 @@ class AlternativeFuelETL:
             if df.startswith('df') and getattr(self, df) is not None
         }
     
-    async def run_all(self):
-        async with aiohttp.ClientSession() as session:
-            semaphore = asyncio.Semaphore(self.concurrency)
-            api = AlternativeFuelAPI(session, semaphore)
-                        
-            self.get_fields_types()
-            
-            await self.extract_stations(api)
-            
-            await self.process_stations()
-            await self.process_arrays()
-            
-            special_fields = self.array_fields
-            special_fields.extend(self.record_fields)
-                        
-            for special_typed_field in special_fields:
-                dataframe_name = f"df_{special_typed_field}"
-                
-                await self.process_records(record_type_field=special_typed_field) if special_typed_field in self.record_fields else None
-                
-                if self._check_if_attribute_exists(dataframe_name):
-                    df_attribute_name = getattr(self, dataframe_name)
-                                
-                    filename = self.to_camel_case(special_typed_field)
-                    # inspect_df(df_attribute_name, name = filename)
-                    self.write_to_csv(df=df_attribute_name, filename=filename, df_name=dataframe_name)
-
-            self.write_to_csv(df=self.df_stations, filename="Stations", df_name="df_stations") if self._check_if_attribute_exists("df_stations") else None
-            
\ No newline at end of file
+    def get_tables(self):
+        """
+        Output DataFrames keyed by table name (Stations, EvConnectorTypes, ...), ready to hand over to Processing in memory.
+        """
+        return {self.to_camel_case(k): df for k, df in self.get_output().items()}
+
+    async def write_outputs(self):
+        # stage files are written concurrently in worker threads, off the event loop
+        tables = self.get_tables()
+        paths = await asyncio.gather(*(
+            asyncio.to_thread(self.storage.write, df=df, folder_name="extracted_data/AlternativeFuel", filename=name, df_name=name)
+            for name, df in tables.items()
+        ))
+        if self.catalog is not None:
+            for (name, df), path in zip(tables.items(), paths):
+                self.catalog.add(stage="extracted_data", dataset="AlternativeFuel", table=name, path=path, df=df)
+
+    async def run_all(self, client: AsyncHttpClient = None):
+        """
+        Run the source with `client`, e.g. one shared with the other sources (see orchestrator.py),
+        or with a client of its own.
+        """
+        if client is None:
+            async with AsyncHttpClient(concurrency=self.concurrency, cache=self.cache) as client:
+                return await self.run_all(client)
+
+        api = AlternativeFuelAPI(client, concurrency=self.concurrency)
+                    
+        self.get_fields_types()
+        
+        await self.extract_stations(api)
+        
+        if not self.station_count:
+            print("No stations to process.")
+            return
+        
+        await self.build_dataframes()
+                    
+        await self.write_outputs() if self.write_files else None
+
+    def save_state(self):
+        """
+        Persist the 'updated_at' watermark. Called by the orchestrator only after the stations are loaded:
+        a watermark saved before a failed load would skip those stations for good.
+        """
+        self.state.save(source="AlternativeFuel") if self.state is not None else None
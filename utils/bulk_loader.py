@@ -0,0 +1,279 @@
+import csv
+import os
+import shutil
+import subprocess
+import tempfile
+from time import perf_counter
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.engine import Engine
+
+
+class BulkLoader:
+    """
+    Bulk insert of DataFrames into SQL tables, used by Loading.
+    - 'executemany' (default): to_sql in chunks of `chunk_size` rows; on mssql+pyodbc the engine is created with
+      fast_executemany, so each chunk is bound as one parameter array instead of row by row.
+    - 'multirow': multi-row INSERT ... VALUES statements, sized to the dialect's parameter limit.
+    - 'bcp': stage the rows in a file in the target table's column order and run the `bcp` utility
+      (falls back to 'executemany' if unavailable).
+    Every load returns (and keeps in `self.stats`) its rows/sec.
+    `upsert` loads into a temp table and merges on natural keys in one set-based statement, writing only changed rows;
+    `replace_groups` does the same for tables without a natural key, replacing whole groups of rows.
+    Works with any SQLAlchemy URL, e.g. 'sqlite:///test.db' to try it locally.
+    """
+    METHODS = ("executemany", "multirow", "bcp")
+    MAX_PARAMS = {"mssql": 2100, "sqlite": 999}  # bound parameters per statement
+    # bcp has no quoting or escaping: the unit/record separators can't collide with the tabs and newlines of free text
+    BCP_FIELD_TERMINATOR = "\x1f"
+    BCP_ROW_TERMINATOR = "\x1e"
+
+    def __init__(self, engine: Engine | str, chunk_size: int = 10000, method: str = "executemany", bcp_args: list = None):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown load method '{method}', expected one of {self.METHODS}")
+        self.engine = self.create_engine(engine) if isinstance(engine, str) else engine
+        self.chunk_size = chunk_size
+        self.method = method
+        self.bcp_args = bcp_args or []  # connection arguments for bcp, e.g. ['-S', server, '-d', database, '-U', user, '-P', password]
+        self.stats = []
+
+    @staticmethod
+    def create_engine(url: str, pool_size: int = 5) -> Engine:
+        """
+        Engine with an explicit QueuePool of `pool_size` connections (no overflow), one per loader thread.
+        """
+        kwargs = {"poolclass": QueuePool, "pool_size": pool_size, "max_overflow": 0, "pool_pre_ping": True}
+        if url.startswith("mssql+pyodbc"):
+            kwargs["fast_executemany"] = True
+        elif url.startswith("sqlite"):
+            kwargs["connect_args"] = {"timeout": 60, "check_same_thread": False}  # one writer at a time: wait for the lock
+        return create_engine(url, **kwargs)
+
+    def _multirow_chunk_size(self, n_cols: int) -> int:
+        max_params = self.MAX_PARAMS.get(self.engine.dialect.name)
+        if max_params is None:
+            return self.chunk_size
+        return max(1, min(self.chunk_size, (max_params - 1) // max(1, n_cols)))
+
+    def table_columns(self, table_name: str, schema: str = None) -> list:
+        return [c["name"] for c in inspect(self.engine).get_columns(table_name, schema=schema)]
+
+    def write_bcp_file(self, df: pd.DataFrame, columns: list, path: str):
+        """
+        Stage `df` for `bcp -c`: one field per table column, in the table's order (bcp maps fields by position).
+        Table columns missing from `df` (e.g. InsertedAt) are left empty, so they get their default (NULL without one);
+        empty strings are read back as NULL too. Booleans are written as 1/0 for BIT columns.
+        Raises ValueError if a value contains a terminator.
+        """
+        staged = df.reindex(columns=columns)
+        for c in staged.columns:
+            if pd.api.types.is_bool_dtype(staged[c]):
+                staged[c] = staged[c].astype("Int8")
+            elif pd.api.types.is_object_dtype(staged[c]) or pd.api.types.is_string_dtype(staged[c]):
+                text_values = staged[c].dropna().astype(str)
+                if text_values.str.contains(f"[{self.BCP_FIELD_TERMINATOR}{self.BCP_ROW_TERMINATOR}]").any():
+                    raise ValueError(f"column {c} contains a bcp terminator (0x1F/0x1E)")
+
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            staged.to_csv(f, sep=self.BCP_FIELD_TERMINATOR, lineterminator=self.BCP_ROW_TERMINATOR,
+                          header=False, index=False, quoting=csv.QUOTE_NONE, escapechar=None)
+
+    def bcp_command(self, qualified_name: str, path: str) -> list:
+        # -c character data as UTF-8 (-C 65001), terminators in hex; no -k: empty fields take the column defaults
+        return (["bcp", qualified_name, "in", path, "-c", "-C", "65001",
+                 "-t", f"0x{ord(self.BCP_FIELD_TERMINATOR):02x}", "-r", f"0x{ord(self.BCP_ROW_TERMINATOR):02x}",
+                 "-b", str(self.chunk_size)] + self.bcp_args)
+
+    def _load_bcp(self, df: pd.DataFrame, table_name: str, schema: str = None) -> bool:
+        if shutil.which("bcp") is None or self.engine.dialect.name != "mssql":
+            print("bcp not available for this engine -> using executemany")
+            return False
+
+        qualified_name = f"{schema}.{table_name}" if schema else table_name
+        fd, path = tempfile.mkstemp(suffix=".bcp")
+        os.close(fd)
+        try:
+            try:
+                self.write_bcp_file(df, self.table_columns(table_name, schema), path)
+            except ValueError as e:
+                print(f"{e} -> {qualified_name} loaded with executemany")
+                return False
+            result = subprocess.run(self.bcp_command(qualified_name, path), capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"bcp failed for {qualified_name}: {result.stderr or result.stdout}")
+            return True
+        finally:
+            os.remove(path)
+
+    def load(self, df: pd.DataFrame, table_name: str, schema: str = None, if_exists: str = "append", dtype: dict = None) -> dict:
+        """
+        Insert `df` into `schema.table_name`; returns {'table', 'method', 'rows', 'seconds', 'rows_per_sec'}.
+        """
+        time_before = perf_counter()
+        method = self.method
+
+        if method == "bcp" and not self._load_bcp(df, table_name, schema):
+            method = "executemany"
+
+        if method != "bcp":
+            df.to_sql(
+                name=table_name,
+                schema=schema,
+                con=self.engine,
+                if_exists=if_exists,
+                index=False,
+                dtype=dtype,
+                chunksize=self._multirow_chunk_size(df.shape[1]) if method == "multirow" else self.chunk_size,
+                method="multi" if method == "multirow" else None,
+            )
+
+        seconds = perf_counter() - time_before
+        stats = {
+            "table": f"{schema}.{table_name}" if schema else table_name,
+            "method": method,
+            "rows": int(df.shape[0]),
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(df.shape[0] / seconds, 1) if seconds > 0 else None,
+        }
+        self.stats.append(stats)
+        print(f"Loaded {stats['rows']} rows into {stats['table']} in {seconds:.3f} s ({stats['rows_per_sec']} rows/s, {method})")
+        return stats
+
+    def _quote(self, name: str) -> str:
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def _merge_sql(self, target: str, source: str, keys: list, columns: list) -> str:
+        """
+        SQL Server MERGE: update matched rows whose values changed (EXCEPT is NULL-safe), insert the new ones.
+        """
+        q = self._quote
+        values = [c for c in columns if c not in keys]
+        on = " AND ".join(f"t.{q(k)} = s.{q(k)}" for k in keys)
+        changed = f"EXISTS (SELECT {', '.join(f's.{q(c)}' for c in values)} EXCEPT SELECT {', '.join(f't.{q(c)}' for c in values)})"
+        update = ", ".join(f"t.{q(c)} = s.{q(c)}" for c in values)
+        insert_cols = ", ".join(q(c) for c in columns)
+        insert_vals = ", ".join(f"s.{q(c)}" for c in columns)
+
+        sql = f"MERGE {target} AS t\nUSING {source} AS s\nON {on}\n"
+        if values:
+            sql += f"WHEN MATCHED AND {changed} THEN\n    UPDATE SET {update}\n"
+        sql += f"WHEN NOT MATCHED BY TARGET THEN\n    INSERT ({insert_cols}) VALUES ({insert_vals});"
+        return sql
+
+    def _delete_insert_sql(self, target: str, source: str, keys: list, columns: list) -> list:
+        """
+        Portable equivalent of the MERGE (e.g. SQLite): delete the changed rows, then insert the rows missing from the target.
+        """
+        q = self._quote
+        values = [c for c in columns if c not in keys]
+        match = " AND ".join(f"s.{q(k)} = {target}.{q(k)}" for k in keys)
+        changed = " OR ".join(f"s.{q(c)} IS NOT {target}.{q(c)}" for c in values) or "0 = 1"
+        columns_sql = ", ".join(q(c) for c in columns)
+        missing = " AND ".join(f"t.{q(k)} = s.{q(k)}" for k in keys)
+        return [
+            f"DELETE FROM {target} WHERE EXISTS (SELECT 1 FROM {source} s WHERE {match} AND ({changed}))",
+            f"INSERT INTO {target} ({columns_sql}) SELECT {columns_sql} FROM {source} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE {missing})",
+        ]
+
+    def replace_groups(self, df: pd.DataFrame, table_name: str, group_keys: list, schema: str = None) -> dict:
+        """
+        Idempotent load of a table without a natural key whose rows come in complete groups (e.g. all the MPG detail rows
+        of a vehicle): the groups of `df` (by `group_keys`) replace their rows in the table, the other groups are kept.
+        Bulk insert into a temp table, then delete + insert in one transaction (NULL group values match each other).
+        """
+        time_before = perf_counter()
+
+        target = f"{self._quote(schema)}.{self._quote(table_name)}" if schema else self._quote(table_name)
+        columns = list(df.columns)
+        columns_sql = ", ".join(self._quote(c) for c in columns)
+        is_mssql = self.engine.dialect.name == "mssql"
+        source = self._quote(f"#{table_name}_replace" if is_mssql else f"{table_name}_replace")
+        if is_mssql:
+            match = " AND ".join(f"(s.{self._quote(k)} = {target}.{self._quote(k)} OR (s.{self._quote(k)} IS NULL AND {target}.{self._quote(k)} IS NULL))"
+                                 for k in group_keys)
+        else:
+            match = " AND ".join(f"s.{self._quote(k)} IS {target}.{self._quote(k)}" for k in group_keys)
+
+        with self.engine.begin() as conn:
+            if is_mssql:
+                conn.execute(text(f"SELECT TOP 0 {columns_sql} INTO {source} FROM {target}"))
+                df.to_sql(name=f"#{table_name}_replace", con=conn, if_exists="append", index=False, chunksize=self.chunk_size)
+            else:
+                df.to_sql(name=f"{table_name}_replace", con=conn, if_exists="replace", index=False, chunksize=self.chunk_size)
+            deleted = conn.execute(text(f"DELETE FROM {target} WHERE EXISTS (SELECT 1 FROM {source} s WHERE {match})")).rowcount
+            conn.execute(text(f"INSERT INTO {target} ({columns_sql}) SELECT {columns_sql} FROM {source}"))
+            conn.execute(text(f"DROP TABLE {source}"))
+
+        seconds = perf_counter() - time_before
+        stats = {
+            "table": f"{schema}.{table_name}" if schema else table_name,
+            "method": "replace",
+            "rows": int(df.shape[0]),
+            "deleted": int(deleted) if deleted is not None and deleted >= 0 else None,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(df.shape[0] / seconds, 1) if seconds > 0 else None,
+        }
+        self.stats.append(stats)
+        print(f"Replaced the {group_keys} groups of {stats['table']} with {stats['rows']} rows in {seconds:.3f} s "
+              f"({stats['deleted']} rows deleted, {stats['rows_per_sec']} rows/s)")
+        return stats
+
+    def upsert(self, df: pd.DataFrame, table_name: str, keys: list, schema: str = None) -> dict:
+        """
+        Idempotent load of `df` into an existing table: bulk insert into a temp table, then merge on `keys`.
+        Rows without a key are skipped (they could never be matched again) and exact duplicate rows are merged once;
+        raises ValueError when distinct rows share a key, since all but one of them would be lost.
+        """
+        time_before = perf_counter()
+
+        missing_keys = df[keys].isna().any(axis=1)
+        if missing_keys.any():
+            print(f"{int(missing_keys.sum())} rows of {table_name} without a value for {keys} skipped")
+        df = df.loc[~missing_keys].drop_duplicates()
+
+        conflicts = df.duplicated(subset=keys, keep=False)
+        if conflicts.any():
+            raise ValueError(f"{int(conflicts.sum())} distinct rows of {table_name} share their key {keys} "
+                             f"({int(df[conflicts].drop_duplicates(subset=keys).shape[0])} keys): not a unique key, nothing merged")
+
+        target = f"{self._quote(schema)}.{self._quote(table_name)}" if schema else self._quote(table_name)
+        columns = list(df.columns)
+        is_mssql = self.engine.dialect.name == "mssql"
+        source = f"#{table_name}_upsert" if is_mssql else f"{table_name}_upsert"
+
+        # one connection / transaction: the temp table only exists for the connection that created it
+        with self.engine.begin() as conn:
+            if is_mssql:
+                # empty copy of the target columns -> same types as the target
+                conn.execute(text(f"SELECT TOP 0 {', '.join(self._quote(c) for c in columns)} INTO {self._quote(source)} FROM {target}"))
+                df.to_sql(name=source, con=conn, if_exists="append", index=False, chunksize=self.chunk_size)
+                result = conn.execute(text(self._merge_sql(target, self._quote(source), keys, columns)))
+                written = result.rowcount
+                conn.execute(text(f"DROP TABLE {self._quote(source)}"))
+            else:
+                df.to_sql(name=source, con=conn, if_exists="replace", index=False, chunksize=self.chunk_size)
+                # key lookups on both sides (without indexes the correlated subqueries are quadratic)
+                keys_sql = ", ".join(self._quote(k) for k in keys)
+                conn.execute(text(f"CREATE INDEX {self._quote(f'ix_{table_name}_upsert')} ON {self._quote(source)} ({keys_sql})"))
+                index_name = f"{self._quote(schema)}.{self._quote(f'ix_{table_name}_keys')}" if schema else self._quote(f"ix_{table_name}_keys")
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self._quote(table_name)} ({keys_sql})"))
+                delete_sql, insert_sql = self._delete_insert_sql(target, self._quote(source), keys, columns)
+                conn.execute(text(delete_sql))
+                written = conn.execute(text(insert_sql)).rowcount  # changed rows are deleted and inserted again
+                conn.execute(text(f"DROP TABLE {self._quote(source)}"))
+
+        seconds = perf_counter() - time_before
+        stats = {
+            "table": f"{schema}.{table_name}" if schema else table_name,
+            "method": "upsert",
+            "rows": int(df.shape[0]),
+            "written": int(written) if written is not None and written >= 0 else None,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(df.shape[0] / seconds, 1) if seconds > 0 else None,
+        }
+        self.stats.append(stats)
+        print(f"Merged {stats['rows']} rows into {stats['table']} on {keys} in {seconds:.3f} s "
+              f"({stats['written']} rows written, {stats['rows_per_sec']} rows/s)")
+        return stats
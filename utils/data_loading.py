@@ -1,15 +1,29 @@
 import pandas as pd
-from sqlalchemy import create_engine, text, NVARCHAR, FLOAT, INTEGER, DateTime, BOOLEAN
+from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from utils.schema_producer import produce_schemas
+from time import perf_counter
+from utils.schema_producer import produce_schemas, table_name_from_path
+from utils.stage_storage import read_stage_file
+from utils.bulk_loader import BulkLoader
 
 class Loading:
-    def __init__(self, server, database, username, password, file_dict: dict):
+    def __init__(self, server=None, database=None, username=None, password=None, file_dict: dict = None,
+                 connection_url: str = None, chunk_size: int = 10000, load_method: str = "executemany", max_rows: int = None,
+                 workers: int = 4, load_mode: str = "append", keys_file: str = "processed_data_schemas/table_keys.json",
+                 replace_keys_file: str = "processed_data_schemas/table_replace_keys.json", schema: str = "stg"):
         """
         Initialize the Loading class with Azure SQL connection using SQLAlchemy.
+        `connection_url` replaces the Azure SQL settings (e.g. 'sqlite:///local.db' to test the loads locally).
+        Inserts go through a BulkLoader (`load_method`, `chunk_size`); `max_rows` limits the rows loaded per table (None = all).
+        Tables are loaded by `workers` threads, sharing a connection pool of the same size.
+        `load_mode='upsert'` merges each table on its natural keys (declared in `keys_file`) instead of appending.
+        Tables without a natural key declare the columns of their row groups in `replace_keys_file` (e.g. MPG_Detail rows
+        come per vehicleId): the groups of the load replace their previous rows. Tables with neither are appended.
+        Tables are created in `schema` (staging); SQLite has no schemas, so there they are created unqualified.
         """        
         
         self.file_dict = file_dict
@@ -21,11 +35,21 @@ class Loading:
         }
         
         driver = "ODBC Driver 18 for SQL Server".replace(" ", "+")  # URL-encode spaces
-        self.conn_str = (
+        self.conn_str = connection_url or (
             f"mssql+pyodbc://{username}:{password}@{server}:1433/{database}"
             f"?driver={driver}&Encrypt=yes&TrustServerCertificate=no"
         )
-        self.engine = create_engine(self.conn_str)
+        self.workers = workers
+        self.engine = BulkLoader.create_engine(self.conn_str, pool_size=workers)  # fast_executemany on mssql+pyodbc
+        self.schema = None if self.engine.dialect.name == "sqlite" else schema
+        self.failed_tables = {}  # table -> error of the last run_all
+        self.max_rows = max_rows
+        self.load_mode = load_mode
+        self.table_keys = self.load_table_keys(keys_file)  # natural keys: MERGE (upsert mode) + primary key / clustered index
+        self.replace_keys = self.load_table_keys(replace_keys_file)  # row groups replaced as a whole (upsert mode) + clustered index
+        
+        bcp_args = ["-S", f"{server},1433", "-d", database, "-U", username, "-P", password] if server else []
+        self.bulk_loader = BulkLoader(self.engine, chunk_size=chunk_size, method=load_method, bcp_args=bcp_args)
 
         # conn_str = f"mssql+pyodbc://{username}:{password}@{server}:1433/{database}?driver={driver}"
         # self.conn_str = conn_str
@@ -38,18 +62,11 @@ class Loading:
         # self.engine = create_engine(self.conn_str)
 
     def get_schema_file(self, filepath: str):
-        
-        aux = filepath.split("\\", 3)[2]
-        substring_name = aux.split('_', 1)[0]
-        
-        if 'MPG' in filepath:
-            substring_name = "_".join([substring_name, aux.split('_', 2)[1]])
-            
-        return substring_name
+        return table_name_from_path(filepath)
     
     def insert_dataframe(self, df: pd.DataFrame, table_name: str, schema: str = "dbo", if_exists: str = "append"):
         """
-        Insert a pandas DataFrame into a SQL table using to_sql with safe dtype handling.
+        Append a pandas DataFrame to an existing SQL table through the BulkLoader.
         """
         if df.empty:
             print("DataFrame is empty, skipping insert")
@@ -69,34 +86,12 @@ class Loading:
         #     elif pd.api.types.is_object_dtype(df[col]):
         #         df[col] = df[col].fillna('')
 
-        # Map pandas dtypes to SQLAlchemy types
-        dtype_map = {}
-        for col, dtype in df.dtypes.items():
-            if pd.api.types.is_integer_dtype(dtype):
-                dtype_map[col] = INTEGER
-            elif pd.api.types.is_float_dtype(dtype):
-                dtype_map[col] = FLOAT
-            elif pd.api.types.is_bool_dtype(dtype):
-                dtype_map[col] = BOOLEAN
-            elif pd.api.types.is_datetime64_any_dtype(dtype):
-                dtype_map[col] = DateTime
-            else:
-                # Use max string length or 1 if empty
-                max_len = df[col].astype(str).map(len).max() or 1
-                dtype_map[col] = NVARCHAR(max_len)
-
+        # no dtype map: the table was created by create_tables, with types sized from the processing column stats
         try:
-            df.to_sql(
-                name=table_name,
-                schema=schema,
-                con=self.engine,
-                if_exists=if_exists,
-                index=False,
-                dtype=dtype_map
-            )
-            print(f"DataFrame written to {schema}.{table_name} successfully")
-        except SQLAlchemyError as e:
+            self.bulk_loader.load(df, table_name=table_name, schema=schema, if_exists=if_exists)
+        except (SQLAlchemyError, RuntimeError) as e:
             print(f"\t ERROR WRITING DataFrame to SQL table {schema}.{table_name}: \n\t{e}")
+            raise
 
     def insert_dataframe_old(self, df: pd.DataFrame, table_name: str, schema: str = "dbo", if_exists: str = "append"):
         """
@@ -137,6 +132,67 @@ class Loading:
         except SQLAlchemyError as e:
             print("Error creating schema:", e)
             
+    def load_table_keys(self, keys_file: str) -> dict:
+        """
+        Key columns per table ({source: {table: [columns]}}), used by the upsert mode.
+        """
+        try:
+            with open(keys_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading table keys from {keys_file}: {e} -> no keys declared")
+            return {}
+
+    def load_column_stats(self, stats_file: str, table_name: str) -> dict | None:
+        """
+        Column stats written by Processing next to the processed schema ({column: {...}}), None if missing.
+        """
+        if not os.path.isfile(stats_file):
+            return None
+        try:
+            with open(stats_file, "r", encoding="utf-8") as f:
+                return json.load(f)[table_name]["columns"]
+        except Exception as e:
+            print(f"Error reading column stats from {stats_file}: {e}")
+            return None
+
+    def upsert_dataframe(self, df: pd.DataFrame, table_name: str, keys: list, schema: str = "dbo"):
+        """
+        Merge a DataFrame into an existing SQL table on its natural keys (only new/changed rows are written).
+        """
+        if df.empty:
+            print("DataFrame is empty, skipping upsert")
+            return
+        try:
+            self.bulk_loader.upsert(df, table_name=table_name, keys=keys, schema=schema)
+        except (SQLAlchemyError, KeyError, ValueError) as e:
+            print(f"\t ERROR MERGING DataFrame into SQL table {schema}.{table_name}: \n\t{e}")
+            raise
+
+    def replace_dataframe(self, df: pd.DataFrame, table_name: str, group_keys: list, schema: str = "dbo"):
+        """
+        Replace the row groups of `df` (by `group_keys`) in an existing SQL table, keeping the other groups.
+        """
+        if df.empty:
+            print("DataFrame is empty, skipping replace")
+            return
+        try:
+            self.bulk_loader.replace_groups(df, table_name=table_name, group_keys=group_keys, schema=schema)
+        except SQLAlchemyError as e:
+            print(f"\t ERROR REPLACING rows of SQL table {schema}.{table_name}: \n\t{e}")
+            raise
+
+    def get_schema_columns(self, json_file: str, table_name: str) -> list | None:
+        """
+        Column names declared in the JSON schema (None if the schema can't be read -> all columns).
+        """
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                return list(json.load(f)[table_name].keys())
+        except Exception as e:
+            print(f"Error reading columns from {json_file}: {e}")
+            return None
+
     def generate_create_table_sql_old(self, json_file: str, table_name: str, schema: str = "dbo") -> str:
         """
         Generate a CREATE TABLE script from a JSON schema with column names and types.
@@ -180,7 +236,71 @@ class Loading:
         return "\n".join(sql_lines)
     
 
-    def generate_create_table_sql(self, json_file: str, table_name: str, schema: str = "dbo") -> str:
+    # columns used to join the staging tables (make/model/year of the three sources); they get nonclustered indexes
+    INDEX_COLUMNS = [
+        ['make', 'model', 'modelYear'],
+        ['productMake', 'productModel', 'productYear'],
+        ['make', 'model', 'year'],
+        ['vehicleId'],
+    ]
+    MIN_STRING_CHARS = 255  # the table is created once and never altered: later runs may bring longer values
+    MAX_KEY_BYTES = 900  # SQL Server limit of a clustered index / primary key, summed over the key columns
+    MAX_INDEX_BYTES = 1700  # same limit for a nonclustered index
+    FIXED_TYPE_BYTES = {"INT": 4, "BIGINT": 8, "FLOAT": 8, "BIT": 1, "DATETIMEOFFSET": 10}
+
+    def sql_type_bytes(self, sql_type: str) -> int:
+        """
+        Bytes a value of `sql_type` can take in an index key (NVARCHAR(MAX) counts as 4000 chars).
+        """
+        if sql_type.startswith("NVARCHAR("):
+            width = sql_type[len("NVARCHAR("):-1]
+            return 2 * (4000 if width == "MAX" else int(width))
+        return self.FIXED_TYPE_BYTES.get(sql_type, 0)
+
+    def sql_string_type(self, col_name: str, col_stats: dict = None) -> str:
+        """
+        NVARCHAR sized from the measured max length (+25% headroom, rounded up to a power of two), MAX above 4000.
+        Never below MIN_STRING_CHARS: the stats may come from a small run (incremental batch, one year, a sample).
+        Free-text columns stay NVARCHAR(MAX): the next run can always bring a longer text.
+        """
+        if col_name in ['notes', 'summary', 'remedy']:
+            return "NVARCHAR(MAX)"
+        if col_stats is None or "max_length" not in col_stats:
+            return f"NVARCHAR({self.MIN_STRING_CHARS})"
+
+        length = max(16, int(col_stats["max_length"] * 1.25))
+        length = max(self.MIN_STRING_CHARS, 1 << (length - 1).bit_length())
+        return f"NVARCHAR({length})" if length <= 4000 else "NVARCHAR(MAX)"
+
+    def fit_key_types(self, table_name: str, sql_types: dict, keys: list, stats: dict = None) -> dict:
+        """
+        Narrow the NVARCHAR key columns so the whole key fits in MAX_KEY_BYTES (2 bytes per char).
+        The bytes left by the fixed-size key columns are shared evenly; a column needing less than its share
+        keeps its width and leaves the rest to the wider ones. Returns the updated {column: sql_type}.
+        """
+        string_keys = [k for k in keys if sql_types[k].startswith("NVARCHAR")]
+        budget = self.MAX_KEY_BYTES - sum(self.sql_type_bytes(sql_types[k]) for k in keys if k not in string_keys)
+
+        sql_types = dict(sql_types)
+        for i, key in enumerate(sorted(string_keys, key=lambda k: self.sql_type_bytes(sql_types[k]))):
+            share = budget // 2 // (len(string_keys) - i)
+            width = min(self.sql_type_bytes(sql_types[key]) // 2, share)
+            sql_types[key] = f"NVARCHAR({width})"
+            budget -= 2 * width
+
+            max_length = ((stats or {}).get(key) or {}).get("max_length")
+            if max_length is not None and max_length > width:
+                print(f"	 WARNING: key column {table_name}.{key} has values of {max_length} chars, "
+                      f"above the {width} chars left by the {self.MAX_KEY_BYTES}-byte key limit")
+        return sql_types
+
+    def sql_int_type(self, col_stats: dict = None) -> str:
+        if col_stats is None or col_stats.get("min") is None:
+            return "INT"
+        return "INT" if -2 ** 31 <= col_stats["min"] and col_stats["max"] < 2 ** 31 else "BIGINT"
+
+    def generate_create_table_sql(self, json_file: str, table_name: str, schema: str = "dbo",
+                                  stats: dict = None, keys: list = None, primary_key: bool = False) -> str:
         """
         Generate a CREATE TABLE script from a JSON schema with column names and types.
         The script will only create the table if it does not already exist.
@@ -189,9 +309,12 @@ class Loading:
             json_file: path to the JSON file containing the schema
             table_name: name of the SQL table
             schema: schema name (default 'dbo')
+            stats: measured column stats of the processed table (Processing.column_stats) to size the types
+            keys: natural key columns -> clustered primary key (`primary_key`) or clustered index
         
         Returns:
-            str: SQL CREATE TABLE script with IF NOT EXISTS wrapper
+            str: SQL CREATE TABLE script with IF NOT EXISTS wrapper, followed by the index creation
+            (T-SQL on SQL Server; `CREATE ... IF NOT EXISTS` statements on other engines, e.g. SQLite, with `schema` None)
         """
         
         with open(json_file, "r", encoding="utf-8") as f:
@@ -199,13 +322,21 @@ class Loading:
         
         # table_name = table_name+"_NEW"
         
+        is_mssql = self.engine.dialect.name == "mssql"
+        q = (lambda name: f"[{name}]") if is_mssql else self.engine.dialect.identifier_preparer.quote
+        qualified_name = f"{q(schema)}.{q(table_name)}" if schema else q(table_name)
+
+        stats = stats or {}
+        keys = [k for k in (keys or []) if k in json_schema]
         col_defs = []
+        sql_types = {}
 
         for col_name, col_info in json_schema.items():
             dtype = col_info.get("dtype", "string").lower()
+            col_stats = stats.get(col_name)
 
             if dtype in ["int", "int64"]:
-                sql_type = "INT"
+                sql_type = self.sql_int_type(col_stats)
             elif dtype in ["float", "float64"]:
                 sql_type = "FLOAT"
             elif dtype in ["boolean", "bool"]:
@@ -213,30 +344,64 @@ class Loading:
             elif dtype in ["datetime"]:
                 sql_type = "DATETIMEOFFSET"  # use DATETIMEOFFSET for timezone-aware strings
             else:
-                sql_type = "NVARCHAR(255)"  # default for string columns
-                if col_name in ['notes', 'summary', 'remedy']:
-                    sql_type = "NVARCHAR(MAX)"
+                sql_type = self.sql_string_type(col_name, col_stats)  # default for string columns
 
-            col_defs.append(f"    [{col_name}] {sql_type} NULL")
+            sql_types[col_name] = sql_type
+
+        if keys:
+            sql_types = self.fit_key_types(table_name, sql_types, keys, stats)
+
+        for col_name, sql_type in sql_types.items():
+            nullable = "NOT NULL" if primary_key and col_name in keys else "NULL"
+            col_type = sql_type if is_mssql or sql_type != "NVARCHAR(MAX)" else "TEXT"  # MAX is T-SQL only
+            col_defs.append(f"    {q(col_name)} {col_type} {nullable}")
             
         # Add InsertedAt column at the end, defaulting to current time
-        col_defs.append("    [InsertedAt] DATETIME NOT NULL DEFAULT GETDATE()")
+        col_defs.append(f"    {q('InsertedAt')} DATETIME NOT NULL DEFAULT {'GETDATE()' if is_mssql else 'CURRENT_TIMESTAMP'}")
+        
+        if keys and primary_key:
+            key_cols = ", ".join(q(k) for k in keys)
+            col_defs.append(f"    CONSTRAINT {q(f'PK_{table_name}')} PRIMARY KEY {'CLUSTERED ' if is_mssql else ''}({key_cols})")
 
         # Build the CREATE TABLE body separately
         cols_sql = ",\n".join(col_defs)
 
         # Wrap with IF NOT EXISTS
-        sql_script = (
-            f"IF NOT EXISTS (\n"
-            f"    SELECT 1 \n"
-            f"    FROM INFORMATION_SCHEMA.TABLES \n"
-            f"    WHERE TABLE_SCHEMA = '{schema}' \n"
-            f"      AND TABLE_NAME = '{table_name}'\n"
-            f")\n"
-            f"BEGIN\n"
-            f"    CREATE TABLE [{schema}].[{table_name}] (\n{cols_sql}\n    );\n"
-            f"END;"
-        )
+        if is_mssql:
+            sql_script = (
+                f"IF NOT EXISTS (\n"
+                f"    SELECT 1 \n"
+                f"    FROM INFORMATION_SCHEMA.TABLES \n"
+                f"    WHERE TABLE_SCHEMA = '{schema}' \n"
+                f"      AND TABLE_NAME = '{table_name}'\n"
+                f")\n"
+                f"BEGIN\n"
+                f"    CREATE TABLE {qualified_name} (\n{cols_sql}\n    );\n"
+                f"END;"
+            )
+        else:
+            sql_script = f"CREATE TABLE IF NOT EXISTS {qualified_name} (\n{cols_sql}\n);"
+        
+        indexes = []
+        if keys and not primary_key:
+            # append mode: keys repeat across runs, so a (non-unique) clustered index instead of a primary key
+            indexes.append((f"CIX_{table_name}", "CLUSTERED", keys))
+        for columns in self.INDEX_COLUMNS:
+            if (all(c in sql_types for c in columns) and columns != keys and not any(sql_types[c] == "NVARCHAR(MAX)" for c in columns)
+                    and sum(self.sql_type_bytes(sql_types[c]) for c in columns) <= self.MAX_INDEX_BYTES):
+                indexes.append((f"IX_{table_name}_{'_'.join(columns)}", "NONCLUSTERED", columns))
+
+        for index_name, index_type, columns in indexes:
+            index_cols = ", ".join(q(c) for c in columns)
+            if is_mssql:
+                sql_script += (
+                    f"\nIF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{index_name}' AND object_id = OBJECT_ID('{schema}.{table_name}'))\n"
+                    f"    CREATE {index_type} INDEX {q(index_name)} ON {qualified_name} ({index_cols});"
+                )
+            else:
+                # no clustered indexes outside SQL Server (SQLite tables are clustered on their rowid / primary key)
+                index_ref = f"{q(schema)}.{q(index_name)}" if schema else q(index_name)
+                sql_script += f"\nCREATE INDEX IF NOT EXISTS {index_ref} ON {q(table_name)} ({index_cols});"
 
         return sql_script
     
@@ -326,45 +491,127 @@ class Loading:
         except SQLAlchemyError as e:
             print(f"Error executing SQL file '{file_path}': {e}")
 
-    def run_all(self):
-        
-        latest_processed_files = self.get_latest_files(folder_name='processed_data')
-        # print(latest_processed_files)
-        
-        # _ = produce_schemas(write_json_flag=True, stage_folder='processed_data')
-        
-        self.load_files(file_dict=latest_processed_files, stage = 'processed')
-        
-        # print("FINAL DICT:", self.dataframes)
-        
-        stage = 'processed'
+    def execute_sql_files(self, file_paths: list):
+        """
+        Execute several .sql files in a single batch (one connection, one round trip on SQL Server;
+        the other drivers, e.g. sqlite3, run one statement per call). Raises if the batch fails.
+        """
+        if not file_paths:
+            return
+        try:
+            scripts = []
+            for file_path in file_paths:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    scripts.append(f.read())
+
+            if self.engine.dialect.name == "mssql":
+                statements = ["\n".join(scripts)]
+            else:
+                statements = [stmt for script in scripts for stmt in script.split(";\n") if stmt.strip()]
+            with self.engine.connect() as conn:
+                for statement in statements:
+                    conn.execute(text(statement))
+                conn.commit()
+            print(f"{len(file_paths)} SQL files executed successfully")
+        except SQLAlchemyError as e:
+            print(f"Error executing SQL files {file_paths}: {e}")
+            raise
+
+    def create_tables(self, stage: str = 'processed') -> list:
+        """
+        Generate (if needed) the CREATE TABLE script of every table and run them all in one batch.
+        Returns the tables to load as (source, category, json_file, table name).
+        """
+        tables = []
+        scripts = []
         for source, source_dict in self.dataframes[stage].items():
-            # print(f"Source {source} | source_dict {source_dict}")
-            
             for category in source_dict:
-                
-                # if category != 'fuel':
-                csv_file = self.dataframes[stage][source][category]['data']
                 json_file = self.dataframes[stage][source][category]['schema']
                 json_file = "processed_data_schemas/"+json_file.split("/", 1)[1]  
                 json_object_name = self.dataframes[stage][source][category]['json_object']
-            
-                # print(f"CSV FILE {csv_file} | JSON NAME {json_object_name}")
                 
-                output = self.generate_create_table_sql(json_file = json_file, table_name = json_object_name, schema = "stg")
+                # measured column stats of the processed table (Processing.write_column_stats), if available
+                stats = self.load_column_stats(json_file.replace(".json", "_stats.json"), json_object_name)
+                keys = self.table_keys.get(source, {}).get(json_object_name)
+                replace_keys = self.replace_keys.get(source, {}).get(json_object_name)
+                
+                # row groups are not unique: clustered index on their columns, no primary key
+                output = self.generate_create_table_sql(json_file = json_file, table_name = json_object_name, schema = self.schema,
+                                                        stats = stats, keys = keys or replace_keys,
+                                                        primary_key = self.load_mode == "upsert" and bool(keys))
 
                 create_table_file_name = f'CREATE_TABLE_{json_object_name.upper()}'
                 
-                folder_scripts = 'sql_scripts'
+                # the T-SQL scripts of Azure SQL stay in sql_scripts/, the other engines get their own folder
+                folder_scripts = 'sql_scripts' if self.engine.dialect.name == "mssql" else f"sql_scripts/{self.engine.dialect.name}"
                 
                 path_w_folder = f"{folder_scripts}/{source}/{create_table_file_name}.sql"
-                            
-                self.save_sql_to_file(dataset = source, folder = folder_scripts, sql_string = output, filename = create_table_file_name) if not os.path.isfile(path_w_folder) else print('file already exists')
-
-                self.execute_sql_file(file_path = path_w_folder)
                 
-                # df = pd.read_csv(csv_file, sep = self.sep_dict[source])
-                df = pd.read_csv(csv_file, sep = ',')
-                df = df.head(n=100)
-                
-                self.insert_dataframe(df, table_name=json_object_name, schema="stg", if_exists="append")
\ No newline at end of file
+                # scripts sized from fresh stats are regenerated, the others are only written once
+                self.save_sql_to_file(dataset = source, folder = folder_scripts, sql_string = output, filename = create_table_file_name) if stats or not os.path.isfile(path_w_folder) else print('file already exists')
+
+                scripts.append(path_w_folder)
+                tables.append((source, category, json_file, json_object_name))
+
+        self.execute_sql_files(file_paths = scripts)
+        return tables
+
+    def load_table(self, source: str, category: str, json_file: str, table_name: str, stage: str = 'processed'):
+        """
+        Read one processed file (only the schema's columns) and bulk insert it. Runs in a loader thread.
+        """
+        data_file = self.dataframes[stage][source][category]['data']
+        
+        # df = pd.read_csv(csv_file, sep = self.sep_dict[source])
+        # only the columns of the table (+ Parquet keeps their types, no re-inference), in the schema's order
+        # (the CSV reader keeps the file's order, bcp maps the fields by position)
+        columns = self.get_schema_columns(json_file, table_name)
+        df = read_stage_file(data_file, columns=columns, sep = ',')
+        df = df[[c for c in columns if c in df.columns]] if columns is not None else df
+        df = df.head(n=self.max_rows) if self.max_rows is not None else df
+        
+        keys = self.table_keys.get(source, {}).get(table_name)
+        replace_keys = self.replace_keys.get(source, {}).get(table_name)
+        if self.load_mode == "upsert" and keys:
+            self.upsert_dataframe(df, table_name=table_name, keys=keys, schema=self.schema)
+        elif self.load_mode == "upsert" and replace_keys:
+            self.replace_dataframe(df, table_name=table_name, group_keys=replace_keys, schema=self.schema)
+        else:
+            self.insert_dataframe(df, table_name=table_name, schema=self.schema, if_exists="append")
+
+    def run_all(self):
+        
+        time_before = perf_counter()
+        
+        # files of one run (RunCatalog.get_files / produce_schemas), else the newest file per table by mtime
+        latest_processed_files = self.file_dict or self.get_latest_files(folder_name='processed_data')
+        # print(latest_processed_files)
+        
+        # _ = produce_schemas(write_json_flag=True, stage_folder='processed_data')
+        
+        self.load_files(file_dict=latest_processed_files, stage = 'processed')
+        
+        # print("FINAL DICT:", self.dataframes)
+        
+        tables = self.create_tables(stage = 'processed')
+        
+        # biggest files first: the total time is bounded by the largest table, the small ones fill the other threads.
+        # Each thread reads its next file while the others are inserting, so parsing overlaps the inserts.
+        def file_size(table):
+            data_file = self.dataframes['processed'][table[0]][table[1]]['data']
+            return os.path.getsize(data_file) if data_file and os.path.isfile(data_file) else 0
+        tables.sort(key=file_size, reverse=True)
+        
+        self.failed_tables = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.load_table, *table): table for table in tables}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error loading table {futures[future][3]}: {e}")
+                    self.failed_tables[futures[future][3]] = e
+        
+        print(f"Loaded {len(tables) - len(self.failed_tables)} of {len(tables)} tables in {perf_counter() - time_before:.3f} s ({self.workers} workers)")
+        if self.failed_tables:
+            raise RuntimeError(f"{len(self.failed_tables)} tables failed to load: {sorted(self.failed_tables)}")
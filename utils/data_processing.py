@@ -1,19 +1,48 @@
+import numpy as np
 import pandas as pd
 import json
 import os
+from contextlib import nullcontext
+from utils.schema_producer import FILE_SUBSTRINGS, table_name_from_path
+from utils.run_catalog import RunCatalog
+from utils.stage_storage import get_storage, read_stage_file, iter_stage_file, dataframe_to_buffer, dataframe_from_buffer
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
 
 class Processing:
-    def __init__(self, file_dict: dict):
+    # default tokens for convert_to_boolean (matched after strip + case fold): the Y/N/True/False flags of the APIs.
+    # Columns using other tokens (e.g. 1/0) declare them in their schema entry (see convert_to_boolean).
+    BOOLEAN_VOCABULARY = {
+        'true_values': ['Y', 'Yes', 'True'],
+        'false_values': ['N', 'No', 'False'],
+        'null_values': ['', 'U', 'Unknown', 'N/A', 'NA'],
+    }
+
+    def __init__(self, file_dict: dict = None, dataframe_dict: dict = None, storage_format: str = "parquet",
+                 catalog: RunCatalog = None, workers: int = 1, chunksize: int = None, executor: Executor = None):
         """
-        Initialize with a dictionary of file names, per dataset.
+        Initialize with a dictionary of file names, per dataset,
+        or with the extracted DataFrames themselves ({source: {table name: df}}, e.g. from the ETLs' get_tables()).
+        In-memory DataFrames are processed without a CSV round trip; they are modified in place.
+        With `chunksize`, tables are processed out of core, `chunksize` rows at a time (see process_dataframe_chunked).
+        `executor`: process pool shared with other Processing instances (e.g. one per source in the orchestrator),
+        used instead of a pool of `workers` processes of its own; it is left open.
         """
-        self.file_dict = file_dict
+        self.file_dict = file_dict or {}
+        self.dataframe_dict = dataframe_dict or {}
+        self.storage = get_storage(storage_format)  # format of the processed_data/ files ('parquet' or 'csv')
+        self.catalog = catalog  # optional run catalog, records the processed files of this run
+        self.storage_format = storage_format
+        self.workers = workers  # > 1: tables are processed in parallel by a process pool (see run_all)
+        self.executor = executor
+        self.chunksize = chunksize  # rows per chunk for out-of-core processing (None = whole tables in memory)
         self.dataframes = {}  # Store loaded DataFrames
         self.sep_dict = {
             'FuelEconomy' : ',',
             'NHTSafetyAdministration' : ',', 
             'AlternativeFuel' : '|'
         }
+        self.column_stats_dict = {}  # source -> table -> measured column stats (see column_stats)
+        self.unmapped_boolean_values = {}  # source -> table -> column -> {value: count} of tokens convert_to_boolean couldn't map
         
     def get_output(self):
         return {
@@ -34,14 +63,7 @@ class Processing:
             print(f"Dataframe is None.")
     
     def get_schema_file(self, filepath: str):
-        
-        aux = filepath.split("\\", 3)[2]
-        substring_name = aux.split('_', 1)[0]
-        
-        if 'MPG' in filepath:
-            substring_name = "_".join([substring_name, aux.split('_', 2)[1]])
-            
-        return substring_name
+        return table_name_from_path(filepath)
     
     def load_json(self, json_path: str) -> dict:
         """
@@ -92,13 +114,30 @@ class Processing:
                     print(f"Error loading {filepath}: {e}")
                     
                     
+    def load_dataframes(self):
+        """
+        Register in-memory DataFrames, keyed by the same categories as the CSV files (see FILE_SUBSTRINGS).
+        Tables without a known category have no schema and are skipped, as their files are in load_files.
+        """
+        for dataset, tables in self.dataframe_dict.items():
+            self.dataframes.setdefault(dataset, {})
+            for table_name, df in tables.items():
+                category = next((k for k in FILE_SUBSTRINGS.get(dataset, []) if k in table_name.lower()), None)
+                if category is None or df is None or category in self.dataframes[dataset]:
+                    continue
+
+                self.dataframes[dataset][category] = {}
+                self.dataframes[dataset][category]['data'] = df
+                self.dataframes[dataset][category]['schema'] = f"extracted_data_schemas/{dataset}/{table_name}.json"
+                self.dataframes[dataset][category]['json_object'] = table_name
+
     def open_json(self, schema_file: str, dataset: str):
         with open(schema_file, "r", encoding="utf-8") as f:
             schema = json.load(f)[dataset]
             
         return schema
     
-    def convert_columns_based_on_schema(self, df: pd.DataFrame, schema_file: str, dataset: str, decimals: int = 2) -> pd.DataFrame:
+    def convert_columns_based_on_schema(self, df: pd.DataFrame, schema_file: str, dataset: str, decimals: int = 2, source: str = None) -> pd.DataFrame:
         """
         Convert DataFrame columns based on a schema definition from a JSON file.
         
@@ -106,6 +145,7 @@ class Processing:
             df (pd.DataFrame): Input DataFrame.
             schema_file (str): Path to JSON schema file.
             decimals (int): Number of decimal places for float rounding.
+            source (str): Source of the table, to key the unmapped boolean tokens report.
         
         Returns:
             pd.DataFrame: DataFrame with converted columns.
@@ -130,7 +170,8 @@ class Processing:
                     df[col] = pd.to_numeric(df[col], errors="raise").round(decimals)
                 elif dtype.startswith("boolean"):
                     # print(f"Converting col '{col}' to boolean...")
-                    df[f"{col}_bool"] = self.convert_to_boolean(df, col)
+                    vocabulary = {k: v for k, v in schema[col].items() if k in self.BOOLEAN_VOCABULARY}
+                    df[f"{col}_bool"] = self.convert_to_boolean(df, col, vocabulary=vocabulary, source=source, table=dataset)
                 else:
                     df[col] = df[col].astype(dtype)
             except Exception as e:
@@ -171,19 +212,38 @@ class Processing:
 
         return result
     
-    def convert_to_boolean(self, df : pd.DataFrame, bool_col : str):
-                
-        false_values, true_values = ['N', 'No', 'n', 'NO', 'False', 'FALSE', 'false'], ['Y', 'Yes', 'y', 'YES', 'True', 'TRUE', 'true']
-        bool_dict = {f_v: False for f_v in false_values}
-        bool_dict.update({t_v: True for t_v in true_values})
-        
-        df[f"{bool_col}_bool"] = df[bool_col].astype("string")
-        df[f"{bool_col}_bool"] = df[f"{bool_col}_bool"].map(lambda x : bool_dict[x] if x is not pd.NA and x.strip() != '' else pd.NA)
-                     
-        # df[f"{bool_col}_bool"] = df[bool_col].astype("string")
-        # df[f"{bool_col}_bool"] = df[f"{bool_col}_bool"].map(lambda x : bool_dict[x] if x is not pd.NA and x.strip() != '' else pd.NA)
-        
-        return df[f"{bool_col}_bool"]
+    def convert_to_boolean(self, df : pd.DataFrame, bool_col : str, vocabulary: dict = None, source: str = None, table: str = None) -> pd.Series:
+        """
+        Convert a column to a nullable 'boolean' Series.
+        - Tokens are matched after strip + case fold against the true/false/null vocabulary
+          (BOOLEAN_VOCABULARY, overridable per column with 'true_values'/'false_values'/'null_values' in the schema;
+          produce_schemas keeps these keys when it regenerates the schema).
+        - The column is factorized once and only the distinct values are mapped.
+        - Values outside the vocabulary become <NA> and are reported as counts in
+          self.unmapped_boolean_values[source][table][bool_col] (added up over the chunks of a table).
+        """
+        vocab = dict(self.BOOLEAN_VOCABULARY)
+        vocab.update(vocabulary or {})
+        lookup = {str(v).strip().casefold(): True for v in vocab['true_values']}
+        lookup.update({str(v).strip().casefold(): False for v in vocab['false_values']})
+        lookup.update({str(v).strip().casefold(): None for v in vocab['null_values']})
+
+        codes, uniques = pd.factorize(df[bool_col], use_na_sentinel=True)
+        uniques_mapped = [lookup.get(str(x).strip().casefold(), pd.NA) for x in uniques]
+
+        values = np.array([m is True for m in uniques_mapped] + [False], dtype=bool)[codes]
+        mask = np.array([m is None or m is pd.NA for m in uniques_mapped] + [True], dtype=bool)[codes]
+
+        unmapped_codes = [i for i, m in enumerate(uniques_mapped) if m is pd.NA]
+        if unmapped_codes:
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            unmapped = {str(uniques[i]): int(counts[i]) for i in unmapped_codes}
+            report = self.unmapped_boolean_values.setdefault(source, {}).setdefault(table, {}).setdefault(bool_col, {})
+            for value, count in unmapped.items():
+                report[value] = report.get(value, 0) + count
+            print(f"Column '{f'{table}.' if table else ''}{bool_col}': {sum(unmapped.values())} values outside the boolean vocabulary set to NULL -> {unmapped}")
+
+        return pd.Series(pd.arrays.BooleanArray(values, mask), index=df.index, name=f"{bool_col}_bool")
     
     def lower_first_letter(self, df):
         new_cols = {c: c[0].lower() + c[1:] for c in df.columns}
@@ -200,11 +260,50 @@ class Processing:
         
         return df.rename(columns=new_cols)
     
-    def fix_null_values(self, df: pd.DataFrame):
+    def stringify_nested_values(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Turn list/dict cells of in-memory DataFrames into their text form, in place, as the CSV round trip did.
+        Keeps them hashable for factorize/drop_duplicates; only columns pandas infers as mixed are scanned.
+        """
         for c in df.columns:
-            df[c] = self.to_pandas_null(df[c], null_values=['Not Rated', 'unknown'])
+            if pd.api.types.is_object_dtype(df[c].dtype) and pd.api.types.infer_dtype(df[c], skipna=True).startswith("mixed"):
+                nested = df[c].map(lambda x: isinstance(x, (list, dict))).to_numpy(dtype=bool)
+                if nested.any():
+                    df[c] = df[c].mask(nested, df[c].astype(str))
         return df
-    
+
+    def fix_null_values(self, df: pd.DataFrame, null_values: list = None):
+        """
+        Mark null-like cells as pd.NA, in place.
+        Only object/string columns are scanned: numeric, boolean and datetime columns can't hold the string sentinels.
+        Cells that are already missing (None/np.nan) are left as they are.
+        """
+        if null_values is None:
+            null_values = ['Not Rated', 'unknown']
+
+        for c in df.columns:
+            if pd.api.types.is_object_dtype(df[c].dtype) or pd.api.types.is_string_dtype(df[c].dtype):
+                mask = self.null_mask(df[c], null_values=null_values, include_missing=False)
+                if mask.any():
+                    df.loc[mask, c] = pd.NA
+        return df
+
+    def null_mask(self, col: pd.Series, null_values=None, include_missing: bool = True) -> np.ndarray:
+        """
+        Boolean mask of the null-like cells of a Series: blank strings and `null_values` (after strip + case fold),
+        plus None/np.nan/pd.NA when `include_missing` is set.
+        The column is factorized first, so each distinct value is normalized once instead of once per cell.
+        """
+        null_values_set = {''} | {v.strip().casefold() for v in (null_values or []) if isinstance(v, str)}
+
+        codes, uniques = pd.factorize(col, use_na_sentinel=True)
+        null_codes = [i for i, x in enumerate(uniques) if isinstance(x, str) and x.strip().casefold() in null_values_set]
+
+        mask = (codes == -1) if include_missing else np.zeros(len(codes), dtype=bool)
+        if null_codes:
+            mask |= np.isin(codes, null_codes)
+        return mask
+
     def to_pandas_null(self, col, null_values=None):
         """
         Convert a pandas Series or list-like object to pandas NULLs (pd.NA)
@@ -217,26 +316,70 @@ class Processing:
         Returns:
             pd.Series with pd.NA for null-like values
         """
-        if null_values is None:
-            null_values = []
-        
-        # Normalize null_values to lowercase for case-insensitive comparison
-        null_values_set = set(v.lower() for v in null_values if isinstance(v, str))
-        
         if not isinstance(col, pd.Series):
             col = pd.Series(col)
-        
-        def clean_value(x):
-            if x is None or pd.isna(x):
-                return pd.NA
-            if isinstance(x, str):
-                x_strip = x.strip()
-                if x_strip == '' or x_strip.lower() in null_values_set:
-                    return pd.NA
-            return x
-        
-        return col.apply(clean_value)
+
+        mask = self.null_mask(col, null_values=null_values)
+        return col.astype(object).mask(mask, pd.NA) if mask.any() else col
     
+    def column_stats(self, df: pd.DataFrame) -> dict:
+        """
+        Measured statistics per column, used to size the SQL types (Loading.generate_create_table_sql):
+        null fraction and cardinality for every column, max length for text columns, min/max for numeric ones.
+        All computed column-wise by pandas, no Python loop over the cells.
+        """
+        null_fraction = df.isna().mean() if len(df) else pd.Series(0.0, index=df.columns)
+        cardinality = df.nunique(dropna=True)
+        stats = {}
+
+        for c in df.columns:
+            entry = {"null_fraction": round(float(null_fraction[c]), 4), "cardinality": int(cardinality[c])}
+            dtype = df[c].dtype
+            if pd.api.types.is_bool_dtype(dtype):
+                pass
+            elif pd.api.types.is_numeric_dtype(dtype):
+                entry["min"] = None if pd.isna(df[c].min()) else df[c].min().item()
+                entry["max"] = None if pd.isna(df[c].max()) else df[c].max().item()
+            elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+                max_length = df[c].astype("string").str.len().max()
+                entry["max_length"] = 0 if pd.isna(max_length) else int(max_length)
+            stats[c] = entry
+
+        return stats
+
+    def merge_column_stats(self, stats: dict | None, df: pd.DataFrame) -> dict:
+        """
+        Add the stats of one more chunk to the running {"rows", "columns"} stats of a table.
+        Null fractions are weighted by rows and min/max/max_length are exact; cardinality is the largest
+        per-chunk value (a lower bound, the distinct values themselves aren't kept).
+        """
+        chunk = {"rows": int(df.shape[0]), "columns": self.column_stats(df)}
+        if stats is None:
+            return chunk
+
+        rows = stats["rows"] + chunk["rows"]
+        for c, entry in chunk["columns"].items():
+            total = stats["columns"].setdefault(c, entry)
+            if total is entry:
+                continue
+            if rows:
+                total["null_fraction"] = round((total["null_fraction"] * stats["rows"] + entry["null_fraction"] * chunk["rows"]) / rows, 4)
+            total["cardinality"] = max(total["cardinality"], entry["cardinality"])
+            for key, pick in (("min", min), ("max", max), ("max_length", max)):
+                values = [v for v in (total.get(key), entry.get(key)) if v is not None]
+                total[key] = pick(values) if values else total.get(key)
+        stats["rows"] = rows
+        return stats
+
+    def write_column_stats(self, df: pd.DataFrame, dataset: str, filename: str, stats: dict = None):
+        folder_name = f"processed_data_schemas/{dataset}"
+        os.makedirs(folder_name) if not os.path.isdir(folder_name) else None
+
+        stats = stats or {"rows": int(df.shape[0]), "columns": self.column_stats(df)}
+        self.column_stats_dict.setdefault(dataset, {})[filename] = stats
+        with open(f"{folder_name}/{filename}_stats.json", "w", encoding="utf-8") as f:
+            json.dump({filename: stats}, f, indent=4, default=str)
+
     def write_to_csv(self, df: pd.DataFrame, dataset: str, filename: str, df_name: str = "DataFrame"):
         if df is not None:
             current_time = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
@@ -251,29 +394,121 @@ class Processing:
             df.to_csv(filename, index=False)
             print(f"Dataframe '{df_name}' written to file '{filename}' ({df.shape[0]} rows, {df.shape[1]} cols)")
     
-    def process_dataframe(self, source: str, dataset: str, write_flag: bool = False):
-        
-        csv_file = self.dataframes[source][dataset]['data']
+    def clean_dataframe(self, df: pd.DataFrame, source: str, dataset: str) -> pd.DataFrame:
+        """
+        Row-wise cleaning steps (nulls, schema types, column names); safe to apply chunk by chunk.
+        """
         json_file = self.dataframes[source][dataset]['schema']
         json_object_name = self.dataframes[source][dataset]['json_object']
+
+        df = self.fix_null_values(df)
+        df = self.convert_columns_based_on_schema(df = df, dataset=json_object_name, schema_file=json_file, decimals=3, source=source)
+        df = self.convert_columns_to_camel_case(df)
+        df = self.lower_first_letter(df)
+        return df
+
+    def transform_dataframe(self, source: str, dataset: str) -> pd.DataFrame:
+        """
+        Read (or take) one table and apply the cleaning steps: nulls, schema types, column names, duplicates.
+        """
+        data = self.dataframes[source][dataset]['data']
+        json_object_name = self.dataframes[source][dataset]['json_object']
         
         print(f"\tProcessing SOURCE {source} | DATASET {dataset} | NAME {json_object_name}...")
         
-        # print("file is ", csv_file, "json_file is ", json_file)        
-        df = pd.read_csv(csv_file, sep = self.sep_dict[source])
+        # print("file is ", data, "json_file is ", json_file)
+        df = self.stringify_nested_values(data) if isinstance(data, pd.DataFrame) else read_stage_file(data, sep = self.sep_dict[source])
         
-        df = self.fix_null_values(df)
-        df = self.convert_columns_based_on_schema(df = df, dataset=json_object_name, schema_file=json_file, decimals=3)
-        df = self.convert_columns_to_camel_case(df)
-        df = self.lower_first_letter(df)
+        df = self.clean_dataframe(df, source = source, dataset = dataset)
         print(f"Before duplicate removal -> shape is {df.shape}")
         df = df.drop_duplicates()
         print(f"After duplicate removal -> shape is {df.shape}")
+        return df
+
+    def write_processed(self, source: str, dataset: str, df: pd.DataFrame) -> str | None:
+        """
+        Write the processed table and its column stats; returns the file path.
+        """
+        json_object_name = self.dataframes[source][dataset]['json_object']
+        path = self.storage.write(df = df, folder_name=f"processed_data/{source}", filename=json_object_name, df_name=json_object_name)
+        self.write_column_stats(df = df, dataset=source, filename=json_object_name)
+        return path
+
+    def iter_table_chunks(self, source: str, dataset: str):
+        """
+        Yield one table `self.chunksize` rows at a time, from its stage file or from the in-memory DataFrame.
+        """
+        data = self.dataframes[source][dataset]['data']
+        if not isinstance(data, pd.DataFrame):
+            # text columns are read as text in every chunk (e.g. zip codes keep their leading zeros)
+            schema = self.open_json(self.dataframes[source][dataset]['schema'], self.dataframes[source][dataset]['json_object'])
+            dtype = {c: "string" for c, v in schema.items() if v['dtype'] == "string"}
+            yield from iter_stage_file(data, chunksize=self.chunksize, sep=self.sep_dict[source], dtype=dtype)
+            return
+
+        for start in range(0, max(len(data), 1), self.chunksize):
+            yield self.stringify_nested_values(data.iloc[start:start + self.chunksize].copy())
+
+    def drop_seen_duplicates(self, df: pd.DataFrame, seen: np.ndarray) -> tuple:
+        """
+        drop_duplicates across chunks: each row is reduced to a 64-bit digest (pd.util.hash_pandas_object) and
+        rows whose digest was already seen, in this chunk or an earlier one, are dropped.
+        Only the digests are kept, never the rows: `seen` is a sorted uint64 array (8 bytes per distinct row, where
+        a Python set of ints would take ~60-90). Returns (deduplicated chunk, updated `seen`).
+        """
+        digests = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        keep = ~pd.Series(digests).duplicated().to_numpy()
+        if len(seen):
+            positions = np.minimum(np.searchsorted(seen, digests), len(seen) - 1)
+            keep &= seen[positions] != digests
+        return df.loc[keep], np.union1d(seen, digests[keep])
+
+    def process_dataframe_chunked(self, source: str, dataset: str, write_flag: bool = False) -> tuple:
+        """
+        Out-of-core variant of process_dataframe for tables that don't fit in memory:
+        chunks are read (CSV chunksize / Parquet record batches), cleaned, deduplicated against the earlier chunks
+        and appended to one processed file, so memory is bounded by the chunk size.
+        Column stats are merged chunk by chunk. Returns (path, stats); the table isn't kept as a DataFrame attribute.
+        """
+        json_object_name = self.dataframes[source][dataset]['json_object']
+        print(f"\tProcessing SOURCE {source} | DATASET {dataset} | NAME {json_object_name} in chunks of {self.chunksize} rows...")
+
+        writer = self.storage.open_writer(folder_name=f"processed_data/{source}", filename=json_object_name) if write_flag else None
+        seen, stats, rows_in = np.empty(0, dtype=np.uint64), None, 0
+
+        for chunk in self.iter_table_chunks(source = source, dataset = dataset):
+            rows_in += chunk.shape[0]
+            chunk = self.clean_dataframe(chunk, source = source, dataset = dataset)
+            chunk, seen = self.drop_seen_duplicates(chunk, seen)
+            stats = self.merge_column_stats(stats, chunk)
+            writer.write(chunk) if writer is not None else None
+
+        print(f"Duplicate removal -> {rows_in} rows read, {stats['rows']} rows kept")
+        setattr(self, f"df_processed_{dataset}", None)
+
+        if writer is None:
+            return None, stats
+
+        path = writer.close()
+        self.write_column_stats(df = None, dataset=source, filename=json_object_name, stats=stats)
+        return path, stats
+
+    def process_dataframe(self, source: str, dataset: str, write_flag: bool = False):
+        
+        if self.chunksize:
+            path, stats = self.process_dataframe_chunked(source = source, dataset = dataset, write_flag = write_flag)
+            json_object_name = self.dataframes[source][dataset]['json_object']
+            self.catalog.add(stage="processed_data", dataset=source, table=json_object_name, path=path, rows=stats['rows']) if self.catalog is not None else None
+            return
+
+        df = self.transform_dataframe(source = source, dataset = dataset)
 
         setattr(self, f"df_processed_{dataset}", df)
         
         if write_flag:
-            self.write_to_csv(df = df, dataset=source, filename=json_object_name, df_name=json_object_name)
+            path = self.write_processed(source = source, dataset = dataset, df = df)
+            json_object_name = self.dataframes[source][dataset]['json_object']
+            self.catalog.add(stage="processed_data", dataset=source, table=json_object_name, path=path, df=df) if self.catalog is not None else None
 
     
     def run_all_OLD(self):
@@ -316,8 +551,58 @@ class Processing:
         self.write_to_csv(df = df, dataset=dataset_test, filename=json_object_name, df_name=json_object_name)
         
 
+    def table_size(self, source: str, dataset: str) -> int:
+        data = self.dataframes[source][dataset]['data']
+        if isinstance(data, pd.DataFrame):
+            return int(data.memory_usage(deep=False).sum())
+        return os.path.getsize(data) if data and os.path.isfile(data) else 0
+
+    def run_parallel(self, write_flag: bool = False):
+        """
+        Process the tables in a process pool (the shared `self.executor`, else `self.workers` processes), biggest first.
+        Tables are independent: each worker transforms (and writes) one table and sends it back as an
+        Arrow buffer instead of a pickled DataFrame.
+        """
+        jobs = sorted(
+            ((source, dataset) for source, v in self.dataframes.items() for dataset in v),
+            key=lambda job: self.table_size(*job), reverse=True,
+        )
+
+        with nullcontext(self.executor) if self.executor is not None else ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for source, dataset in jobs:
+                entry = dict(self.dataframes[source][dataset])
+                if isinstance(entry['data'], pd.DataFrame):
+                    entry['data'] = dataframe_to_buffer(entry['data'])
+                futures[executor.submit(_process_table_job, source, dataset, entry, write_flag, self.storage_format, self.chunksize)] = (source, dataset)
+
+            for future in as_completed(futures):
+                source, dataset = futures[future]
+                try:
+                    buffer, path, unmapped_boolean_values, column_stats = future.result()
+                except Exception as e:
+                    print(f"Error processing SOURCE {source} | DATASET {dataset}: {e}")
+                    continue
+
+                df = dataframe_from_buffer(buffer) if buffer is not None else None  # chunked tables only come back as a file
+                setattr(self, f"df_processed_{dataset}", df)
+                for report_source, tables in unmapped_boolean_values.items():
+                    self.unmapped_boolean_values.setdefault(report_source, {}).update(tables)
+                for stats_source, tables in column_stats.items():
+                    self.column_stats_dict.setdefault(stats_source, {}).update(tables)
+
+                if path is not None and self.catalog is not None:
+                    json_object_name = self.dataframes[source][dataset]['json_object']
+                    rows = column_stats.get(source, {}).get(json_object_name, {}).get('rows')
+                    self.catalog.add(stage="processed_data", dataset=source, table=json_object_name, path=path, df=df, rows=rows)
+
     def run_all(self, write_flag: bool = False):
         self.load_files()
+        self.load_dataframes()
+        
+        if self.workers > 1 or self.executor is not None:
+            self.run_parallel(write_flag = write_flag)
+            return
         
         # stop = 0
         for source, v in self.dataframes.items():
@@ -334,5 +619,23 @@ class Processing:
                 self.process_dataframe(source = source, dataset = k, write_flag = write_flag)
                 # stop = 1
                 # break
-            
-        
\ No newline at end of file
+
+
+def _process_table_job(source: str, dataset: str, entry: dict, write_flag: bool, storage_format: str, chunksize: int = None):
+    """
+    Process-pool job of Processing.run_parallel: transform (and write) one table in a fresh Processing.
+    """
+    if isinstance(entry['data'], tuple):
+        entry['data'] = dataframe_from_buffer(entry['data'])
+
+    processing = Processing(storage_format=storage_format, chunksize=chunksize)
+    processing.dataframes = {source: {dataset: entry}}
+
+    if chunksize:
+        path, _ = processing.process_dataframe_chunked(source = source, dataset = dataset, write_flag = write_flag)
+        return None, path, processing.unmapped_boolean_values, processing.column_stats_dict
+
+    df = processing.transform_dataframe(source = source, dataset = dataset)
+    path = processing.write_processed(source = source, dataset = dataset, df = df) if write_flag else None
+
+    return dataframe_to_buffer(df), path, processing.unmapped_boolean_values, processing.column_stats_dict
@@ -1,7 +1,13 @@
 import asyncio
-import aiohttp  # async replacement for requests
 import pandas as pd
 import os
+from urllib.parse import urlparse
+from utils.http_client import AsyncHttpClient
+from utils.response_cache import ResponseCache
+from utils.state_store import StateStore
+from utils.stage_storage import get_storage
+from utils.run_catalog import RunCatalog
+from utils.table_builder import TableBuilder
 
 def inspect_df(df: pd.DataFrame, name: str = "DataFrame", n: int = 5):
     """Prints basic info about a DataFrame: its name, shape, and head rows."""
@@ -23,25 +29,34 @@ class FuelEconomyAPI:
         "get_vehicle_ids": "/menu/options"
     }
 
-    def __init__(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore):
-        self.session = session
-        self.semaphore = semaphore
+    # requests per second per host (None -> only bounded by the client's concurrency)
+    RATE_LIMIT = None
+
+    # response cache TTLs (seconds) per URL prefix: menus and vehicle details rarely change, user MPG data does
+    CACHE_TTLS = {
+        f"{BASE_URL}/menu/": 7 * 24 * 3600,
+        BASE_URL: 7 * 24 * 3600,
+        BASE_MPG_SUMMARY_URL: 24 * 3600,
+        BASE_MPG_DETAIL_URL: 24 * 3600,
+    }
+
+    # menus kept for the whole run by the client
+    MEMO_PREFIXES = (f"{BASE_URL}/menu/",)
+
+    def __init__(self, client: AsyncHttpClient, concurrency: int = None):
+        self.client = client
+        for url in (self.BASE_URL, self.BASE_MPG_SUMMARY_URL):
+            self.client.set_rate_limit(urlparse(url).hostname, self.RATE_LIMIT)
+            self.client.set_host_limit(urlparse(url).hostname, concurrency) if concurrency else None
+        self.client.set_cache_ttls(self.CACHE_TTLS)
+        self.client.set_memo_prefixes(self.MEMO_PREFIXES)
 
     async def _fetch(self, url: str, params: dict = None):
         """
-        Core async request method.
-        - Uses aiohttp for non-blocking HTTP calls.
-        - Semaphore ensures we only run N requests at a time (avoiding overload).
+        Core async request method, delegated to the shared AsyncHttpClient
+        (connection pool, concurrency limit, per-host rate limit and retries).
         """
-        async with self.semaphore:
-            async with self.session.get(url, headers=self.HEADERS, params=params) as r:
-                if r.status == 204:
-                    return None
-                try:
-                    return await r.json()
-                except Exception:
-                    print(f"Response from {url} not in JSON format")
-                    return None
+        return await self.client.get_json(url, params=params, headers=self.HEADERS)
 
     async def _fetch_menu_items(self, endpoint: str, params: dict = None) -> list:
         data = await self._fetch(endpoint, params=params)
@@ -86,31 +101,39 @@ class Vehicle:
         self.make = make
         self.model = model
         self.api = api_client
+        # flags live here (not in get_fuel_info) since the MPG fetches may complete before the details fetch
+        self.emissionsList = {}
+        self.fuel_raw = {}
+        self.emissions_flag_exist = False
+        self.mpg_flag_summary_exist = False
+        self.mpg_flag_detail_exist = False
+        # raw rows for the output tables, accumulated by FuelEconomyETL.process
+        self.processed_row = None
+        self.emissions_rows = []
+        self.mpg_summary_rows = []
+        self.mpg_detail_rows = []
 
     def __repr__(self):
-        attributes_to_ignore = ["emissionsList", "fuel_raw", "api", "processed_df", "emissions_df", "mpg_summary_df", "mpg_detail_df"]
+        attributes_to_ignore = ["emissionsList", "fuel_raw", "api", "processed_row", "emissions_rows", "mpg_summary_rows", "mpg_detail_rows"]
         return " | ".join(f"{k} = '{v}'" for k, v in self.__dict__.items() if k not in attributes_to_ignore)
 
     async def get_fuel_info(self):
         details_json = await self.api.get_vehicle_details(self.id)
         if not details_json:
-            self.emissionsList = {}
-            self.fuel_raw = {}
             return
 
         self.emissionsList = details_json.pop("emissionsList", {})
         self.emissions_flag_exist = bool(self.emissionsList)
-        self.mpg_flag_summary_exist = False
-        self.mpg_flag_detail_exist = False
-        self.df_emissions = None
-        self.df_mpg_summary = None
-        self.df_mpg_detail = None
         self.fuel_raw = details_json
 
+    def has_mpg_data(self) -> bool:
+        """True if the details payload says users shared MPG data (the 'mpgData' Y/N flag) for this vehicle."""
+        return str(self.fuel_raw.get("mpgData", "")).strip().upper() in ("Y", "YES", "TRUE")
+
     def process_fuel_info(self):
         vehicle_dict = {"vehicle_id": self.id}
         vehicle_dict.update(self.fuel_raw)
-        self.processed_df = pd.DataFrame([vehicle_dict])
+        self.processed_row = vehicle_dict
 
     def process_emissions_list(self):
         if self.emissions_flag_exist and len(self.emissionsList) > 0:
@@ -122,11 +145,9 @@ class Vehicle:
                 output = data
                 
             # print(len(self.emissionsList), isinstance(self.emissionsList, list), isinstance(self.emissionsList, dict))
-            emissions_df = pd.DataFrame(output)
-            
             # print(self.emissionsList["emissionsInfo"])
             
-            self.df_emissions = emissions_df
+            self.emissions_rows = output
             # sys.exit()
             # except Exception as e:
             #     print(len(self.emissionsList), isinstance(self.emissionsList, list), isinstance(self.emissionsList, dict))
@@ -137,7 +158,7 @@ class Vehicle:
         mpg_summary = await self.api.get_MPG_summary(url=self.api.BASE_MPG_SUMMARY_URL, vehicle_id=self.id)
         if mpg_summary:
             self.mpg_flag_summary_exist = True
-            self.df_mpg_summary = pd.DataFrame([mpg_summary])
+            self.mpg_summary_rows = [mpg_summary]
 
     async def get_MPG_detail_info(self):
         mpg_detail = await self.api.get_MPG_summary(url=self.api.BASE_MPG_DETAIL_URL, vehicle_id=self.id)
@@ -148,7 +169,7 @@ class Vehicle:
                 output = [data]
             else:
                 output = data
-            self.df_mpg_detail = pd.DataFrame(output)
+            self.mpg_detail_rows = output
 
 
 class Model:
@@ -171,16 +192,26 @@ class Model:
 
 
 class FuelEconomyETL:
-    def __init__(self, num_years=1, concurrency=10):
+    # output name (attribute without 'df_') -> table / file name
+    OUTPUT_TABLES = {"fuel": "FuelEconomy", "emissions": "Emissions", "mpg_summary": "MPG_Summary", "mpg_detail": "MPG_Detail"}
+
+    def __init__(self, num_years=1, concurrency=10, skip_missing_mpg=False, cache: ResponseCache = None, state: StateStore = None,
+                 write_files=True, storage_format="parquet", catalog: RunCatalog = None):
         self.num_years = num_years
+        self.write_files = write_files  # persist the extracted tables to extracted_data/ (not needed for the in-memory handoff)
+        self.storage = get_storage(storage_format)  # 'parquet' (typed, compressed) or 'csv'
+        self.catalog = catalog  # optional run catalog, records the files written by this run
+        self.cache = cache  # optional persistent HTTP response cache
+        self.state = state  # incremental mode: only vehicle ids not fetched in previous runs
         self.vehicles = []
         self.concurrency = concurrency  # limit concurrent requests
+        # only request MPG summary/detail for vehicles whose details have mpgData = 'Y' (saves the 204 calls,
+        # at the cost of waiting for the details response before the MPG requests go out)
+        self.skip_missing_mpg = skip_missing_mpg
 
-    async def _safe_concat(self, df_list):
-        if any(curr_df is not None for curr_df in df_list):
-            return pd.concat(df_list)
-        else:
-            return None
+    async def _safe_concat(self, table: TableBuilder):
+        # one DataFrame per output table, built from the accumulated rows (None if there are none)
+        return table.to_dataframe()
 
     async def extract(self, api: FuelEconomyAPI):
         print(f"Started Extracting.....")
@@ -189,20 +220,25 @@ class FuelEconomyETL:
         years = years[:self.num_years]
         print(f"\t-Extracted {len(years)} years: {years}")
 
-        models = []
-        for y in years:
+        # Walk years -> makes -> models -> vehicle ids as one concurrent tree: each node starts as soon as
+        # its parent resolves (no barrier between levels); in-flight requests are bounded by the client.
+        async def walk_make(y, make) -> list:
+            model_names = await api.get_models(y, make)
+            make_models = [Model(model_name, make, int(y), api) for model_name in model_names]
+            await asyncio.gather(*(m.fetch_vehicle_ids() for m in make_models))
+            return make_models
+
+        async def walk_year(y) -> list:
             makes = await api.get_makes(y)
             # filtered_makes = makes[:20]  # limit for testing
             filtered_makes = makes[:len(makes)]
             print(f"\t-Processing {len(filtered_makes)} makes for {y} - {filtered_makes}")
+            make_results = await asyncio.gather(*(walk_make(y, make) for make in filtered_makes))
+            return [m for make_models in make_results for m in make_models]
 
-            for make in filtered_makes:
-                model_names = await api.get_models(y, make)
-                for model_name in model_names:
-                    models.append(Model(model_name, make, int(y), api))
-
-        # fetch vehicle ids concurrently
-        await asyncio.gather(*(m.fetch_vehicle_ids() for m in models))
+        # gather keeps results in year/make order, so the output order matches the old serial crawl
+        year_results = await asyncio.gather(*(walk_year(y) for y in years))
+        models = [m for year_models in year_results for m in year_models]
 
         vids_array = []
         for mdl in models:
@@ -212,11 +248,17 @@ class FuelEconomyETL:
         # vids_array.append(Vehicle(31873, 2025, "test", "test model", api))
         # vids_array.append(Vehicle(26425, 2021, "Another_test", "test model 2", api))
 
+        if self.state is not None:
+            total_vids = len(vids_array)
+            vids_array = [v for v in vids_array if str(v.id) not in self.state.seen_ids("FuelEconomy", v.year)]
+            print(f"\t-Incremental mode: {len(vids_array)} new vehicle ids out of {total_vids}")
+
         self.vehicles = vids_array
 
     async def process(self):
         print(f"Started Processing.....")
-        df_array, df_emissions_array, df_mpg_summary_array, df_mpg_detail_array = [], [], [], []
+        fuel_table, emissions_table = TableBuilder("fuel"), TableBuilder("emissions")
+        mpg_summary_table, mpg_detail_table = TableBuilder("mpg_summary"), TableBuilder("mpg_detail")
         total_vehicles = len(self.vehicles)
         print(f"Number of Vehicle_ids extracted = {total_vehicles}")
 
@@ -226,22 +268,27 @@ class FuelEconomyETL:
         async def process_vehicle(vehicle):
             nonlocal processed_count, next_print_percent
 
-            # Fetch and process data
-            await vehicle.get_fuel_info()
+            # Fetch data: the three endpoints only need the vehicle id, so they are requested together
+            if self.skip_missing_mpg:
+                await vehicle.get_fuel_info()
+                if vehicle.has_mpg_data():
+                    await asyncio.gather(vehicle.get_MPG_summary_info(), vehicle.get_MPG_detail_info())
+            else:
+                await asyncio.gather(vehicle.get_fuel_info(), vehicle.get_MPG_summary_info(), vehicle.get_MPG_detail_info())
+
+            # Process data
             vehicle.process_fuel_info()
-            df_array.append(vehicle.processed_df)
+            fuel_table.append(vehicle.processed_row)
 
             vehicle.process_emissions_list()
             if vehicle.emissions_flag_exist:
-                df_emissions_array.append(vehicle.df_emissions)
+                emissions_table.extend(vehicle.emissions_rows)
 
-            await vehicle.get_MPG_summary_info()
             if vehicle.mpg_flag_summary_exist:
-                df_mpg_summary_array.append(vehicle.df_mpg_summary)
+                mpg_summary_table.extend(vehicle.mpg_summary_rows)
 
-            await vehicle.get_MPG_detail_info()
             if vehicle.mpg_flag_detail_exist:
-                df_mpg_detail_array.append(vehicle.df_mpg_detail)
+                mpg_detail_table.extend(vehicle.mpg_detail_rows)
 
             # Update counter and check for milestone prints
             processed_count += 1
@@ -253,42 +300,16 @@ class FuelEconomyETL:
         # Run all vehicle tasks concurrently
         await asyncio.gather(*(process_vehicle(v) for v in self.vehicles))
 
-        # Concatenate DataFrames
-        self.df_fuel = await self._safe_concat(df_array)
-        self.df_emissions = await self._safe_concat(df_emissions_array)
-        self.df_mpg_summary = await self._safe_concat(df_mpg_summary_array)
-        self.df_mpg_detail = await self._safe_concat(df_mpg_detail_array)
-
-    async def process_old(self):
-        print(f"Started Processing.....")
-        df_array, df_emissions_array, df_mpg_summary_array, df_mpg_detail_array = [], [], [], []
-        total_vehicles = len(self.vehicles)
-        print(f"Number of Vehicle_ids extracted = {total_vehicles}")
-
-        async def process_vehicle(vehicle):
-            await vehicle.get_fuel_info()
-            vehicle.process_fuel_info()
-            df_array.append(vehicle.processed_df)
-
-            vehicle.process_emissions_list()
-            if vehicle.emissions_flag_exist:
-                df_emissions_array.append(vehicle.df_emissions)
+        # Record fetched vehicle ids per model year (vehicles whose details failed are retried next run)
+        if self.state is not None:
+            for v in self.vehicles:
+                self.state.add_seen_ids("FuelEconomy", v.year, [v.id]) if v.fuel_raw else None
 
-            await vehicle.get_MPG_summary_info()
-            if vehicle.mpg_flag_summary_exist:
-                df_mpg_summary_array.append(vehicle.df_mpg_summary)
-
-            await vehicle.get_MPG_detail_info()
-            if vehicle.mpg_flag_detail_exist:
-                df_mpg_detail_array.append(vehicle.df_mpg_detail)
-
-        # process all vehicles concurrently
-        await asyncio.gather(*(process_vehicle(v) for v in self.vehicles))
-
-        self.df_fuel = await self._safe_concat(df_array)
-        self.df_emissions = await self._safe_concat(df_emissions_array)
-        self.df_mpg_summary = await self._safe_concat(df_mpg_summary_array)
-        self.df_mpg_detail = await self._safe_concat(df_mpg_detail_array)
+        # Build one DataFrame per output table
+        self.df_fuel = await self._safe_concat(fuel_table)
+        self.df_emissions = await self._safe_concat(emissions_table)
+        self.df_mpg_summary = await self._safe_concat(mpg_summary_table)
+        self.df_mpg_detail = await self._safe_concat(mpg_detail_table)
 
     def write_to_csv(self, df: pd.DataFrame, filename: str, df_name: str = "DataFrame"):
         if df is not None:
@@ -312,17 +333,41 @@ class FuelEconomyETL:
             if df.startswith('df') and getattr(self, df) is not None
         }
 
-    async def run_all(self):
-        async with aiohttp.ClientSession() as session:
-            semaphore = asyncio.Semaphore(self.concurrency)
-            api = FuelEconomyAPI(session, semaphore)
+    def get_tables(self):
+        """
+        Output DataFrames keyed by table name, ready to hand over to Processing in memory.
+        """
+        return {self.OUTPUT_TABLES[k]: df for k, df in self.get_output().items() if k in self.OUTPUT_TABLES}
+
+    async def write_outputs(self):
+        # stage files are written concurrently in worker threads, off the event loop
+        tables = self.get_tables()
+        paths = await asyncio.gather(*(
+            asyncio.to_thread(self.storage.write, df=df, folder_name="extracted_data/FuelEconomy", filename=name, df_name=name)
+            for name, df in tables.items()
+        ))
+        if self.catalog is not None:
+            for (name, df), path in zip(tables.items(), paths):
+                self.catalog.add(stage="extracted_data", dataset="FuelEconomy", table=name, path=path, df=df)
+
+    async def run_all(self, client: AsyncHttpClient = None):
+        """
+        Run the source with `client`, e.g. one shared with the other sources (see orchestrator.py),
+        or with a client of its own.
+        """
+        if client is None:
+            async with AsyncHttpClient(concurrency=self.concurrency, cache=self.cache) as client:
+                return await self.run_all(client)
+
+        api = FuelEconomyAPI(client, concurrency=self.concurrency)
 
-            await self.extract(api)
-            await self.process()
+        await self.extract(api)
+        await self.process()
 
-            # change attribute name to start with df!!!!
-            
-            self.write_to_csv(df=self.df_fuel, filename="FuelEconomy", df_name="fuel_info")
-            self.write_to_csv(df=self.df_emissions, filename="Emissions", df_name="emissions")
-            self.write_to_csv(df=self.df_mpg_summary, filename="MPG_Summary", df_name="mpg_summary")
-            self.write_to_csv(df=self.df_mpg_detail, filename="MPG_Detail", df_name="mpg_detail")
\ No newline at end of file
+        await self.write_outputs() if self.write_files else None
+
+    def save_state(self):
+        """
+        Persist the vehicle ids seen by this run; the orchestrator calls it once the source is loaded.
+        """
+        self.state.save(source="FuelEconomy") if self.state is not None else None
@@ -1,8 +1,14 @@
 import asyncio
-import aiohttp  # async replacement for requests
 import pandas as pd
 import os
 import json
+from urllib.parse import urlparse
+from utils.http_client import AsyncHttpClient
+from utils.response_cache import ResponseCache
+from utils.state_store import StateStore
+from utils.stage_storage import get_storage
+from utils.run_catalog import RunCatalog
+from utils.table_builder import TableBuilder
 
 def inspect_df(df: pd.DataFrame, name: str = "DataFrame", n: int = 5):
     
@@ -52,78 +58,44 @@ class SafetyAdministrationAPI:
                        "complaints": {'results' : 'results', 'year':'modelYear', 'make' : 'make', 'model' : 'model', 'issueType' : 'c'},
     }
 
-    def __init__(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore):
-        self.session = session
-        self.semaphore = semaphore
-
-    async def _fetch(self, url: str, params: dict = None):
-        """
-        Core async request method.
-        - Uses aiohttp for non-blocking HTTP calls.
-        - Semaphore ensures we only run N requests at a time (avoiding overload).
-        """
-        async with self.semaphore:
-            async with self.session.get(url, headers=self.HEADERS, params=params) as r:
-                
-                # print(r.status)
-                
-                if r.status == 204:
-                    print(f"Response from {url} sent status {r.status}")
-                    return None
-                
-                elif r.status == 403:
-                    print(f"Response from {url} sent status {r.status}")
-                    return None
-                
-                try:
-                    return await r.json()
-                except Exception:
-                    print(f"Response from {url} not in JSON format")
-                    return None
+    # requests per second to BASE_URL's host, replaces the fixed 0.5s sleep before every call
+    RATE_LIMIT = 10.0
+
+    # response cache TTLs (seconds) per URL prefix: menus and ratings rarely change, recalls/complaints do
+    CACHE_TTLS = {
+        f"{BASE_URL}{ENDPOINTS['get_years']}": 7 * 24 * 3600,
+        f"{BASE_URL}{ENDPOINTS['get_years_recalls']}": 24 * 3600,
+        f"{BASE_URL}{ENDPOINTS['get_makes_recalls']}": 24 * 3600,
+        f"{BASE_URL}{ENDPOINTS['get_models_recalls']}": 24 * 3600,
+        f"{BASE_URL}{ENDPOINTS['get_recalls']}": 6 * 3600,
+        f"{BASE_URL}{ENDPOINTS['get_complaints']}": 6 * 3600,
+        f"{BASE_URL}{ENDPOINTS['get_seat_inspection_locations']}": 24 * 3600,
+    }
 
-    async def _fetch_new_version(self, url: str, params: dict = None, retries: int = 3, delay: float = 0.5) -> dict | None:
+    # menus kept for the whole run by the client: the concurrent dataset pipelines ask for the same ones
+    MEMO_PREFIXES = (
+        f"{BASE_URL}{ENDPOINTS['get_makes']}/",  # makes, models and vehicle ids of the ratings
+        f"{BASE_URL}{ENDPOINTS['get_years_recalls']}",
+        f"{BASE_URL}{ENDPOINTS['get_makes_recalls']}",
+        f"{BASE_URL}{ENDPOINTS['get_models_recalls']}",
+    )
+
+    def __init__(self, client: AsyncHttpClient, concurrency: int = None):
+        self.client = client
+        self.client.set_rate_limit(urlparse(self.BASE_URL).hostname, self.RATE_LIMIT)
+        self.client.set_host_limit(urlparse(self.BASE_URL).hostname, concurrency) if concurrency else None
+        self.client.set_cache_ttls(self.CACHE_TTLS)
+        self.client.set_memo_prefixes(self.MEMO_PREFIXES)
+
+    async def _fetch(self, url: str, params: dict = None) -> dict | None:
         """
-        Core async request method with retry/backoff.
+        Core async request method, delegated to the shared AsyncHttpClient
+        (connection pool, concurrency limit, per-host rate limit and retries).
         """
-        async with self.semaphore:
-            for attempt in range(retries):
-                if attempt > 0:
-                    # Backoff between retries
-                    wait = 2 ** attempt
-                    print(f"Retrying {url} after {wait}s...")
-                    await asyncio.sleep(wait)
-                else:
-                    # Optional small delay even before first call
-                    await asyncio.sleep(delay)
-
-                async with self.session.get(url, headers=self.HEADERS, params=params) as r:
-                    status = r.status
-
-                    if status == 200:
-                        try:
-                            return await r.json()
-                        except Exception:
-                            print(f"Response from {url} not in JSON format")
-                            return None
-
-                    elif status == 204:
-                        print(f"No content (204) from {url} and params {params}")
-                        return None
-
-                    elif status == 403:
-                        print(f"403 from {url} and params {params}, attempt {attempt+1}/{retries}")
-                        continue  # retry after backoff
-
-                    else:
-                        # print(f"Unexpected {status} from {url} and params {params}")
-                        return None
-
-            print(f"Giving up on {url} after {retries} retries")
-            return None
+        return await self.client.get_json(url, params=params, headers=self.HEADERS)
 
     async def _fetch_menu_items(self, endpoint: str, params: dict = None) -> list:
-        # data = await self._fetch(endpoint, params=params)
-        data = await self._fetch_new_version(url=endpoint, params=params)
+        data = await self._fetch(endpoint, params=params)
         return data
 
     async def get_years(self, dataset) -> list:
@@ -138,9 +110,8 @@ class SafetyAdministrationAPI:
         data = await self._fetch_menu_items(endpoint, params=params)
         
         if not data:
-            import sys
-            # print(f)
-            sys.exit("Extracting years failed... exiting script.")
+            # raised, not sys.exit: only this dataset's pipeline fails (see SafetyAdministrationETL.run_all)
+            raise RuntimeError(f"Extracting years failed for dataset '{dataset}'")
         
         results_format = self.results_naming[dataset]['results']
         year_format = self.results_naming[dataset]['year']
@@ -164,6 +135,10 @@ class SafetyAdministrationAPI:
         
         data = await self._fetch_menu_items(endpoint_enriched, params=params)
         
+        if not data:
+            print(f"No makes for year {year} of dataset '{dataset}' (request failed)")
+            return []
+        
         results_format = self.results_naming[dataset]['results']
         make_format = self.results_naming[dataset]['make']
             
@@ -227,7 +202,7 @@ class SafetyAdministrationAPI:
         relative_url = f"{vehicle_id}"
         endpoint = f"{self.BASE_URL}{self.ENDPOINTS['get_safety_ratings']}/{relative_url}"
         data = await self._fetch_menu_items(endpoint)
-        return data["Results"]
+        return data["Results"] if data else []
     
     async def get_recalls(self, year: int, make: str, model: str) -> list:
         # print(f"Getting recalls for: Y {year} - Make {make} - Model {model}")
@@ -238,7 +213,7 @@ class SafetyAdministrationAPI:
         if not data:
             return None
         else:
-            if data["Count"] > 0:
+            if data.get("Count", 0) > 0:
             # print('GOT RESULTS for state', state)
                 return data["results"]
         # else:
@@ -253,9 +228,8 @@ class SafetyAdministrationAPI:
         endpoint = f"{self.BASE_URL}{self.ENDPOINTS['get_complaints']}"
         params = {"make" : make, "model" : model, "modelYear" : year}
         data = await self._fetch_menu_items(endpoint, params=params)
-        self.complaints_exist = False
-        if data["count"] > 0:
-            self.complaints_exist = True
+        # no flag on the (shared) API object: concurrent models would overwrite each other's result
+        if data and data.get("count", 0) > 0:
             return data["results"]
         else:
             return None
@@ -267,7 +241,7 @@ class SafetyAdministrationAPI:
             
         data = await self._fetch_menu_items(endpoint, params=params)
         
-        if data["Count"] > 0:
+        if data and data.get("Count", 0) > 0:
             # print('GOT RESULTS for state', state)
             return data["Results"]
         else:
@@ -289,9 +263,8 @@ class Vehicle:
         return " | ".join(f"{k} = '{v}'" for k, v in self.__dict__.items() if k not in attributes_to_ignore)
     
     async def get_safety_ratings(self):
-        safety_ratings = await self.api.get_safety_ratings(self.id)
-        df_ratings = pd.DataFrame(safety_ratings)
-        self.df_safety_ratings = df_ratings
+        # raw rows, accumulated into one table by SafetyAdministrationETL.process
+        self.safety_ratings_rows = await self.api.get_safety_ratings(self.id)
         
     
     async def get_fuel_info(self):
@@ -353,11 +326,10 @@ class Model:
     
     async def get_recalls(self):
         recalls = await self.api.get_recalls(self.year, self.make, self.name)
-        df_recalls = pd.DataFrame(recalls)
-        self.df_recalls = df_recalls
+        self.recalls_rows = recalls or []
         
     def get_recall_info(self):
-        return self.df_recalls
+        return self.recalls_rows
     
     def process_products(self, complaint: json):
         
@@ -379,7 +351,7 @@ class Model:
 
     async def get_complaints(self):
         complaints = await self.api.get_complaints(self.year, self.make, self.name)
-        if self.api.complaints_exist:
+        if complaints:
                 
             # print(complaints)
             comps_array = []
@@ -389,16 +361,12 @@ class Model:
                 # print('data_dict', type(data_dict), data_dict)
                 data_dict.pop('products', None)
                 # print('data_dict after PRODUCTS removed', type(data_dict), data_dict)
-                data_dict.update(products_info)
+                data_dict.update(products_info) if products_info else None
                 # print("\n", 'complaints', type(complaints), complaints, '\n')
                 # print("\n", 'products_info', type(products_info), products_info, '\n')
                 # print("\n", 'data_dict', type(data_dict), data_dict)
-                df_complaints = pd.DataFrame([data_dict]) #if products_info and isinstance(complaints, list) else None
-                comps_array.append(df_complaints)
-                
-            # print(f'complaints array {type(comps_array)}:', type(comps_array[0])) if self.make == 'TESLA' else None
+                comps_array.append(data_dict)
                 
-            # inspect_df(df_complaints)
             self.complaints_array = comps_array
             
         else:
@@ -413,17 +381,24 @@ class Model:
 
 
 class SafetyAdministrationETL:
-    def __init__(self, num_years=1, concurrency=10):
+    # output name (attribute without 'df_') -> table / file name
+    OUTPUT_TABLES = {"safety_ratings": "SafetyRatings", "recalls": "Recalls", "complaints": "Complaints", "inspections": "InspectionsLocation"}
+
+    def __init__(self, num_years=1, concurrency=10, cache: ResponseCache = None, state: StateStore = None, write_files=True, storage_format="parquet", catalog: RunCatalog = None):
         self.num_years = num_years
+        self.write_files = write_files  # persist the extracted tables to extracted_data/ (not needed for the in-memory handoff)
+        self.storage = get_storage(storage_format)  # 'parquet' (typed, compressed) or 'csv'
+        self.catalog = catalog  # optional run catalog, records the files written by this run
+        self.cache = cache  # optional persistent HTTP response cache
+        self.state = state  # incremental mode: skip the ratings requests of seen VehicleIds, drop seen odiNumbers/recall rows
         self.vehicles = {}
         self.models = {}
+        self.failed_datasets = {}  # dataset -> error of the last run_all (the other datasets are still extracted)
         self.concurrency = concurrency  # limit concurrent requests
 
-    async def _safe_concat(self, df_list):
-        if any(curr_df is not None for curr_df in df_list):
-            return pd.concat(df_list)
-        else:
-            return None
+    async def _safe_concat(self, table: TableBuilder, first_columns: list = None):
+        # one DataFrame per output table, built from the accumulated rows (None if there are none)
+        return table.to_dataframe(first_columns=first_columns)
         
     async def _reorder_dataframe(self, df : pd.DataFrame, first_columns : list):
         # new_order = ['manufacturer', 'type', 'productYear', 'productMake', 'productModel', 'odiNumber']
@@ -434,31 +409,55 @@ class SafetyAdministrationETL:
     def _check_if_attribute_exists(self, attribute_name : str):
         return hasattr(self, attribute_name) and getattr(self, attribute_name) is not None
 
-    async def extract(self, api: SafetyAdministrationAPI, dataset : str):
+    def _filter_seen(self, dataset: str, rows: list, row_id) -> list:
+        """
+        Incremental mode: drop rows whose id was extracted in a previous run and record the new ones.
+        Recalls and complaints are still requested for every model (a known model can get new ones), so for
+        them incremental mode only dedupes rows; ratings skip the requests of seen VehicleIds (see process).
+        """
+        if self.state is None or not rows:
+            return rows
+        new_rows = [r for r in rows if str(row_id(r)) not in self.state.seen_ids("NHTSafetyAdministration", dataset)]
+        self.state.add_seen_ids("NHTSafetyAdministration", dataset, [row_id(r) for r in new_rows])
+        return new_rows
+
+    async def extract(self, api: SafetyAdministrationAPI, dataset : str, on_model=None):
+        """
+        Walk years -> makes -> models of `dataset` as one concurrent tree (no barrier between levels).
+        `on_model` (async, e.g. fetch the model's recalls) is started for each model as soon as its make's
+        model list arrives, so the per-model fetches overlap the rest of the walk.
+        """
         print(f"Started Extracting for dataset {dataset}.....")
         years = await api.get_years(dataset=dataset)
-        years.sort(reverse=True)
+        years = sorted(years, reverse=True)
         years_filtered = [y for y in years if y not in ('9999', '2027')]
         years = years_filtered
         
         years = years[:self.num_years]
         print(f"\t-Dataset '{dataset}' -> Extracted {len(years)} years: {years}")
         
-        models = []
-        for y in years:
+        async def walk_make(y, make) -> list:
+            model_names = await api.get_models(year = y, make = make, dataset=dataset)
+            
+            # SHORTENING MODELS ARRAY FOR TESTING:
+            # model_names = model_names[:10]
+            
+            make_models = [Model(model_name, make, int(y), api) for model_name in model_names]
+            if on_model is not None:
+                await asyncio.gather(*(on_model(m) for m in make_models))
+            return make_models
+
+        async def walk_year(y) -> list:
             makes = await api.get_makes(year = y, dataset=dataset)
             # filtered_makes = makes[:20]  # limit for testing
             filtered_makes = makes[:len(makes)]
             print(f"\t-Processing {len(filtered_makes)} makes for {y} - {filtered_makes}")
+            make_results = await asyncio.gather(*(walk_make(y, make) for make in filtered_makes))
+            return [m for make_models in make_results for m in make_models]
 
-            for make in filtered_makes:
-                model_names = await api.get_models(year = y, make = make, dataset=dataset)
-                
-                # SHORTENING MODELS ARRAY FOR TESTING:
-                # model_names = model_names[:10]
-        
-                for model_name in model_names:
-                    models.append(Model(model_name, make, int(y), api))
+        # gather keeps results in year/make order
+        year_results = await asyncio.gather(*(walk_year(y) for y in years))
+        models = [m for year_models in year_results for m in year_models]
             
         print(f"\t-Dataset '{dataset}' -> Extracted {len(models)} models.")
                 
@@ -467,22 +466,6 @@ class SafetyAdministrationETL:
         #     if idx > 20:
         #         break
 
-        vids_array = []
-        if dataset == 'ratings':
-        # fetch vehicle ids concurrently
-            await asyncio.gather(*(m.fetch_vehicle_ids() for m in models))
-
-            # vids_array = []
-            for mdl in models:
-                vids_array.extend(mdl.get_vehicle_ids())
-
-        # # add test vehicles
-        # vids_array.append(Vehicle(31873, 2025, "test", "test model", api))
-        # vids_array.append(Vehicle(26425, 2021, "Another_test", "test model 2", api))
-
-        # self.vehicles = {}
-        # self.models = {}
-        self.vehicles[dataset] = vids_array
         self.models[dataset] = models
         
     async def extract_inspection_locations(self, api: SafetyAdministrationAPI):
@@ -511,75 +494,79 @@ class SafetyAdministrationETL:
         
         self.df_inspections = df_inspections
      
-    async def process(self):
-        print(f"Started Processing.....")
-        df_ratings_array, df_recalls = [], []
-        # df_array, df_emissions_array, df_mpg_summary_array, df_mpg_detail_array = [], [], [], []
-        total_vehicles = len(self.vehicles['ratings'])
-        print(f"\t-Number of Vehicle_ids extracted = {total_vehicles}")
-
-        processed_count = 0
-        next_print_percent = 25  # next milestone to print
+    async def process(self, api: SafetyAdministrationAPI):
+        """
+        Ratings pipeline: each model's vehicle ids, then each vehicle's ratings, fetched while the model tree is walked.
+        """
+        print(f"Started Extracting and Processing Ratings.....")
+        ratings_table = TableBuilder("safety_ratings")
+        self.vehicles['ratings'] = []
+        seen_vids = set(self.state.seen_ids("NHTSafetyAdministration", "ratings")) if self.state is not None else None
+        total_vids = 0
 
         async def process_vehicle(vehicle):
-            nonlocal processed_count, next_print_percent
-
             # Fetch and process data
             await vehicle.get_safety_ratings()
-            df_ratings_array.append(vehicle.df_safety_ratings)
+            ratings_table.extend(self._filter_seen("ratings", vehicle.safety_ratings_rows, lambda r: r["VehicleId"]))
 
-            # Update counter and check for milestone prints
-            processed_count += 1
-            percent_complete = (processed_count / total_vehicles) * 100
-            if percent_complete >= next_print_percent:
-                print(f"Processing: {int(percent_complete)}% complete ({processed_count}/{total_vehicles} vehicles)")
-                next_print_percent += next_print_percent  # increment to next milestone
+        async def process_model(model):
+            nonlocal total_vids
+            await model.fetch_vehicle_ids()
+            vehicles = model.get_vehicle_ids()
+            total_vids += len(vehicles)
+            if seen_vids is not None:
+                vehicles = [v for v in vehicles if str(v.id) not in seen_vids]
+            self.vehicles['ratings'].extend(vehicles)
+            await asyncio.gather(*(process_vehicle(v) for v in vehicles))
 
-        # Run all vehicle tasks concurrently
-        await asyncio.gather(*(process_vehicle(v) for v in self.vehicles['ratings']))
+        await self.extract(api, dataset = 'ratings', on_model = process_model)
 
-        # Concatenate DataFrames
-        df_ratings = await self._safe_concat(df_ratings_array)
-        
-        self.df_safety_ratings = await self._reorder_dataframe(df_ratings, ['VehicleId', 'VehicleDescription', 'Make', 'Model', 'ModelYear', 'ComplaintsCount', 'RecallsCount'])
+        print(f"\t-Number of Vehicle_ids extracted = {len(self.vehicles['ratings'])}")
+        if seen_vids is not None:
+            print(f"\t-Incremental mode: {len(self.vehicles['ratings'])} new vehicle ids out of {total_vids}")
+
+        # Build the DataFrame once, with the reordered columns
+        self.df_safety_ratings = await self._safe_concat(ratings_table, ['VehicleId', 'VehicleDescription', 'Make', 'Model', 'ModelYear', 'ComplaintsCount', 'RecallsCount'])
         
         inspect_df(self.df_safety_ratings, 'ratings_df')
     
-    async def process_recalls(self):
-        print(f"Started Processing Recalls.....")
-        df_recalls = []
-        # df_array, df_emissions_array, df_mpg_summary_array, df_mpg_detail_array = [], [], [], []
+    async def process_recalls(self, api: SafetyAdministrationAPI):
+        """
+        Recalls pipeline: each model's recalls are fetched as soon as the model is listed.
+        """
+        print(f"Started Extracting and Processing Recalls.....")
+        recalls_table = TableBuilder("recalls")
 
         async def process_model(model):
             # Fetch and process data
             await model.get_recalls()
-            df_recalls.append(model.get_recall_info())
+            # a campaign covers several models, so a recall row is identified by campaign + vehicle
+            recalls_table.extend(self._filter_seen("recalls", model.get_recall_info(),
+                                                   lambda r: f"{r.get('NHTSACampaignNumber')}|{r.get('ModelYear')}|{r.get('Make')}|{r.get('Model')}"))
 
-        # Run all vehicle tasks concurrently
-        await asyncio.gather(*(process_model(m) for m in self.models['recalls']))
+        await self.extract(api, dataset = 'recalls', on_model = process_model)
 
-        # Concatenate DataFrames
-        self.df_recalls = await self._safe_concat(df_recalls)
+        # Build the DataFrame once
+        self.df_recalls = await self._safe_concat(recalls_table)
         
         inspect_df(self.df_recalls, 'recalls_df')
         
-    async def process_complaints(self):
-        print(f"Started Processing Complaints.....")
-        df_complaints = []
+    async def process_complaints(self, api: SafetyAdministrationAPI):
+        """
+        Complaints pipeline: each model's complaints are fetched as soon as the model is listed.
+        """
+        print(f"Started Extracting and Processing Complaints.....")
+        complaints_table = TableBuilder("complaints")
             
         async def process_model(model):
             # Fetch and process data
             await model.get_complaints()
-            data = model.get_complaints_info()
-            df_complaints.extend(data) if len(data)>0 else None
+            complaints_table.extend(self._filter_seen("complaints", model.get_complaints_info(), lambda r: r.get("odiNumber")))
 
-        # Run all model tasks concurrently
-        await asyncio.gather(*(process_model(m) for m in self.models['complaints']))
+        await self.extract(api, dataset = 'complaints', on_model = process_model)
 
-        # Concatenate DataFrames
-        df = await self._safe_concat(df_complaints)
-        # REORDER THE COLUMNS
-        self.df_complaints = await self._reorder_dataframe(df, ['odiNumber', 'manufacturer', 'type', 'productYear', 'productMake', 'productModel'])        
+        # Build the DataFrame once, with the reordered columns
+        self.df_complaints = await self._safe_concat(complaints_table, ['odiNumber', 'manufacturer', 'type', 'productYear', 'productMake', 'productModel'])
         
         # inspect_df(self.df_complaints, 'df_complaints')
 
@@ -604,22 +591,55 @@ class SafetyAdministrationETL:
             if df.startswith('df') and getattr(self, df) is not None
         }
 
-    async def run_all(self):
-        async with aiohttp.ClientSession() as session:
-            semaphore = asyncio.Semaphore(self.concurrency)
-            api = SafetyAdministrationAPI(session, semaphore)
-            
-            await self.extract(api, dataset = 'ratings')
-            await self.extract(api, dataset = 'recalls')
-            await self.extract(api, dataset = 'complaints')
-            await self.extract_inspection_locations(api)
-                
-            await self.process()
-            await self.process_recalls()
-            await self.process_complaints()
-
-            self.write_to_csv(df=self.df_safety_ratings, filename="SafetyRatings", df_name="df_safety_ratings") if self._check_if_attribute_exists("df_safety_ratings") else None
-            self.write_to_csv(df=self.df_recalls, filename="Recalls", df_name="df_recalls") if self._check_if_attribute_exists("df_recalls") else None
-            self.write_to_csv(df=self.df_complaints, filename="Complaints", df_name="df_complaints") if self._check_if_attribute_exists("df_complaints") else None
-            self.write_to_csv(df=self.df_inspections, filename="InspectionsLocation", df_name="df_inspections") if self._check_if_attribute_exists("df_inspections") else None
-            
\ No newline at end of file
+    def get_tables(self):
+        """
+        Output DataFrames keyed by table name, ready to hand over to Processing in memory.
+        """
+        return {self.OUTPUT_TABLES[k]: df for k, df in self.get_output().items() if k in self.OUTPUT_TABLES}
+
+    async def write_outputs(self):
+        # stage files are written concurrently in worker threads, off the event loop
+        tables = self.get_tables()
+        paths = await asyncio.gather(*(
+            asyncio.to_thread(self.storage.write, df=df, folder_name="extracted_data/NHTSafetyAdministration", filename=name, df_name=name)
+            for name, df in tables.items()
+        ))
+        if self.catalog is not None:
+            for (name, df), path in zip(tables.items(), paths):
+                self.catalog.add(stage="extracted_data", dataset="NHTSafetyAdministration", table=name, path=path, df=df)
+
+    async def run_all(self, client: AsyncHttpClient = None):
+        """
+        Run the source with `client`, e.g. one shared with the other sources (see orchestrator.py),
+        or with a client of its own.
+        """
+        if client is None:
+            async with AsyncHttpClient(concurrency=self.concurrency, cache=self.cache) as client:
+                return await self.run_all(client)
+
+        api = SafetyAdministrationAPI(client, concurrency=self.concurrency)
+        
+        # the four datasets run as concurrent pipelines, sharing the client's budget for the NHTSA host;
+        # a failing dataset is reported and the others are still extracted
+        pipelines = {
+            'ratings': self.process(api),
+            'recalls': self.process_recalls(api),
+            'complaints': self.process_complaints(api),
+            'inspections': self.extract_inspection_locations(api),
+        }
+        results = await asyncio.gather(*pipelines.values(), return_exceptions=True)
+        self.failed_datasets = {dataset: result for dataset, result in zip(pipelines, results) if isinstance(result, Exception)}
+        for dataset, error in self.failed_datasets.items():
+            print(f"Dataset '{dataset}' failed: {type(error).__name__}: {error}")
+
+        await self.write_outputs() if self.write_files else None
+
+    def save_state(self):
+        """
+        Persist the VehicleIds, odiNumbers and recall rows seen by this run (called after the load succeeded).
+        Not saved when a dataset failed: the ids it recorded before failing were never loaded.
+        """
+        if self.state is not None and self.failed_datasets:
+            print(f"Datasets {sorted(self.failed_datasets)} failed: extraction state not saved")
+        elif self.state is not None:
+            self.state.save(source="NHTSafetyAdministration")
@@ -0,0 +1,397 @@
+import asyncio
+import aiohttp  # async replacement for requests
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from utils.response_cache import ResponseCache
+from utils.json_codec import loads
+
+
+class TokenBucket:
+    """
+    Async token bucket used to rate limit requests to a single host.
+    - `rate` tokens are added per second, up to `capacity` (the allowed burst).
+    - Each request consumes one token; callers wait only for the missing fraction of a token.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class AdaptiveLimiter:
+    """
+    AIMD window of requests in flight to one host, replacing a fixed semaphore size.
+    - Additive increase: each healthy response adds `increase / limit`, i.e. about +`increase` per window of
+      requests, and only while the window is full (an idle window says nothing about the upstream).
+    - Multiplicative decrease: a throttling/server error (403/429/5xx, network error) or a p95 latency above
+      `latency_tolerance` x the best p95 seen multiplies the window by `decrease`, at most once per p95 latency
+      (the responses of one burst are one congestion signal).
+    - With `adaptive=False` the window stays at `limit` (a plain semaphore).
+    """
+
+    def __init__(self, limit: int, min_limit: int = 1, max_limit: int = None, increase: float = 1.0, decrease: float = 0.5,
+                 latency_window: int = 50, latency_tolerance: float = 2.0, adaptive: bool = True):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.baseline_p95 = None  # best p95 seen, drifts up slowly so a lasting change becomes the new normal
+        self.cooldown_until = 0.0
+        self.decreases = 0
+        self.peak = self.limit
+        self._waiters = deque()  # FIFO of futures waiting for a slot
+
+    @property
+    def window(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def p95(self) -> float | None:
+        if len(self.latencies) < self.latencies.maxlen:
+            return None
+        return sorted(self.latencies)[int(0.95 * (len(self.latencies) - 1))]
+
+    async def acquire(self):
+        if self.in_flight < self.window and not self._waiters:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future  # the slot is taken on our behalf by _wake
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release_slot()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.window:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def release_slot(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def release(self, latency: float, error: bool = False):
+        """
+        Free the slot and adapt the window to the outcome (`error`: throttled/failed) and `latency` of the request.
+        """
+        window_full = self.in_flight >= self.window
+
+        if self.adaptive:
+            self.latencies.append(latency)
+            p95 = self.p95()
+            if p95 is not None:
+                # +1% per window of samples
+                self.baseline_p95 = p95 if self.baseline_p95 is None else min(p95, self.baseline_p95 * 1.01 ** (1 / self.latencies.maxlen))
+            slow = p95 is not None and p95 > self.latency_tolerance * self.baseline_p95
+
+            now = time.monotonic()
+            if error or slow:
+                if now >= self.cooldown_until:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    # requests sent with the old window keep answering for about one round trip
+                    self.cooldown_until = now + max(latency, p95 or 0.0, self.baseline_p95 or 0.0)
+                    self.decreases += 1
+                    self.latencies.clear()  # judge the new window on its own latencies
+            elif window_full:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                self.peak = max(self.peak, self.limit)
+
+        self.release_slot()
+
+
+class AsyncHttpClient:
+    """
+    Shared async HTTP client used by the FuelEconomy, NHTSA and NREL API classes.
+    - One pooled aiohttp session (keep-alive, DNS cache, per-host connection limits).
+    - A semaphore caps the number of requests in flight across all hosts, plus a window per host
+      (so sources sharing the client can't starve each other). With `adaptive` (default) the host windows are
+      AdaptiveLimiters: they start at the configured concurrency and follow what each upstream allows (AIMD),
+      up to `max_concurrency`.
+    - A token bucket per host replaces fixed sleeps between calls.
+    - Retries on 403/429/5xx and network errors with jittered exponential backoff, honouring Retry-After.
+    - Optional persistent ResponseCache: fresh entries skip the network, stale ones are revalidated (ETag/Last-Modified).
+    - Single flight: concurrent calls for the same (method, url, sorted params) share one in-flight request, and
+      responses of the URL prefixes registered with `set_memo_prefixes` (menus) are kept for the rest of the run.
+      Both share the raw body, each caller decodes its own copy. Counters are in `self.stats`.
+      The shared request is cancelled once all its callers are cancelled.
+    - Bodies are read as bytes and decoded with orjson (json_codec.loads).
+    """
+    RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+
+    def __init__(self, concurrency: int = 10, limit_per_host: int = None, rate_limits: dict = None,
+                 retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0, timeout: float = 60.0,
+                 cache: ResponseCache = None, host_limits: dict = None, adaptive: bool = True, max_concurrency: int = None):
+        self.concurrency = concurrency  # initial window (per host, and in total when not adaptive)
+        self.adaptive = adaptive
+        self.max_concurrency = max_concurrency or (4 * concurrency if adaptive else concurrency)
+        self.limit_per_host = limit_per_host or self.max_concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache = cache
+        self.session = None
+        self.semaphore = None
+        self.buckets = {}
+        for host, rate in (rate_limits or {}).items():
+            self.set_rate_limit(host, rate)
+        self.host_limiters = {}
+        for host, limit in (host_limits or {}).items():
+            self.set_host_limit(host, limit)
+        self.memo_prefixes = set()
+        self._memo = {}  # request key -> body, for the memoized prefixes (in-run only)
+        self._inflight = {}  # request key -> task of the request being sent
+        self._waiting = {}  # request key -> callers waiting for that task
+        self.stats = {"sent": 0, "coalesced": 0, "memo_hits": 0}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        calls = sum(self.stats.values())
+        if calls:
+            print(f"HTTP client: {calls} calls, {self.stats['sent']} requests sent, {self.stats['coalesced']} joined an "
+                  f"identical in-flight request, {self.stats['memo_hits']} served from the in-run memo")
+        for host, limiter in self.host_limiters.items():
+            if limiter.adaptive:
+                print(f"HTTP client: {host} window {limiter.window} (peak {limiter.peak:.0f}, {limiter.decreases} decreases)")
+
+    def set_rate_limit(self, host: str, rate: float, burst: float = None):
+        """
+        Limit requests to `host` to `rate` per second (None removes the limit).
+        """
+        if rate is None:
+            self.buckets.pop(host, None)
+        else:
+            self.buckets[host] = TokenBucket(rate, burst)
+
+    def set_host_limit(self, host: str, limit: int):
+        """
+        Window of requests in flight to `host`: fixed at `limit`, or starting at `limit` when adaptive
+        (None removes it).
+        """
+        if limit is None:
+            self.host_limiters.pop(host, None)
+        else:
+            self.host_limiters[host] = AdaptiveLimiter(limit, max_limit=max(limit, self.max_concurrency), adaptive=self.adaptive)
+
+    def _host_limiter(self, host: str) -> AdaptiveLimiter | None:
+        if host not in self.host_limiters and self.adaptive:
+            self.set_host_limit(host, self.concurrency)
+        return self.host_limiters.get(host)
+
+    def set_memo_prefixes(self, prefixes):
+        """
+        Keep the responses of URLs starting with one of `prefixes` for the rest of the run (e.g. API menus).
+        """
+        self.memo_prefixes.update(prefixes)
+
+    @staticmethod
+    def request_key(url: str, params: dict = None, method: str = "GET") -> tuple:
+        return method, url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+    def set_cache_ttls(self, ttls: dict):
+        """
+        Register cache TTLs (seconds) per URL prefix; no-op when the client has no cache.
+        """
+        if self.cache is not None:
+            self.cache.set_ttls(ttls)
+
+    def _retry_after(self, response: aiohttp.ClientResponse) -> float | None:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _backoff(self, attempt: int, retry_after: float = None) -> float:
+        # "full jitter": spread retries uniformly so throttled callers don't retry in lockstep
+        wait = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            wait = max(wait, min(retry_after, self.backoff_max))
+        return wait
+
+    def _decode(self, body: bytes | None, url: str):
+        if not body:
+            return None
+        try:
+            return loads(body)
+        except ValueError:
+            print(f"Response from {url} not in JSON format")
+            return None
+
+    async def get_json(self, url: str, params: dict = None, headers: dict = None) -> dict | None:
+        """
+        GET `url` and return the decoded JSON body, or None on 204, non-JSON or unrecoverable responses.
+        Identical concurrent calls share one request (the first caller gets the decoded body, the others decode the
+        shared bytes), and memoized URLs are only requested once per run.
+        """
+        key = self.request_key(url, params)
+        if key in self._memo:
+            self.stats["memo_hits"] += 1
+            return self._decode(self._memo[key], url)
+
+        task = self._inflight.get(key)
+        owner = task is None
+        if owner:
+            self.stats["sent"] += 1
+            task = asyncio.ensure_future(self._get(url, params=params, headers=headers))
+            self._inflight[key] = task
+            self._waiting[key] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats["coalesced"] += 1
+
+        self._waiting[key] += 1
+        try:
+            # shield: a cancelled caller must not cancel the request the others are waiting for
+            body, data = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task:
+                self._waiting[key] -= 1
+                if not self._waiting[key] and not task.done():
+                    # nobody is waiting any more: stop the request (new callers send a new one)
+                    self._forget(key, task)
+                    task.cancel()
+            raise
+
+        if not owner:
+            return self._decode(body, url)
+        if data is not None and any(url.startswith(prefix) for prefix in self.memo_prefixes):
+            self._memo[key] = body
+        return data
+
+    def _forget(self, key: tuple, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiting[key]
+
+    async def _get(self, url: str, params: dict = None, headers: dict = None) -> tuple:
+        """
+        Send the request (cache, rate limit, retries); returns (body, decoded body).
+        """
+        cache_key, cached = None, None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(url, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None and cached["fresh"]:
+                return cached["body"], self._decode(cached["body"], url)
+            if cached is not None:
+                # conditional request: a 304 costs no body transfer
+                headers = dict(headers or {})
+                headers.update({"If-None-Match": cached["etag"]} if cached["etag"] else {})
+                headers.update({"If-Modified-Since": cached["last_modified"]} if cached["last_modified"] else {})
+
+        host = urlparse(url).hostname
+        bucket = self.buckets.get(host)
+        limiter = self._host_limiter(host)
+
+        for attempt in range(self.retries + 1):
+            if bucket is not None:
+                await bucket.acquire()
+
+            retry_after, status = None, None
+            # host window first: a request waiting for its host doesn't hold a global slot
+            await limiter.acquire() if limiter is not None else None
+            started = time.monotonic()
+            try:
+                async with self.semaphore:
+                    async with self.session.get(url, headers=headers, params=params) as r:
+                        status = r.status
+
+                        if status == 200:
+                            body = await r.read()
+                            data = self._decode(body, url)
+                            if cache_key is not None and data is not None:
+                                self.cache.put(cache_key, url, body, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+                            return body, data
+
+                        elif status == 304 and cached is not None:
+                            self.cache.refresh(cache_key, url)
+                            return cached["body"], self._decode(cached["body"], url)
+
+                        elif status == 204:
+                            if cache_key is not None:
+                                self.cache.put(cache_key, url, None)
+                            return None, None
+
+                        elif status in self.RETRY_STATUSES:
+                            retry_after = self._retry_after(r)
+                            print(f"{status} from {url} and params {params}, attempt {attempt+1}/{self.retries+1}")
+
+                        else:
+                            return None, None
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Request to {url} failed ({type(e).__name__}), attempt {attempt+1}/{self.retries+1}")
+
+            except asyncio.CancelledError:
+                # the caller gave up (e.g. a cancelled pipeline): says nothing about the upstream, free the slot only
+                limiter.release_slot() if limiter is not None else None
+                limiter = None
+                raise
+
+            finally:
+                if limiter is not None:
+                    limiter.release(time.monotonic() - started, error=status is None or status in self.RETRY_STATUSES)
+
+            if attempt < self.retries:
+                # sleep outside the semaphore so the slot goes to a request that can actually be sent
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        print(f"Giving up on {url} after {self.retries} retries")
+        return None, None
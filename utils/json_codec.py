@@ -0,0 +1,15 @@
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def loads(body: bytes):
+    """
+    Decode a JSON body from its raw bytes: orjson when installed (about 2x faster on station pages and complaint
+    payloads, see benchmarks/bench_json_decode.py), stdlib json otherwise. Raises ValueError on invalid JSON with both.
+    """
+    return orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
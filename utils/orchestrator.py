@@ -0,0 +1,113 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from utils.http_client import AsyncHttpClient
+from utils.response_cache import ResponseCache
+from utils.run_catalog import RunCatalog
+from utils.data_processing import Processing
+from utils.data_loading import Loading
+from utils.schema_producer import produce_schemas
+
+
+class PipelineOrchestrator:
+    """
+    Runs the sources (FuelEconomyETL, SafetyAdministrationETL, AlternativeFuelETL) concurrently in one event loop.
+    - One AsyncHttpClient is shared by all of them; each source's `concurrency` becomes the budget of its own hosts,
+      so the network waits of the three hosts overlap instead of adding up.
+    - Each source is processed (and loaded, with `loading_kwargs`) as soon as its extraction finishes,
+      in a worker thread, while the other sources are still extracting. The sources share one process pool of
+      `processing_workers` processes, so the total stays capped when several sources are processed at once.
+    - In incremental mode a source's state (seen ids, watermarks) is saved only after all its stages succeeded.
+    - Stage timings are measured with perf_counter and kept in `self.timings` ({source: {stage: seconds}}).
+    """
+    SEP_DICT = {'FuelEconomy': ',', 'NHTSafetyAdministration': ',', 'AlternativeFuel': ','}  # processed_data files
+
+    def __init__(self, etls: dict, cache: ResponseCache = None, catalog: RunCatalog = None, storage_format: str = "parquet",
+                 processing_workers: int = 4, processing_chunksize: int = None, loading_kwargs: dict = None):
+        """
+        `etls`: {source: ETL instance}, e.g. {'FuelEconomy': FuelEconomyETL(...)}.
+        `loading_kwargs`: arguments of Loading (server, database, ...); None skips the load stage.
+        """
+        self.etls = etls
+        self.cache = cache
+        self.catalog = catalog
+        self.storage_format = storage_format
+        self.processing_workers = processing_workers
+        self.processing_chunksize = processing_chunksize
+        self.loading_kwargs = loading_kwargs
+        self.processing = {}  # source -> Processing of that source
+        self.executor = None  # process pool shared by the sources' Processing (open during run)
+        self.timings = {source: {} for source in etls}
+
+    def process_source(self, source: str) -> dict:
+        """
+        Process the extracted tables of one source in memory; returns its processed files ({source: {table: path}}).
+        """
+        processing = Processing(dataframe_dict={source: self.etls[source].get_tables()}, storage_format=self.storage_format,
+                                catalog=self.catalog, workers=self.processing_workers, chunksize=self.processing_chunksize,
+                                executor=self.executor)
+        processing.run_all(write_flag=True)
+        self.processing[source] = processing
+
+        if self.catalog is not None:
+            files = self.catalog.get_files(stage='processed_data', run_id=self.catalog.run_id)
+            return produce_schemas(write_json_flag=False, stage_folder='processed_data', sep_dict=self.SEP_DICT,
+                                   file_dict={source: files.get(source, {})})
+        return {source: produce_schemas(write_json_flag=False, stage_folder='processed_data', sep_dict=self.SEP_DICT)[source]}
+
+    def load_source(self, file_dict: dict):
+        loader = Loading(file_dict=file_dict, **self.loading_kwargs)
+        loader.run_all()
+
+    async def run_source(self, source: str, client: AsyncHttpClient):
+        timings = self.timings[source]
+        etl = self.etls[source]
+
+        time_before = perf_counter()
+        await etl.run_all(client)
+        timings['extract'] = perf_counter() - time_before
+        print(f"Total time ({source} extract): {timings['extract']:.3f} s")
+
+        # CPU/DB-bound stages run in a thread so the other sources keep extracting on the event loop
+        time_before = perf_counter()
+        file_dict = await asyncio.to_thread(self.process_source, source)
+        timings['process'] = perf_counter() - time_before
+        print(f"Total time ({source} process): {timings['process']:.3f} s")
+
+        if self.loading_kwargs is not None:
+            time_before = perf_counter()
+            await asyncio.to_thread(self.load_source, file_dict)
+            timings['load'] = perf_counter() - time_before
+            print(f"Total time ({source} load): {timings['load']:.3f} s")
+
+        # incremental state is persisted only now: a source failing in process/load is fully extracted again next run
+        etl.save_state()
+
+    async def run(self):
+        time_before = perf_counter()
+        concurrency = sum(etl.concurrency for etl in self.etls.values())
+
+        self.executor = ProcessPoolExecutor(max_workers=self.processing_workers) if self.processing_workers > 1 else None
+        try:
+            async with AsyncHttpClient(concurrency=concurrency, cache=self.cache) as client:
+                results = await asyncio.gather(*(self.run_source(source, client) for source in self.etls), return_exceptions=True)
+        finally:
+            self.executor.shutdown() if self.executor is not None else None
+            self.executor = None
+
+        for source, result in zip(self.etls, results):
+            if isinstance(result, Exception):
+                print(f"Source {source} failed: {type(result).__name__}: {result}")
+
+        duration_in_secs = perf_counter() - time_before
+        self.print_timings(duration_in_secs)
+        return duration_in_secs
+
+    def print_timings(self, duration_in_secs: float):
+        print("\nStage timings:")
+        for source, timings in self.timings.items():
+            stages = " | ".join(f"{stage} {secs:.3f} s" for stage, secs in timings.items())
+            print(f"\t{source}: {stages} | total {sum(timings.values()):.3f} s")
+        slowest = max((sum(t.values()) for t in self.timings.values()), default=0.0)
+        print(f"Total time (ALL SOURCES): {duration_in_secs:.3f} s -> {duration_in_secs/60:.1f} min "
+              f"(slowest source {slowest:.3f} s, sum of sources {sum(sum(t.values()) for t in self.timings.values()):.3f} s)")
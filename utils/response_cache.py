@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class ResponseCache:
+    """
+    Persistent HTTP response cache (SQLite) used by AsyncHttpClient.
+    - Entries are keyed on a hash of the method, URL and sorted params.
+    - Each URL prefix gets its own TTL (menus long, recalls/complaints short); unmatched URLs use `default_ttl`.
+    - Stale entries with an ETag/Last-Modified are revalidated with a conditional request instead of re-downloaded.
+    - Total body size is capped at `max_bytes`; least recently used entries are evicted first.
+    """
+
+    def __init__(self, path: str = "http_cache/responses.sqlite", max_bytes: int = 512 * 1024 ** 2, default_ttl: float = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = {}
+
+        folder_name = os.path.dirname(path)
+        os.makedirs(folder_name) if folder_name and not os.path.isdir(folder_name) else None
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, url TEXT, body BLOB, etag TEXT, last_modified TEXT,"
+            " expires_at REAL, last_access REAL, size INTEGER)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(url: str, params: dict = None, method: str = "GET") -> str:
+        params_str = json.dumps(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return hashlib.sha256(f"{method} {url} {params_str}".encode("utf-8")).hexdigest()
+
+    def set_ttls(self, ttls: dict):
+        """
+        Register TTLs (seconds) per URL prefix; the longest matching prefix wins.
+        """
+        self.ttls.update(ttls)
+
+    def ttl_for(self, url: str) -> float:
+        matches = [prefix for prefix in self.ttls if url.startswith(prefix)]
+        return self.ttls[max(matches, key=len)] if matches else self.default_ttl
+
+    def get(self, key: str) -> dict | None:
+        """
+        Return the cached entry ({'body', 'etag', 'last_modified', 'fresh'}) or None.
+        """
+        row = self.conn.execute(
+            "SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        body, etag, last_modified, expires_at = row
+        return {"body": body, "etag": etag, "last_modified": last_modified, "fresh": expires_at > now}
+
+    def put(self, key: str, url: str, body: bytes | None, etag: str = None, last_modified: str = None):
+        ttl = self.ttl_for(url)
+        if ttl <= 0 and not (etag or last_modified):
+            return  # could never be served or revalidated
+
+        now = time.time()
+        size = len(body) if body else 0
+        old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, url, body, etag, last_modified, expires_at, last_access, size)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, url, body, etag, last_modified, now + ttl, now, size),
+        )
+        self.total_bytes += size - (old[0] if old else 0)
+        self._evict()
+        self.conn.commit()
+
+    def refresh(self, key: str, url: str):
+        """
+        Mark an entry fresh again after the server answered 304 Not Modified.
+        """
+        now = time.time()
+        self.conn.execute(
+            "UPDATE responses SET expires_at = ?, last_access = ? WHERE key = ?", (now + self.ttl_for(url), now, key)
+        )
+        self.conn.commit()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        # drop least recently used entries until we are back under 90% of the cap
+        target = self.max_bytes * 0.9
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if self.total_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= size
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import pandas as pd
+
+
+class RunCatalog:
+    """
+    Manifest of the stage files written by each run (JSON, rewritten atomically).
+    - run id -> stage ('extracted_data', 'processed_data') -> dataset -> table -> {path, rows, cols, schema_hash}.
+    - Downstream stages look their files up directly instead of globbing folders by mtime,
+      and always consume the files of a single run.
+    - Runs are ordered by a sequence number recorded when they start (`seq`), not by their id.
+    - `prune` keeps the most recent runs and deletes the files of the older ones.
+    """
+
+    def __init__(self, path: str = "catalog/runs.json"):
+        self.path = path
+        self.catalog = self.load()
+        self.run_id = None
+        self._lock = threading.Lock()  # stage files are written from worker threads
+
+    def load(self) -> dict:
+        if not os.path.isfile(self.path):
+            return {"runs": {}}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading run catalog {self.path}: {e} -> starting from an empty catalog")
+            return {"runs": {}}
+
+    def save(self):
+        folder_name = os.path.dirname(self.path)
+        os.makedirs(folder_name) if folder_name and not os.path.isdir(folder_name) else None
+
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.catalog, f, indent=2)
+            os.replace(tmp_path, self.path)
+        print(f"Run catalog saved to '{self.path}'")
+
+    def start_run(self, run_id: str = None) -> str:
+        """
+        Open a new run (id defaults to the current timestamp); files added afterwards belong to it.
+        The run gets the next sequence number, which orders the runs whatever their ids look like.
+        """
+        with self._lock:
+            runs = self.catalog["runs"]
+            seq = max((run.get("seq", 0) for run in runs.values()), default=0) + 1
+            if run_id is None:
+                run_id = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+                run_id = f"{run_id}_{seq}" if run_id in runs else run_id  # two runs started within the same second
+            runs.setdefault(run_id, {"created_at": pd.Timestamp.now().isoformat(), "seq": seq, "stages": {}})
+            self.run_id = run_id
+        return self.run_id
+
+    def ordered_runs(self) -> list:
+        """
+        Run ids from the oldest to the newest: by sequence number, then creation time
+        (runs recorded before sequence numbers existed have none and come first).
+        """
+        runs = list(self.catalog["runs"].items())
+        return [run_id for run_id, run in sorted(runs, key=lambda item: (item[1].get("seq", 0), item[1].get("created_at", ""), item[0]))]
+
+    @staticmethod
+    def schema_hash(df: pd.DataFrame) -> str:
+        columns = [(str(c), str(t)) for c, t in df.dtypes.items()]
+        return hashlib.sha256(json.dumps(columns).encode("utf-8")).hexdigest()[:16]
+
+    def add(self, stage: str, dataset: str, table: str, path: str, df: pd.DataFrame = None, rows: int = None):
+        """
+        Register a file written for `table` in the current run (starts one if needed).
+        `rows` gives the row count of files written chunk by chunk, without the whole DataFrame.
+        """
+        if path is None:
+            return
+        run_id = self.run_id or self.start_run()
+        entry = {"path": path}
+        if df is not None:
+            entry.update({"rows": int(df.shape[0]), "cols": int(df.shape[1]), "schema_hash": self.schema_hash(df)})
+        elif rows is not None:
+            entry["rows"] = int(rows)
+
+        with self._lock:
+            stages = self.catalog["runs"][run_id]["stages"]
+            stages.setdefault(stage, {}).setdefault(dataset, {})[table] = entry
+
+    def latest_run(self, stage: str) -> str | None:
+        """
+        Most recent run that wrote files for `stage`.
+        """
+        with self._lock:  # files are added from worker threads while other stages look them up
+            runs = [run_id for run_id in self.ordered_runs() if self.catalog["runs"][run_id]["stages"].get(stage)]
+        return runs[-1] if runs else None
+
+    def get_files(self, stage: str, run_id: str = None) -> dict:
+        """
+        {dataset: {table: path}} for `stage`, all from the same run (the latest one by default).
+        """
+        run_id = run_id or self.latest_run(stage)
+        if run_id is None:
+            return {}
+        with self._lock:
+            datasets = self.catalog["runs"].get(run_id, {}).get("stages", {}).get(stage, {})
+            return {dataset: {table: entry["path"] for table, entry in list(tables.items())} for dataset, tables in list(datasets.items())}
+
+    def get_entry(self, stage: str, dataset: str, table: str, run_id: str = None) -> dict | None:
+        run_id = run_id or self.latest_run(stage)
+        if run_id is None:
+            return None
+        with self._lock:
+            entry = self.catalog["runs"].get(run_id, {}).get("stages", {}).get(stage, {}).get(dataset, {}).get(table)
+        return dict(entry) if entry is not None else None
+
+    def prune(self, keep: int = 5):
+        """
+        Retention: keep the `keep` most recent runs, delete the files and entries of the older ones.
+        """
+        with self._lock:
+            runs = self.ordered_runs()
+        old_runs = runs[:-keep] if keep > 0 else runs
+        for run_id in old_runs:
+            if run_id == self.run_id:
+                continue
+            run = self.catalog["runs"].pop(run_id)
+            for datasets in run["stages"].values():
+                for tables in datasets.values():
+                    for entry in tables.values():
+                        os.remove(entry["path"]) if os.path.isfile(entry["path"]) else None
+            print(f"Pruned run '{run_id}' from the catalog")
+        self.save()
@@ -1,7 +1,28 @@
 import pandas as pd
+import hashlib
 import json
 import os
 from pathlib import Path
+from utils.stage_storage import read_stage_file
+
+# substrings identifying each table of a source (file names for the CSV stages, table names for the in-memory handoff)
+FILE_SUBSTRINGS = {
+    'FuelEconomy': ["fuel", "emissions", "summary", "detail"],
+    'NHTSafetyAdministration': ["inspection", "ratings", "recall", "complaints"],
+    'AlternativeFuel': ["connector", "pressure", "standard", "related", "stations"],
+}
+
+def table_name_from_path(file_path: str) -> str:
+    """
+    Table name of a stage file: 'extracted_data/FuelEconomy/MPG_Summary_20250101_120000.csv' -> 'MPG_Summary'.
+    """
+    aux = os.path.basename(file_path)
+    substring_name = aux.split('_', 1)[0]
+
+    if 'MPG' in aux:
+        substring_name = "_".join([substring_name, aux.split('_', 2)[1]])
+
+    return substring_name
 
 def get_most_recent_file(folder: str, substring: str):
     folder_path = Path(folder)
@@ -15,12 +36,39 @@ def get_most_recent_file(folder: str, substring: str):
     # Return the file with the most recent modification time
     return str(max(files, key=lambda f: f.stat().st_mtime))
 
-def df_schema_to_json(df: pd.DataFrame, name: str = "dataframe", outfile: str = "schema.json") -> dict:
+# columns that hold Y/N flags (typed as boolean whatever the sample looks like)
+BOOLEAN_COLUMNS = ['cylDeact', 'cylDeactYesNo', 'mpgData']
+
+SAMPLE_ROWS = 1000  # rows read per file for inference
+VOTE_THRESHOLD = 0.95  # share of the sampled values a type needs to win the vote
+
+def infer_text_dtype(values: pd.Series) -> str:
     """
-    Generate schema for a DataFrame with improved type detection:
-    - Detect strings, numbers, booleans, and datetime strings.
+    Vote on the type of a text column: every sampled value is classified as boolean / int / float / datetime,
+    and the first type backed by VOTE_THRESHOLD of the values wins (otherwise 'string').
+    Ints with leading zeros (zip codes, ids) vote for string.
+    """
+    s = values.astype(str).str.strip()
+    n = len(s)
+
+    is_bool = s.str.casefold().isin(['true', 'false'])
+    is_int = s.str.fullmatch(r"[-+]?(0|[1-9]\d*)")
+    is_float = s.str.fullmatch(r"[-+]?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?") & ~s.str.fullmatch(r"[-+]?0\d+")
+    looks_like_date = s.str.contains(r"\d") & s.str.contains(r"[-/:]") & (s.str.len() >= 8)
+    is_datetime = looks_like_date & pd.to_datetime(s.where(looks_like_date), errors="coerce", format="mixed", utc=True).notna()
+
+    for dtype, votes in (("boolean", is_bool), ("int", is_int), ("float", is_float), ("datetime", is_datetime)):
+        if votes.sum() >= VOTE_THRESHOLD * n:
+            return dtype
+    return "string"
+
+def infer_schema(df: pd.DataFrame) -> dict:
+    """
+    {column: {'dtype', 'example'}} for a (sampled) DataFrame.
+    - Typed columns (numeric, bool, datetime: Parquet files, CSV columns pandas could parse) keep their type.
+    - Text columns are typed by vote across all their sampled values (infer_text_dtype).
+    - Columns with no value in the sample keep the pandas dtype.
     """
-    result = {}
     cols = {}
 
     for col in df.columns:
@@ -29,40 +77,47 @@ def df_schema_to_json(df: pd.DataFrame, name: str = "dataframe", outfile: str =
         dtype = str(df[col].dtype)
 
         if example_val is not None:
-            # Detect datetime strings
-            if dtype == "object":
-                try:
-                    pd.to_datetime(example_val)
-                    dtype = "datetime"
-                except (ValueError, TypeError):
-                    if isinstance(example_val, str):
-                        dtype = "string"
-                    elif isinstance(example_val, bool):
-                        dtype = "boolean"
-                    elif isinstance(example_val, int):
-                        dtype = "int"
-                    elif isinstance(example_val, float):
-                        dtype = "float"
-            # Already numeric or datetime in pandas
+            if pd.api.types.is_bool_dtype(df[col]):
+                dtype = "boolean"
+            elif pd.api.types.is_datetime64_any_dtype(df[col]):
+                dtype = "datetime"
+            elif pd.api.types.is_integer_dtype(df[col]):
+                dtype = "int"
+            elif pd.api.types.is_float_dtype(df[col]):
+                dtype = "float"
+            elif non_null_series.map(type).eq(bool).all():
+                dtype = "boolean"
             else:
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    dtype = "datetime"
-                elif pd.api.types.is_integer_dtype(df[col]):
-                    dtype = "int"
-                elif pd.api.types.is_float_dtype(df[col]):
-                    dtype = "float"
-                elif pd.api.types.is_bool_dtype(df[col]):
-                    dtype = "boolean"
-                    
-        if col in ['cylDeact','cylDeactYesNo','mpgData']:
+                dtype = infer_text_dtype(non_null_series)
+
+        if col in BOOLEAN_COLUMNS:
             dtype = 'boolean'
-            
+
         cols[col] = {
             "dtype": dtype,
             "example": example_val
         }
 
-    result[name] = cols
+    return cols
+
+def df_schema_to_json(df: pd.DataFrame, name: str = "dataframe", outfile: str = "schema.json", schema: dict = None) -> dict:
+    """
+    Write the schema of a DataFrame ({name: {column: {'dtype', 'example'}}}) to `outfile`.
+    `schema` (already inferred, e.g. from the cache) skips the inference.
+    Hand-written column settings of the existing file (any key besides 'dtype' / 'example', e.g. the boolean vocabulary
+    of Processing.convert_to_boolean) are kept for the columns still in the table.
+    """
+    inferred = schema if schema is not None else infer_schema(df)
+    previous = {}
+    if os.path.isfile(outfile):
+        try:
+            with open(outfile, "r", encoding="utf-8") as f:
+                previous = json.load(f).get(name, {})
+        except Exception as e:
+            print(f"Error reading the previous schema {outfile}: {e} -> hand-written settings are not kept")
+
+    result = {name: {col: {**entry, **{k: v for k, v in previous.get(col, {}).items() if k not in ("dtype", "example")}}
+                     for col, entry in inferred.items()}}
 
     # Write JSON
     with open(outfile, "w", encoding="utf-8") as f:
@@ -70,21 +125,62 @@ def df_schema_to_json(df: pd.DataFrame, name: str = "dataframe", outfile: str =
 
     return result
 
-def produce_schemas(sep_dict : dict, write_json_flag: bool = False, stage_folder: str = 'extracted'):
+def schema_cache_key(sample: pd.DataFrame) -> str:
+    """
+    Cache key of a file's schema: a hash of the sample the schema is inferred from (columns, read dtypes and values),
+    whatever the format. Hashing file bytes instead misses Parquet row groups/footer outside the hashed range.
+    """
+    digest = hashlib.sha256(json.dumps([(str(c), str(t)) for c, t in sample.dtypes.items()]).encode("utf-8"))
+    digest.update(sample.to_csv(index=False).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_schema_cache(cache_file: str) -> dict:
+    if not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading schema cache {cache_file}: {e} -> schemas will be inferred again")
+        return {}
+
+def save_schema_cache(cache_file: str, cache: dict):
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, default=str)
+    os.replace(tmp_file, cache_file)
+
+def produce_schemas(sep_dict : dict, write_json_flag: bool = False, stage_folder: str = 'extracted', file_dict: dict = None,
+                    sample_rows: int = SAMPLE_ROWS):
+    """
+    Find the latest file of each table and (optionally) write its JSON schema.
+    With `file_dict` ({dataset: {table: path}}, e.g. RunCatalog.get_files) the files of that run are used
+    instead of the newest file per substring by mtime.
+    Files are only read when `write_json_flag` is set, and then only the first `sample_rows` rows;
+    schemas are cached in '<stage_folder>_schemas/schema_cache.json', keyed on a hash of the sample.
+    """
     
-    file_substrings = {}
-    file_substrings['FuelEconomy'] = ["fuel", "emissions", "summary", "detail"]
-    file_substrings['NHTSafetyAdministration'] = ["inspection", "ratings", "recall", "complaints"]
-    file_substrings['AlternativeFuel'] = ["connector", "pressure", "standard", "related", "stations"]
+    file_substrings = FILE_SUBSTRINGS
     
     latest_files = {}
-    # latest_fuel = [get_most_recent_file("extracted_data/FuelEconomy", sub_str) for sub_str in file_substrings_fuel]
-    latest_files['FuelEconomy'] = {k : get_most_recent_file(f"{stage_folder}/FuelEconomy", k) for k in file_substrings['FuelEconomy']}
-    latest_files['NHTSafetyAdministration'] = {k : get_most_recent_file(f"{stage_folder}/NHTSafetyAdministration", k) for k in file_substrings['NHTSafetyAdministration']}
-    latest_files['AlternativeFuel'] = {k : get_most_recent_file(f"{stage_folder}/AlternativeFuel", k) for k in file_substrings['AlternativeFuel']}
+    if file_dict is not None:
+        latest_files = file_dict
+    else:
+        # latest_fuel = [get_most_recent_file("extracted_data/FuelEconomy", sub_str) for sub_str in file_substrings_fuel]
+        latest_files['FuelEconomy'] = {k : get_most_recent_file(f"{stage_folder}/FuelEconomy", k) for k in file_substrings['FuelEconomy']}
+        latest_files['NHTSafetyAdministration'] = {k : get_most_recent_file(f"{stage_folder}/NHTSafetyAdministration", k) for k in file_substrings['NHTSafetyAdministration']}
+        latest_files['AlternativeFuel'] = {k : get_most_recent_file(f"{stage_folder}/AlternativeFuel", k) for k in file_substrings['AlternativeFuel']}
     
     # print(f"LATEST FILES!!!!!!!!!", latest_files)
     
+    if not write_json_flag:
+        return latest_files  # nothing to produce: the file paths are all the caller needs
+    
+    cache_file = f"{stage_folder}_schemas/schema_cache.json"
+    os.makedirs(f"{stage_folder}_schemas") if not os.path.isdir(f"{stage_folder}_schemas") else None
+    cache = load_schema_cache(cache_file)
+    used_cache = {}  # only the entries of the current files are kept, so the cache doesn't grow run after run
+    
     for dataset, files_in_dataset in latest_files.items():
         
         folder_name = f"{stage_folder}_schemas"
@@ -95,24 +191,26 @@ def produce_schemas(sep_dict : dict, write_json_flag: bool = False, stage_folder
             
         for df_name, file_name in files_in_dataset.items():
             
-            aux = file_name.split("\\", 3)[2]
-            substring_name = aux.split('_', 1)[0]
+            if file_name is None:
+                continue
             
-            if 'MPG' in file_name:
-                substring_name = "_".join([substring_name, aux.split('_', 2)[1]])
+            substring_name = table_name_from_path(file_name)
             
             # if dataset == 'AlternativeFuel':
             #     sep = ','
             # else:
             #     sep = ','
                 
-            df = pd.read_csv(file_name, sep = sep_dict[dataset])
+            df = read_stage_file(file_name, sep = sep_dict[dataset], nrows = sample_rows)
             name = f"{substring_name}"
             
-            print(f"Producing schema for '{name}' using file '{file_name}'...")
+            key = schema_cache_key(df)
+            cached = cache.get(key)
+            print(f"Producing schema for '{name}' using file '{file_name}'{' (cached)' if cached is not None else ''}...")
             
-            schema = df_schema_to_json(df, name=name, outfile=f"{folder_name}/{name}.json") if write_json_flag else None
+            schema = df_schema_to_json(df, name=name, outfile=f"{folder_name}/{name}.json", schema=cached)
+            used_cache[key] = schema[name]
+    
+    save_schema_cache(cache_file, used_cache)
             
     return latest_files
-            
-        
@@ -0,0 +1,304 @@
+import os
+import pickle
+import warnings
+from abc import ABC, abstractmethod
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (parquet engine)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+def arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Raw API columns can mix types (e.g. '12' and 12, or nested lists); Arrow needs one type per column,
+    so mixed object columns are converted to strings.
+    """
+    df = df.copy(deep=False)
+    for c in df.columns:
+        if pd.api.types.is_object_dtype(df[c].dtype) and pd.api.types.infer_dtype(df[c], skipna=True).startswith("mixed"):
+            df[c] = df[c].astype("string")
+    return df
+
+
+def unify_arrow_schemas(schema, other):
+    """
+    Schema both chunks fit in: Arrow's permissive promotion (null -> any type, int -> float, ...), with string
+    for the columns whose types have no common type (e.g. int in one chunk, text in the next). Keeps `schema`'s
+    metadata (pandas dtypes) and column order, new columns go last.
+    """
+    import pyarrow as pa
+    fields = {f.name: f for f in schema}
+    for field in other:
+        if field.name not in fields:
+            fields[field.name] = field.with_nullable(True)
+        elif not field.type.equals(fields[field.name].type):
+            try:
+                promoted = pa.unify_schemas([pa.schema([fields[field.name]]), pa.schema([field])], promote_options="permissive")
+                fields[field.name] = promoted.field(field.name)
+            except (pa.ArrowTypeError, pa.ArrowInvalid):
+                fields[field.name] = pa.field(field.name, pa.string())
+    return pa.schema(list(fields.values()), metadata=schema.metadata)
+
+
+def conform_arrow_table(table, schema):
+    """
+    `table` with the columns of `schema`, in its order and types; columns it doesn't have are all null.
+    """
+    import pyarrow as pa
+    columns = [table.column(f.name).cast(f.type) if f.name in table.column_names else pa.nulls(table.num_rows, f.type)
+               for f in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class StageStorage(ABC):
+    """
+    Storage backend for one stage folder (extracted_data/, processed_data/): one timestamped file per table.
+    Subclasses implement `_write` / `read`, plus `_append` / `iter_chunks` for tables processed chunk by chunk.
+    """
+    format = None
+    extension = None
+
+    def write(self, df: pd.DataFrame, folder_name: str, filename: str, df_name: str = "DataFrame") -> str | None:
+        if df is None:
+            return None
+
+        current_time = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(folder_name, exist_ok=True)
+
+        path = f"{folder_name}/{filename}_{current_time}.{self.extension}"
+        self._write(df, path)
+        print(f"Dataframe '{df_name}' written to file '{path}' ({df.shape[0]} rows, {df.shape[1]} cols)")
+        return path
+
+    @abstractmethod
+    def _write(self, df: pd.DataFrame, path: str):
+        ...
+
+    @abstractmethod
+    def read(self, path: str, columns: list = None, nrows: int = None) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, path: str, chunksize: int, dtype: dict = None):
+        """
+        Yield the file as DataFrames of at most `chunksize` rows (`dtype` fixes the types of untyped formats).
+        """
+
+    def open_writer(self, folder_name: str, filename: str) -> "ChunkWriter":
+        """
+        Writer that appends chunks to one new timestamped file (for tables processed chunk by chunk).
+        """
+        current_time = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(folder_name, exist_ok=True)
+        return ChunkWriter(self, f"{folder_name}/{filename}_{current_time}.{self.extension}")
+
+    @abstractmethod
+    def _append(self, df: pd.DataFrame, path: str, state: dict):
+        ...
+
+    def _close(self, state: dict):
+        pass
+
+
+class ChunkWriter:
+    """
+    Incremental output of StageStorage.open_writer: `write` each chunk, then `close`.
+    """
+
+    def __init__(self, storage: StageStorage, path: str):
+        self.storage = storage
+        self.path = path
+        self.rows = 0
+        self.state = {}  # backend specific (open parquet writer, ...)
+
+    def write(self, df: pd.DataFrame):
+        if df is None or (df.empty and self.rows):  # an empty first chunk still writes the header / schema
+            return
+        self.storage._append(df, self.path, self.state)
+        self.rows += df.shape[0]
+
+    def close(self) -> str:
+        self.storage._close(self.state)
+        print(f"Chunks written to file '{self.path}' ({self.rows} rows)")
+        return self.path
+
+
+class CsvStorage(StageStorage):
+    """
+    Plain CSV, the original stage format (kept as an export option). Dtypes are re-inferred on every read.
+    """
+    format = "csv"
+    extension = "csv"
+
+    def __init__(self, sep: str = ',', quoting: int = 0):
+        self.sep = sep
+        self.quoting = quoting
+
+    def _write(self, df: pd.DataFrame, path: str):
+        df.to_csv(path, index=False, sep=self.sep, quoting=self.quoting)
+
+    def _append(self, df: pd.DataFrame, path: str, state: dict):
+        first = not state.get("started")
+        df.to_csv(path, index=False, sep=self.sep, quoting=self.quoting, mode="w" if first else "a", header=first)
+        state["started"] = True
+
+    def iter_chunks(self, path: str, chunksize: int, dtype: dict = None):
+        # types are inferred per chunk: without `dtype` a column can change type from one chunk to the next
+        yield from pd.read_csv(path, sep=self.sep, chunksize=chunksize, dtype=dtype)
+
+    def read(self, path: str, columns: list = None, nrows: int = None) -> pd.DataFrame:
+        # callable usecols: columns missing from the file are ignored instead of raising
+        wanted = set(columns) if columns is not None else None
+        usecols = (lambda c: c in wanted) if wanted is not None else None
+        return pd.read_csv(path, sep=self.sep, usecols=usecols, nrows=nrows)
+
+
+class ParquetStorage(StageStorage):
+    """
+    Parquet (pyarrow): typed, compressed columns; reads can be restricted to the columns a stage needs.
+    """
+    format = "parquet"
+    extension = "parquet"
+
+    def __init__(self, compression: str = "zstd"):
+        if not PARQUET_AVAILABLE:
+            raise ImportError("Parquet storage requires 'pyarrow' (pip install pyarrow)")
+        self.compression = compression
+
+    def _write(self, df: pd.DataFrame, path: str):
+        try:
+            df.to_parquet(path, index=False, compression=self.compression)
+        except Exception:
+            arrow_safe(df).to_parquet(path, index=False, compression=self.compression)
+
+    def _append(self, df: pd.DataFrame, path: str, state: dict):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except Exception:
+            table = pa.Table.from_pandas(arrow_safe(df), preserve_index=False)
+
+        if "schema" not in state:
+            state["schema"] = table.schema
+            state["writer"] = pq.ParquetWriter(path, table.schema, compression=self.compression)
+        elif not table.schema.equals(state["schema"]):
+            # one schema per file: a chunk with a wider type (null -> string, int -> float, ...) or a new column
+            # promotes the schema, and the chunks already written are rewritten with it
+            schema = unify_arrow_schemas(state["schema"], table.schema)
+            if not schema.equals(state["schema"]):
+                self._promote(path, state, schema)
+        state["writer"].write_table(conform_arrow_table(table, state["schema"]))
+
+    def _promote(self, path: str, state: dict, schema):
+        """
+        Rewrite the file written so far with `schema`, one record batch at a time, and keep writing to it.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        state["writer"].close()
+        previous_path = f"{path}.promote"
+        os.replace(path, previous_path)
+        state["schema"] = schema
+        state["writer"] = pq.ParquetWriter(path, schema, compression=self.compression)
+        for batch in pq.ParquetFile(previous_path).iter_batches():
+            state["writer"].write_table(conform_arrow_table(pa.Table.from_batches([batch]), schema))
+        os.remove(previous_path)
+
+    def _close(self, state: dict):
+        state["writer"].close() if "writer" in state else None
+
+    def iter_chunks(self, path: str, chunksize: int, dtype: dict = None):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+    def read(self, path: str, columns: list = None, nrows: int = None) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+        if columns is not None:
+            names = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in names]
+        if nrows is not None:
+            # only the first batch is decoded, not the whole file
+            parquet_file = pq.ParquetFile(path)
+            batch = next(parquet_file.iter_batches(batch_size=nrows, columns=columns), None)
+            return batch.to_pandas() if batch is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+        return pd.read_parquet(path, columns=columns)
+
+
+STORAGE_FORMATS = {
+    'csv': CsvStorage,
+    'parquet': ParquetStorage,
+}
+
+
+def resolve_storage_format(storage_format: str) -> str:
+    """
+    Format the stage files will actually be written in: 'parquet' falls back to 'csv', with a warning, when pyarrow
+    is missing. main resolves it once so every stage uses (and reports) the same format.
+    """
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown storage format '{storage_format}', expected one of {list(STORAGE_FORMATS)}")
+    if storage_format == "parquet" and not PARQUET_AVAILABLE:
+        warnings.warn("storage_format='parquet' requires pyarrow (pip install pyarrow): stage files are written as CSV",
+                      RuntimeWarning, stacklevel=3)
+        return "csv"
+    return storage_format
+
+
+def get_storage(storage_format: str = "parquet", sep: str = ',', quoting: int = 0, compression: str = "zstd") -> StageStorage:
+    """
+    Storage backend by name (`sep`/`quoting` apply to CSV, `compression` to Parquet).
+    Falls back to CSV, with a warning, when Parquet is requested but pyarrow is missing (see resolve_storage_format).
+    """
+    storage_format = resolve_storage_format(storage_format)
+    return ParquetStorage(compression=compression) if storage_format == "parquet" else CsvStorage(sep=sep, quoting=quoting)
+
+
+def read_stage_file(path: str, columns: list = None, sep: str = ',', nrows: int = None) -> pd.DataFrame:
+    """
+    Read a stage file whatever its format (picked from the extension), optionally only `columns` / the first `nrows`.
+    """
+    if str(path).endswith(".parquet"):
+        return ParquetStorage().read(path, columns=columns, nrows=nrows)
+    return CsvStorage(sep=sep).read(path, columns=columns, nrows=nrows)
+
+
+def iter_stage_file(path: str, chunksize: int, sep: str = ',', dtype: dict = None):
+    """
+    Read a stage file chunk by chunk, whatever its format (picked from the extension).
+    """
+    if str(path).endswith(".parquet"):
+        return ParquetStorage().iter_chunks(path, chunksize)
+    return CsvStorage(sep=sep).iter_chunks(path, chunksize, dtype=dtype)
+
+
+def dataframe_to_buffer(df: pd.DataFrame) -> tuple:
+    """
+    Serialize a DataFrame to send it between processes: an Arrow IPC stream (columnar, no per-object pickling)
+    when pyarrow is installed, a pickle otherwise. Returns (format, bytes).
+    """
+    if not PARQUET_AVAILABLE:
+        return "pickle", pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except Exception:
+        table = pa.Table.from_pandas(arrow_safe(df), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return "arrow", sink.getvalue().to_pybytes()
+
+
+def dataframe_from_buffer(buffer: tuple) -> pd.DataFrame:
+    buffer_format, data = buffer
+    if buffer_format == "pickle":
+        return pickle.loads(data)
+
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_all().to_pandas()
@@ -0,0 +1,72 @@
+import copy
+import json
+import os
+
+
+class StateStore:
+    """
+    Local JSON state for incremental extraction, one section per source.
+    - Watermarks: highest value seen for a field (e.g. NREL station 'updated_at').
+    - Seen ids: entity ids already extracted (e.g. FuelEconomy vehicle ids per model year, NHTSA odiNumbers).
+    The file is rewritten atomically, so a crashed run never leaves a half-written state behind.
+    Changes stay in memory until `save(source)`, which persists that source's section only: the orchestrator saves
+    a source once its data is loaded, so a source that fails later in the run is extracted again next time.
+    """
+
+    def __init__(self, path: str = "state/extraction_state.json"):
+        self.path = path
+        self.state = self.load()
+        self._saved = copy.deepcopy(self.state)  # what is on disk, sections of unsaved sources are never written
+        self._seen_cache = {}  # (source, key) -> set, built lazily from the lists in self.state
+
+    def load(self) -> dict:
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading state file {self.path}: {e} -> starting from an empty state")
+            return {}
+
+    def save(self, source: str = None):
+        """
+        Persist the in-memory state of `source` (every source if None); the other sections keep their saved values.
+        """
+        folder_name = os.path.dirname(self.path)
+        os.makedirs(folder_name) if folder_name and not os.path.isdir(folder_name) else None
+
+        for (seen_source, key), ids in self._seen_cache.items():
+            self.state.setdefault(seen_source, {}).setdefault("seen", {})[key] = sorted(ids)
+
+        sources = [source] if source is not None else list(self.state)
+        for name in sources:
+            self._saved[name] = copy.deepcopy(self.state[name]) if name in self.state else self._saved.get(name, {})
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._saved, f, indent=2)
+        os.replace(tmp_path, self.path)
+        print(f"Extraction state saved to '{self.path}'" + (f" ({source})" if source is not None else ""))
+
+    def get_watermark(self, source: str, field: str):
+        return self.state.get(source, {}).get("watermarks", {}).get(field)
+
+    def set_watermark(self, source: str, field: str, value):
+        """
+        Move the watermark forward (never backwards).
+        """
+        current = self.get_watermark(source, field)
+        if value is not None and (current is None or value > current):
+            self.state.setdefault(source, {}).setdefault("watermarks", {})[field] = value
+
+    def seen_ids(self, source: str, key: str) -> set:
+        cache_key = (source, str(key))
+        if cache_key not in self._seen_cache:
+            ids = self.state.get(source, {}).get("seen", {}).get(str(key), [])
+            self._seen_cache[cache_key] = set(ids)
+        return self._seen_cache[cache_key]
+
+    def add_seen_ids(self, source: str, key: str, ids):
+        # ids are stored as strings so they survive the JSON round trip unchanged
+        self.seen_ids(source, key).update(str(i) for i in ids)
@@ -0,0 +1,45 @@
+import pandas as pd
+
+
+class TableBuilder:
+    """
+    Append-only accumulator for one output table.
+    - Collects raw row dicts while the API responses come in.
+    - Materializes a single DataFrame at the end, instead of one DataFrame per row + pd.concat.
+    """
+
+    def __init__(self, name: str = "table"):
+        self.name = name
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, row: dict):
+        if row:
+            self.rows.append(row)
+
+    def extend(self, rows):
+        """
+        Add several rows; accepts a list of dicts, a single dict (APIs that return one object
+        instead of a list of one) or None.
+        """
+        if not rows:
+            return
+        if isinstance(rows, dict):
+            self.rows.append(rows)
+        else:
+            self.rows.extend(r for r in rows if r)
+
+    def to_dataframe(self, first_columns: list = None) -> pd.DataFrame | None:
+        """
+        Build the DataFrame (None if no rows were collected), optionally moving `first_columns` to the front.
+        """
+        if not self.rows:
+            return None
+
+        df = pd.DataFrame.from_records(self.rows)
+        if first_columns:
+            ordered = [c for c in first_columns if c in df.columns]
+            df = df[ordered + [c for c in df.columns if c not in ordered]]
+        return df